@@ -0,0 +1,238 @@
+"""Historical build durations, critical-path ordering and running ETAs."""
+
+import os
+import json
+import math
+import platform
+import time
+from typing import Optional, List, Dict, Tuple
+
+try:
+    from .common import read_meminfo, HOME, log_info, log_warning
+except ImportError:
+    from common import read_meminfo, HOME, log_info, log_warning
+
+
+HISTORY_FILE = HOME / ".droidrun_build_history.json"
+
+# Durations kept per (package, version, device class, jobs) key
+HISTORY_DEPTH = 10
+
+# Rough first-run estimates in seconds on a mid-range phone, used until history exists
+DEFAULT_ESTIMATES = {
+    "scipy": 3600,
+    "pyarrow": 3600,
+    "grpcio": 2700,
+    "pandas": 2400,
+    "scikit-learn": 1800,
+    "tokenizers": 1500,
+    "numpy": 1200,
+    "pydantic-core": 1200,
+    "cryptography": 900,
+    "jiter": 600,
+    "orjson": 600,
+    "safetensors": 600,
+    "pillow": 600,
+    "maturin": 900,
+    "droidrun": 900,
+}
+DEFAULT_ESTIMATE = 60
+
+
+def device_class() -> str:
+    """Describe the device well enough that build durations are comparable."""
+    hardware = ""
+    try:
+        with open("/proc/cpuinfo", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key.strip() in ("Hardware", "model name") and value.strip():
+                    hardware = value.strip().replace(" ", "_")[:32]
+                    break
+    except OSError:
+        pass
+    mem_gb = round(read_meminfo().get("MemTotal", 0) / 1048576)
+    parts = [platform.machine(), f"{os.cpu_count() or 1}cpu", f"{mem_gb}gb"]
+    if hardware:
+        parts.append(hardware)
+    return "-".join(parts)
+
+
+def _installed_version(package: str) -> str:
+    try:
+        from importlib import metadata
+    except ImportError:
+        return ""
+    try:
+        return metadata.version(package)
+    except Exception:
+        return ""
+
+
+def load_history() -> List[dict]:
+    """Load all recorded build durations."""
+    if not HISTORY_FILE.exists():
+        return []
+    try:
+        with open(HISTORY_FILE, 'r') as f:
+            return json.load(f).get("entries", [])
+    except Exception:
+        return []
+
+
+def record_duration(package: str, seconds: float, version: Optional[str] = None) -> None:
+    """Add a successful build duration to the history."""
+    entry = {
+        "package": package,
+        "version": version if version is not None else _installed_version(package),
+        "device": device_class(),
+        "jobs": os.environ.get("MAX_JOBS", ""),
+        "seconds": round(seconds, 1),
+        "timestamp": int(time.time()),
+    }
+    key = (entry["package"], entry["version"], entry["device"], entry["jobs"])
+    entries = load_history()
+    same_key = [e for e in entries if (e["package"], e["version"], e["device"], e["jobs"]) == key]
+    if len(same_key) >= HISTORY_DEPTH:
+        # Drop the oldest samples for this key
+        stale = {id(e) for e in same_key[:len(same_key) - HISTORY_DEPTH + 1]}
+        entries = [e for e in entries if id(e) not in stale]
+    entries.append(entry)
+
+    try:
+        with open(HISTORY_FILE, 'w') as f:
+            json.dump({"entries": entries}, f, indent=2)
+    except Exception as e:
+        log_warning(f"Failed to update build history: {e}")
+
+
+def estimate(package: str, history: Optional[List[dict]] = None,
+             defaults: Optional[Dict[str, float]] = None) -> Tuple[float, float]:
+    """
+    Estimate how long a package takes to build here.
+
+    Prefers samples from this device class and job count, then this device
+    class, then any device, then `defaults` and DEFAULT_ESTIMATES.
+
+    Returns:
+        (mean seconds, standard deviation in seconds)
+    """
+    history = load_history() if history is None else history
+    device = device_class()
+    jobs = os.environ.get("MAX_JOBS", "")
+    samples = [e for e in history if e["package"] == package]
+
+    for matches in (
+        [e for e in samples if e["device"] == device and e["jobs"] == jobs],
+        [e for e in samples if e["device"] == device],
+        samples,
+    ):
+        if matches:
+            values = [e["seconds"] for e in matches]
+            mean = sum(values) / len(values)
+            if len(values) > 1:
+                stdev = math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+            else:
+                stdev = mean * 0.3
+            return mean, stdev
+
+    mean = (defaults or {}).get(package, DEFAULT_ESTIMATES.get(package, DEFAULT_ESTIMATE))
+    return float(mean), mean * 0.5
+
+
+def critical_path_order(packages: List[str], deps: Optional[Dict[str, List[str]]] = None,
+                        history: Optional[List[dict]] = None,
+                        defaults: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    Order packages so the longest remaining dependency chain starts first.
+
+    Args:
+        packages: Packages to build
+        deps: Map of package -> packages (from the same list) it must come after
+
+    Returns:
+        Packages in a dependency-respecting, longest-critical-path-first order
+    """
+    deps = deps or {}
+    history = load_history() if history is None else history
+    durations = {pkg: estimate(pkg, history, defaults)[0] for pkg in packages}
+    dependents: Dict[str, List[str]] = {pkg: [] for pkg in packages}
+    for pkg in packages:
+        for dep in deps.get(pkg, []):
+            if dep in dependents:
+                dependents[dep].append(pkg)
+
+    # Length of the longest chain starting at each package
+    path: Dict[str, float] = {}
+
+    def chain(pkg: str) -> float:
+        if pkg not in path:
+            path[pkg] = durations[pkg] + max((chain(d) for d in dependents[pkg]), default=0)
+        return path[pkg]
+
+    order = []
+    remaining = list(packages)
+    while remaining:
+        ready = [p for p in remaining if all(d in order or d not in packages for d in deps.get(p, []))]
+        # Stable for ties, so the hard-coded order still breaks them
+        best = max(ready or remaining, key=lambda p: (chain(p), -remaining.index(p)))
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+
+def format_duration(seconds: float) -> str:
+    seconds = max(int(seconds), 0)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{(seconds % 3600) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class EtaTracker:
+    """Track progress through a list of builds and report a running ETA with a 95% range."""
+
+    def __init__(self, packages: List[str], deps: Optional[Dict[str, List[str]]] = None,
+                 label: str = "builds", defaults: Optional[Dict[str, float]] = None):
+        self.history = load_history()
+        self.order = critical_path_order(packages, deps, self.history, defaults)
+        self.estimates = {pkg: estimate(pkg, self.history, defaults) for pkg in packages}
+        self.label = label
+        self.done: List[str] = []
+        self._current: Optional[str] = None
+        self._started = 0.0
+
+    def remaining(self) -> Tuple[float, float, float]:
+        """Expected remaining seconds with a low/high 95% range."""
+        pending = [p for p in self.order if p not in self.done]
+        mean = sum(self.estimates[p][0] for p in pending)
+        stdev = math.sqrt(sum(self.estimates[p][1] ** 2 for p in pending))
+        if self._current in pending:
+            # Credit time already spent on the running build
+            mean = max(mean - (time.monotonic() - self._started), 0)
+        return mean, max(mean - 1.96 * stdev, 0), mean + 1.96 * stdev
+
+    def log_eta(self) -> None:
+        mean, low, high = self.remaining()
+        if mean <= 0:
+            return
+        log_info(f"ETA for remaining {self.label}: ~{format_duration(mean)} "
+                 f"({format_duration(low)} - {format_duration(high)})")
+
+    def start(self, package: str) -> None:
+        """Mark a build as started and log the ETA."""
+        self._current = package
+        self._started = time.monotonic()
+        self.log_eta()
+
+    def finish(self, package: str, success: bool = True, record: bool = True) -> None:
+        """Mark a build as done, recording its duration when it actually built successfully."""
+        if record and success and self._current == package:
+            record_duration(package, time.monotonic() - self._started)
+        self._current = None
+        self.done.append(package)
+
+    def skip(self, package: str) -> None:
+        """Mark a package that needed no work (already installed)."""
+        self.finish(package, record=False)
@@ -2,9 +2,6 @@
 
 import os
 import sys
-import subprocess
-import shutil
-import tempfile
 import tarfile
 import re
 from pathlib import Path
@@ -12,17 +9,44 @@ from typing import Optional, Dict
 
 try:
     from .common import python_pkg_installed, HOME, ERROR_LOG_FILE, log_info, log_success, log_error
+    from .process_monitor import run_monitored
+    from .workspace import build_workspace
 except ImportError:
     from common import python_pkg_installed, HOME, ERROR_LOG_FILE, log_info, log_success, log_error
+    from process_monitor import run_monitored
+    from workspace import build_workspace
 
 
-def download_and_fix_source(pkg_name: str, version_spec: str, fix_type: str) -> Optional[Path]:
-    """Download and fix source for packages that need fixes."""
-    work_dir = Path(tempfile.mkdtemp())
+def fix_source_tree(pkg_dir: Path, pkg_name: str, fix_type: str) -> None:
+    """Apply the build fixes for fix_type to an unpacked source tree."""
+    if fix_type == "pandas":
+        meson_build = pkg_dir / "meson.build"
+        if meson_build.exists():
+            pkg_version = pkg_dir.name.replace(f"{pkg_name}-", "")
+            content = meson_build.read_text()
+            content = re.sub(r"version: run_command.*", f"version: '{pkg_version}',", content)
+            meson_build.write_text(content)
     
+    elif fix_type == "scikit-learn":
+        version_py = pkg_dir / "sklearn" / "_build_utils" / "version.py"
+        if version_py.exists() and not version_py.read_text().startswith("#!/"):
+            version_py.write_text("#!/usr/bin/env python3\n" + version_py.read_text())
+        
+        meson_build = pkg_dir / "meson.build"
+        if meson_build.exists():
+            pkg_version = pkg_dir.name.replace(f"{pkg_name}-", "")
+            content = meson_build.read_text()
+            content = re.sub(r"version: run_command.*", f"version: '{pkg_version}',", content)
+            if "version: run_command" not in content:
+                content = re.sub(r"version:.*", f"version: '{pkg_version}',", content)
+            meson_build.write_text(content)
+
+
+def download_and_fix_source(pkg_name: str, version_spec: str, fix_type: str, work_dir: Path) -> Optional[Path]:
+    """Download and fix source for packages that need fixes, inside work_dir."""
     try:
         # Download source
-        result = subprocess.run(
+        result = run_monitored(
             [sys.executable, "-m", "pip", "download", version_spec, 
              "--dest", ".", "--no-cache-dir", "--no-binary", ":all:"],
             cwd=work_dir,
@@ -47,28 +71,7 @@ def download_and_fix_source(pkg_name: str, version_spec: str, fix_type: str) ->
         
         pkg_dir = pkg_dirs[0]
         
-        # Apply fixes
-        if fix_type == "pandas":
-            meson_build = pkg_dir / "meson.build"
-            if meson_build.exists():
-                pkg_version = pkg_dir.name.replace(f"{pkg_name}-", "")
-                content = meson_build.read_text()
-                content = re.sub(r"version: run_command.*", f"version: '{pkg_version}',", content)
-                meson_build.write_text(content)
-        
-        elif fix_type == "scikit-learn":
-            version_py = pkg_dir / "sklearn" / "_build_utils" / "version.py"
-            if version_py.exists() and not version_py.read_text().startswith("#!/"):
-                version_py.write_text("#!/usr/bin/env python3\n" + version_py.read_text())
-            
-            meson_build = pkg_dir / "meson.build"
-            if meson_build.exists():
-                pkg_version = pkg_dir.name.replace(f"{pkg_name}-", "")
-                content = meson_build.read_text()
-                content = re.sub(r"version: run_command.*", f"version: '{pkg_version}',", content)
-                if "version: run_command" not in content:
-                    content = re.sub(r"version:.*", f"version: '{pkg_version}',", content)
-                meson_build.write_text(content)
+        fix_source_tree(pkg_dir, pkg_name, fix_type)
         
         # Repackage
         new_source_file = work_dir / source_file.name
@@ -102,9 +105,10 @@ def build_package(
     
     # Pre-check for wheels
     if pre_check:
-        local_wheels = list(wheels_dir.glob(wheel_pattern or f"{pkg_name}*.whl"))
+        local_wheels = sorted(wheels_dir.glob(wheel_pattern or f"{pkg_name}*.whl"),
+                              key=lambda w: w.stat().st_mtime, reverse=True)
         if local_wheels:
-            result = subprocess.run(
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), 
                  "--no-index", str(local_wheels[0])],
                 capture_output=True,
@@ -113,41 +117,35 @@ def build_package(
             if result.returncode == 0:
                 return True
     
-    # Download and fix source if needed
-    source_arg = version_spec
-    temp_dir = None
-    if fix_source:
-        fixed_source = download_and_fix_source(pkg_name, version_spec, fix_source)
-        if fixed_source and fixed_source.exists():
-            source_arg = str(fixed_source)
-            temp_dir = fixed_source.parent
-    
-    # Build wheel
-    build_cmd = [sys.executable, "-m", "pip", "wheel", source_arg, "--no-deps", "--wheel-dir", str(wheels_dir)]
-    if no_build_isolation:
-        build_cmd.append("--no-build-isolation")
-    
-    result = subprocess.run(build_cmd, capture_output=True, check=False)
-    if result.returncode != 0:
-        if temp_dir:
-            shutil.rmtree(temp_dir, ignore_errors=True)
-        return False
+    with build_workspace(f"{pkg_name}-build") as work_dir:
+        # Download and fix source if needed
+        source_arg = version_spec
+        if fix_source:
+            fixed_source = download_and_fix_source(pkg_name, version_spec, fix_source, work_dir)
+            if fixed_source and fixed_source.exists():
+                source_arg = str(fixed_source)
+        
+        # Build wheel
+        build_cmd = [sys.executable, "-m", "pip", "wheel", source_arg, "--no-deps", "--wheel-dir", str(wheels_dir)]
+        if no_build_isolation:
+            build_cmd.append("--no-build-isolation")
+        
+        result = run_monitored(build_cmd, capture_output=True, check=False)
+        if result.returncode != 0:
+            return False
     
     # Find and install wheel
-    wheel_files = list(wheels_dir.glob(wheel_pattern or f"{pkg_name}*.whl"))
+    # Newest first, so a stale wheel from an earlier build is never picked
+    wheel_files = sorted(wheels_dir.glob(wheel_pattern or f"{pkg_name}*.whl"),
+                         key=lambda w: w.stat().st_mtime, reverse=True)
     if not wheel_files:
-        if temp_dir:
-            shutil.rmtree(temp_dir, ignore_errors=True)
         return False
     
-    result = subprocess.run(
+    result = run_monitored(
         [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), 
          "--no-index", str(wheel_files[0])],
         capture_output=True,
         check=False
     )
     
-    if temp_dir:
-        shutil.rmtree(temp_dir, ignore_errors=True)
-    
     return result.returncode == 0
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Persistent CARGO_HOME and one shared, size-capped Cargo target directory for every Rust build."""
+
+import os
+import sys
+import shutil
+from pathlib import Path
+from typing import List, Dict, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, HOME, log_info, log_success, log_warning
+    from .workspace import dir_size
+except ImportError:
+    from common import record_report, HOME, log_info, log_success, log_warning
+    from workspace import dir_size
+
+
+# Set to 0 to let each Rust build use its own throwaway target directory
+CARGO_CACHE = os.environ.get("DROIDRUN_CARGO_CACHE", "1") != "0"
+
+# Registry index, downloaded crates and git checkouts; kept across runs
+CARGO_HOME = Path(os.environ.get("CARGO_HOME", str(HOME / ".cargo")))
+
+# Compiled crates shared by maturin and setuptools-rust builds of every package
+CARGO_TARGET_DIR = Path(os.environ.get("DROIDRUN_CARGO_TARGET_DIR", str(HOME / ".cache" / "droidrun-cargo-target")))
+
+# Size limit for the shared target directory in MB (0 means no limit)
+CARGO_CACHE_BUDGET_MB = float(os.environ.get("DROIDRUN_CARGO_CACHE_BUDGET_MB", "3072"))
+
+
+def configure_cargo_env() -> None:
+    """
+    Point Cargo at the persistent CARGO_HOME and the shared target directory.
+
+    pip runs maturin and setuptools-rust in a fresh temporary directory, so
+    without CARGO_TARGET_DIR serde, pyo3 and the rest of the common crates are
+    compiled again for every package. Both backends honour CARGO_TARGET_DIR,
+    and Cargo's per-unit hashes keep different feature sets apart.
+    """
+    if not CARGO_CACHE:
+        return
+    CARGO_HOME.mkdir(parents=True, exist_ok=True)
+    CARGO_TARGET_DIR.mkdir(parents=True, exist_ok=True)
+    os.environ["CARGO_HOME"] = str(CARGO_HOME)
+    os.environ["CARGO_TARGET_DIR"] = str(CARGO_TARGET_DIR)
+    # Incremental state is only useful for edits to one crate, which these builds never make
+    os.environ.setdefault("CARGO_INCREMENTAL", "0")
+
+
+def _profile_dirs(target_dir: Path) -> List[Path]:
+    """Profile directories (release, debug, <triple>/release, ...), recognised by their .fingerprint."""
+    fingerprints = list(target_dir.glob("*/.fingerprint")) + list(target_dir.glob("*/*/.fingerprint"))
+    return sorted(fingerprint.parent for fingerprint in fingerprints)
+
+
+def compiled_units(target_dir: Path = CARGO_TARGET_DIR) -> Dict[Tuple[Path, str], List[Path]]:
+    """
+    Group the target directory into compiled units: (profile dir, "<crate>-<hash>")
+    -> the fingerprint, build script output and deps files that belong to it.
+    """
+    units: Dict[Tuple[Path, str], List[Path]] = {}
+    for profile in _profile_dirs(target_dir):
+        by_hash: Dict[str, List[Path]] = {}
+        deps = profile / "deps"
+        if deps.is_dir():
+            for path in deps.iterdir():
+                # libserde-<hash>.rlib, libserde-<hash>.rmeta, serde-<hash>.d, ...
+                stem = path.name.split(".", 1)[0]
+                if "-" in stem:
+                    by_hash.setdefault(stem.rsplit("-", 1)[1], []).append(path)
+        for fingerprint in (profile / ".fingerprint").iterdir():
+            unit = fingerprint.name
+            paths = [fingerprint]
+            if (profile / "build" / unit).exists():
+                paths.append(profile / "build" / unit)
+            paths.extend(by_hash.get(unit.rsplit("-", 1)[-1], []))
+            units[(profile, unit)] = paths
+    return units
+
+
+def _unit_size(paths: List[Path]) -> int:
+    return sum(dir_size(path) if path.is_dir() else path.stat().st_size for path in paths if path.exists())
+
+
+def _unit_mtime(paths: List[Path]) -> float:
+    # Cargo rewrites a unit's fingerprint when it compiles it, not when it reuses it,
+    # so this is the build time: the oldest builds go first
+    return max((path.stat().st_mtime for path in paths if path.exists()), default=0)
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    elif path.exists() or path.is_symlink():
+        path.unlink()
+
+
+def prune_cargo_cache(budget_mb: float = CARGO_CACHE_BUDGET_MB, target_dir: Path = CARGO_TARGET_DIR) -> Tuple[int, int]:
+    """
+    Shrink the shared target directory to budget_mb.
+
+    Wheels maturin leaves in target/wheels and incremental state are always
+    removed (pip has its own copy of each wheel). Then whole units are evicted,
+    oldest build first; Cargo notices the missing outputs and rebuilds them if
+    a later package needs them again.
+
+    Returns:
+        (units evicted, bytes freed)
+    """
+    if not target_dir.is_dir():
+        return 0, 0
+    before = dir_size(target_dir)
+
+    for leftover in [target_dir / "wheels"] + [profile / "incremental" for profile in _profile_dirs(target_dir)]:
+        _remove(leftover)
+
+    evicted = 0
+    total = dir_size(target_dir)
+    budget = budget_mb * 1048576
+    if budget_mb > 0 and total > budget:
+        units = compiled_units(target_dir)
+        for key in sorted(units, key=lambda k: _unit_mtime(units[k])):
+            if total <= budget:
+                break
+            size = _unit_size(units[key])
+            for path in units[key]:
+                _remove(path)
+            total -= size
+            evicted += 1
+    return evicted, before - dir_size(target_dir)
+
+
+def prune_after_install() -> None:
+    """Post-run pruning of the shared Cargo target directory."""
+    if not CARGO_CACHE or not CARGO_TARGET_DIR.is_dir():
+        return
+    try:
+        evicted, freed = prune_cargo_cache()
+    except OSError as e:
+        log_warning(f"Cargo cache pruning failed: {e}")
+        return
+    size = dir_size(CARGO_TARGET_DIR)
+    record_report("cargo_cache", {
+        "size_mb": round(size / 1048576, 1),
+        "units": len(compiled_units()),
+        "evicted": evicted,
+        "freed_mb": round(freed / 1048576, 1),
+    })
+    if freed:
+        log_info(f"Cargo cache: freed {freed / 1048576:.1f} MB ({evicted} units evicted), "
+                 f"{size / 1048576:.1f} MB kept")
+
+
+def main() -> int:
+    """Show, prune or clear the shared Cargo cache."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the shared Cargo target directory")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("stats", help="show the cache size and what it holds")
+    prune_parser = subparsers.add_parser("prune", help="shrink the cache to the budget")
+    prune_parser.add_argument("--budget-mb", type=float, default=CARGO_CACHE_BUDGET_MB,
+                              help="size limit in MB (default: %(default)s)")
+    subparsers.add_parser("clear", help="remove every compiled unit")
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        evicted, freed = prune_cargo_cache(args.budget_mb)
+        log_success(f"Freed {freed / 1048576:.1f} MB ({evicted} units evicted)")
+        return 0
+    if args.command == "clear":
+        shutil.rmtree(CARGO_TARGET_DIR, ignore_errors=True)
+        log_success(f"Removed {CARGO_TARGET_DIR}")
+        return 0
+
+    units = compiled_units()
+    crates = {unit.rsplit("-", 1)[0] for _, unit in units}
+    print(f"CARGO_HOME:       {CARGO_HOME}")
+    print(f"CARGO_TARGET_DIR: {CARGO_TARGET_DIR}")
+    print(f"Size:             {dir_size(CARGO_TARGET_DIR) / 1048576:.1f} MB "
+          f"(budget {CARGO_CACHE_BUDGET_MB:g} MB)")
+    print(f"Compiled units:   {len(units)} ({len(crates)} crates)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,15 +2,23 @@
 """Check all Python packages mentioned in DEPENDENCIES.md"""
 
 import sys
+import json
+import time
+import argparse
 from pathlib import Path
+from typing import Optional, List, Dict
+
+from packaging.requirements import Requirement, InvalidRequirement
+from packaging.utils import canonicalize_name
+from packaging.version import Version, InvalidVersion
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import python_pkg_installed, log_info, log_success, log_warning, log_error
+    from .common import log_success, log_warning
 except ImportError:
-    from common import python_pkg_installed, log_info, log_success, log_warning, log_error
+    from common import log_success, log_warning
 
 
 # All Python packages from DEPENDENCIES.md organized by phase
@@ -79,82 +87,142 @@ PACKAGES_BY_PHASE = {
 }
 
 
-def check_package(pkg_name: str, version_spec: str) -> bool:
-    """Check if a package is installed."""
+def installed_snapshot() -> Dict[str, str]:
+    """Map every installed distribution (canonical name) to its version, in one pass over sys.path."""
+    from importlib import metadata
+    
+    snapshot = {}
+    for dist in metadata.distributions():
+        name = dist.metadata["Name"]
+        # First match on sys.path wins, as it does for imports
+        if name and canonicalize_name(name) not in snapshot:
+            snapshot[canonicalize_name(name)] = dist.version
+    return snapshot
+
+
+def evaluate(pkg_name: str, version_spec: str, snapshot: Dict[str, str]) -> dict:
+    """Check one requirement against the snapshot without spawning pip."""
+    found = snapshot.get(canonicalize_name(pkg_name))
+    result = {"package": pkg_name, "spec": version_spec, "found": found}
+    if found is None:
+        result["status"] = "missing"
+        return result
+    
+    try:
+        specifier = Requirement(version_spec).specifier
+    except InvalidRequirement:
+        specifier = None
     try:
-        return python_pkg_installed(pkg_name, version_spec)
-    except Exception as e:
-        log_warning(f"Error checking {pkg_name}: {e}")
-        return False
+        ok = specifier is None or specifier.contains(Version(found), prereleases=True)
+    except InvalidVersion:
+        ok = False
+    result["status"] = "ok" if ok else "mismatch"
+    return result
 
 
-def main() -> int:
-    """Check all packages and print results."""
-    print("=" * 70)
-    print("Checking Python Packages from DEPENDENCIES.md")
-    print("=" * 70)
-    print()
+def check_all(phases: Optional[List[str]] = None, snapshot: Optional[Dict[str, str]] = None) -> dict:
+    """
+    Check every requirement in PACKAGES_BY_PHASE in one pass.
+    
+    Args:
+        phases: Only check phases whose name contains one of these strings
+        snapshot: Installed versions to check against (taken now if omitted)
     
-    all_installed = []
-    all_missing = []
+    Returns:
+        Results per requirement plus a summary and timings in milliseconds
+    """
+    started = time.perf_counter()
+    if snapshot is None:
+        snapshot = installed_snapshot()
+    snapshot_done = time.perf_counter()
     
+    results = []
     for phase_name, packages in PACKAGES_BY_PHASE.items():
-        print(f"\n{phase_name}:")
-        print("-" * 70)
-        
-        phase_installed = []
-        phase_missing = []
-        
+        if phases and not any(p.lower() in phase_name.lower() for p in phases):
+            continue
         for pkg_name, version_spec in packages:
-            is_installed = check_package(pkg_name, version_spec)
-            
-            if is_installed:
-                print(f"  ✓ {pkg_name} ({version_spec})")
-                phase_installed.append((pkg_name, version_spec))
-                all_installed.append((pkg_name, version_spec, phase_name))
-            else:
-                print(f"  ✗ {pkg_name} ({version_spec})")
-                phase_missing.append((pkg_name, version_spec))
-                all_missing.append((pkg_name, version_spec, phase_name))
-        
-        if phase_installed:
-            print(f"\n  Installed: {len(phase_installed)}/{len(packages)}")
-        if phase_missing:
-            print(f"  Missing: {len(phase_missing)}/{len(packages)}")
+            result = evaluate(pkg_name, version_spec, snapshot)
+            result["phase"] = phase_name
+            results.append(result)
+    finished = time.perf_counter()
     
-    # Summary
-    print("\n" + "=" * 70)
-    print("SUMMARY")
+    summary = {status: sum(1 for r in results if r["status"] == status) for status in ("ok", "missing", "mismatch")}
+    summary["total"] = len(results)
+    return {
+        "results": results,
+        "summary": summary,
+        "timings_ms": {
+            "snapshot": round((snapshot_done - started) * 1000, 1),
+            "check": round((finished - snapshot_done) * 1000, 1),
+            "total": round((finished - started) * 1000, 1),
+        },
+    }
+
+
+def check_package(pkg_name: str, version_spec: str) -> bool:
+    """Check if a package is installed and satisfies its version spec."""
+    return evaluate(pkg_name, version_spec, installed_snapshot())["status"] == "ok"
+
+
+def print_report(report: dict) -> None:
+    """Print the results as a table grouped by phase."""
+    print("=" * 70)
+    print("Checking Python Packages from DEPENDENCIES.md")
     print("=" * 70)
     
-    total_packages = len(all_installed) + len(all_missing)
-    installed_count = len(all_installed)
-    missing_count = len(all_missing)
+    marks = {"ok": "✓", "missing": "✗", "mismatch": "!"}
+    phase_name = None
+    for result in report["results"]:
+        if result["phase"] != phase_name:
+            phase_name = result["phase"]
+            print(f"\n{phase_name}:")
+            print("-" * 70)
+        found = result["found"] or "not installed"
+        print(f"  {marks[result['status']]} {result['package']:<38} {found:<15} ({result['spec']})")
     
-    print(f"\nTotal packages: {total_packages}")
-    print(f"Installed: {installed_count} ({installed_count * 100 // total_packages if total_packages > 0 else 0}%)")
-    print(f"Missing: {missing_count} ({missing_count * 100 // total_packages if total_packages > 0 else 0}%)")
+    summary = report["summary"]
+    timings = report["timings_ms"]
+    print("\n" + "=" * 70)
+    print("SUMMARY")
+    print("=" * 70)
+    print(f"\nTotal packages: {summary['total']}")
+    print(f"Installed: {summary['ok']}")
+    print(f"Missing: {summary['missing']}")
+    print(f"Version mismatch: {summary['mismatch']}")
+    print(f"Checked in {timings['total']:.0f} ms (snapshot {timings['snapshot']:.0f} ms)")
     
-    if all_installed:
-        print(f"\n✓ Installed packages ({installed_count}):")
-        for pkg_name, version_spec, phase in all_installed:
-            print(f"  - {pkg_name} ({version_spec}) [{phase}]")
+    problems = [r for r in report["results"] if r["status"] != "ok"]
+    if problems:
+        print(f"\n✗ Problems ({len(problems)}):")
+        for result in problems:
+            found = f"found {result['found']}" if result["found"] else "not installed"
+            print(f"  - {result['package']} ({result['spec']}): {found} [{result['phase']}]")
+    print("\n" + "=" * 70)
+
+
+def main() -> int:
+    """Check all packages and print results."""
+    parser = argparse.ArgumentParser(description="Check installed packages against the droidrun requirements")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--phase", action="append", help="only check phases whose name contains this (repeatable)")
+    args = parser.parse_args()
     
-    if all_missing:
-        print(f"\n✗ Missing packages ({missing_count}):")
-        for pkg_name, version_spec, phase in all_missing:
-            print(f"  - {pkg_name} ({version_spec}) [{phase}]")
+    report = check_all(args.phase)
     
-    print("\n" + "=" * 70)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
     
-    if missing_count == 0:
+    problems = report["summary"]["missing"] + report["summary"]["mismatch"]
+    if args.json:
+        return 0 if problems == 0 else 1
+    if problems == 0:
         log_success("All packages are installed!")
         return 0
-    else:
-        log_warning(f"{missing_count} package(s) are missing")
-        return 1
+    log_warning(f"{problems} package(s) are missing or have the wrong version")
+    return 1
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
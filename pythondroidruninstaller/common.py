@@ -2,9 +2,11 @@
 
 import os
 import sys
+import json
 import subprocess
 import shutil
 import logging
+import threading
 from pathlib import Path
 from typing import Optional, List
 
@@ -44,6 +46,29 @@ PROGRESS_FILE = HOME / ".droidrun_install_progress"
 ENV_FILE = HOME / ".droidrun_install_env"
 LOG_FILE = HOME / ".droidrun_install.log"
 ERROR_LOG_FILE = HOME / ".droidrun_install_errors.log"
+REPORT_FILE = HOME / ".droidrun_install_report.json"
+# Entries are appended here as they happen; REPORT_FILE is written from it by save_report
+REPORT_JOURNAL = HOME / ".droidrun_install_report.jsonl"
+
+# record_report is called from worker threads (workspaces, wheel post-processing, prefetch)
+_report_lock = threading.Lock()
+
+# Bundled pre-built wheel directories, searched after WHEELS_DIR
+BUNDLED_WHEEL_DIRS = [
+    deps_dir / arch_dir
+    for deps_dir in [
+        SCRIPT_DIR.parent.parent / "depedencies" / "wheels",
+        HOME / "droidrundepedency" / "depedencies" / "wheels",
+        HOME / "depedencies" / "wheels",
+    ]
+    for arch_dir in ["_x86_64_wheels", "arch64_wheels"]
+]
+
+# Offline-first mode: DROIDRUN_OFFLINE=1 skips the probe, otherwise the index is
+# probed once within DROIDRUN_NETWORK_PROBE_TIMEOUT seconds
+NETWORK_PROBE_TIMEOUT = float(os.environ.get("DROIDRUN_NETWORK_PROBE_TIMEOUT", "3"))
+# Local index (e.g. a devpi or simple HTML mirror) pip should use when offline
+LOCAL_INDEX_URL = os.environ.get("DROIDRUN_LOCAL_INDEX_URL", "")
 
 # Initialize log files
 LOG_FILE.touch()
@@ -114,6 +139,15 @@ def log_error(msg: str) -> None:
         f.write(f"{msg}\n")
 
 
+def _run_monitored(cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """Run a command under the inactivity watchdog (imported lazily to avoid a cycle)."""
+    try:
+        from .process_monitor import run_monitored
+    except ImportError:
+        from process_monitor import run_monitored
+    return run_monitored(cmd, **kwargs)
+
+
 def command_exists(cmd: str) -> bool:
     """Check if a command exists in PATH."""
     return shutil.which(cmd) is not None
@@ -125,7 +159,7 @@ def pkg_installed(pkg_name: str) -> bool:
         if not command_exists("pkg"):
             return False
         try:
-            result = subprocess.run(
+            result = _run_monitored(
                 ["pkg", "list-installed"],
                 capture_output=True,
                 text=True,
@@ -172,7 +206,7 @@ def python_pkg_installed(pkg_name: str, version_spec: Optional[str] = None) -> b
         if any(op in version_spec for op in ['>=', '<=', '==', '!=', '<', '>']):
             try:
                 # Use pip install --dry-run to check if requirement is satisfied
-                result = subprocess.run(
+                result = _run_monitored(
                     [sys.executable, "-m", "pip", "install", "--dry-run", "--no-deps", version_spec],
                     capture_output=True,
                     text=True,
@@ -190,7 +224,7 @@ def python_pkg_installed(pkg_name: str, version_spec: Optional[str] = None) -> b
     
     # Fallback: Use pip show
     try:
-        result = subprocess.run(
+        result = _run_monitored(
             [sys.executable, "-m", "pip", "show", pkg_name],
             capture_output=True,
             text=True,
@@ -201,7 +235,7 @@ def python_pkg_installed(pkg_name: str, version_spec: Optional[str] = None) -> b
             if version_spec and version_spec != pkg_name:
                 if any(op in version_spec for op in ['>=', '<=', '==', '!=', '<', '>']):
                     # Use dry-run again for version check
-                    result = subprocess.run(
+                    result = _run_monitored(
                         [sys.executable, "-m", "pip", "install", "--dry-run", "--no-deps", version_spec],
                         capture_output=True,
                         text=True,
@@ -220,7 +254,7 @@ def run_command(cmd: List[str], check: bool = True, capture_output: bool = False
                 quiet: bool = False) -> subprocess.CompletedProcess:
     """Run a shell command and return the result."""
     try:
-        result = subprocess.run(
+        result = _run_monitored(
             cmd,
             check=check,
             capture_output=capture_output,
@@ -272,6 +306,13 @@ def should_skip_phase(phase: int) -> bool:
     return is_phase_complete(phase)
 
 
+def set_phase(phase: int) -> None:
+    """Record the phase now running so commands and resource samples can be tagged with it."""
+    import time
+    os.environ["DROIDRUN_PHASE"] = str(phase)
+    record_report("phases", {"phase": phase, "started": int(time.time())})
+
+
 def mark_phase_complete(phase: int) -> None:
     """Mark a phase as complete."""
     import time
@@ -309,6 +350,82 @@ def mark_phase_complete(phase: int) -> None:
         log_error(f"Failed to save progress: {e}")
 
 
+def _append_journal(record: dict, truncate: bool = False) -> None:
+    """
+    Write one JSON line to the report journal.
+
+    The flock covers other processes writing the same journal (prefetch.py
+    run next to a phase script), and the thread lock other threads of this
+    one. Each record goes out in a single write, so a crash can at worst
+    leave one torn last line, which load_report skips.
+    """
+    import fcntl
+
+    line = (json.dumps(record) + "\n").encode()
+    with _report_lock:
+        fd = os.open(REPORT_JOURNAL, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if truncate:
+                os.ftruncate(fd, 0)
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                # End a line torn by a crash, so it does not swallow this record
+                line = b"\n" + line
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+
+def load_report() -> dict:
+    """Load the machine-readable run report, assembled from its journal."""
+    report = {}
+    try:
+        with open(REPORT_JOURNAL, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return report
+
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if "section" in record:
+            report.setdefault(record["section"], []).append(record["entry"])
+        else:
+            report.update(record)
+    return report
+
+
+def reset_report() -> None:
+    """Start a fresh run report."""
+    import time
+    try:
+        _append_journal({"started": int(time.time())}, truncate=True)
+    except Exception as e:
+        log_warning(f"Failed to reset run report: {e}")
+
+
+def record_report(section: str, entry: dict) -> None:
+    """Append an entry to a section of the run report (one line in the journal, not a rewrite)."""
+    try:
+        _append_journal({"section": section, "entry": entry})
+    except Exception as e:
+        log_warning(f"Failed to update run report: {e}")
+
+
+def save_report() -> None:
+    """Write the assembled report to REPORT_FILE as one JSON document, atomically."""
+    temp = REPORT_FILE.with_name(f".{REPORT_FILE.name}.tmp")
+    try:
+        with open(temp, 'w') as f:
+            json.dump(load_report(), f, indent=2)
+        os.replace(temp, REPORT_FILE)
+    except Exception as e:
+        log_warning(f"Failed to write run report: {e}")
+
+
 def save_env_vars() -> None:
     """Save environment variables to file."""
     env_vars = {
@@ -358,6 +475,85 @@ def load_env_vars() -> None:
         log_warning(f"Failed to load environment variables: {e}")
 
 
+def read_meminfo() -> dict:
+    """Read /proc/meminfo as a dict of kB values (empty if unavailable)."""
+    meminfo = {}
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    meminfo[parts[0].rstrip(":")] = int(parts[1])
+    except Exception:
+        pass
+    return meminfo
+
+
+def _probe_index(timeout: float) -> bool:
+    """Try to reach the package index host, giving up after `timeout` seconds including DNS."""
+    import socket
+    import threading
+    from urllib.parse import urlparse
+    
+    index = urlparse(os.environ.get("PIP_INDEX_URL", "https://pypi.org/simple"))
+    host = index.hostname or "pypi.org"
+    port = index.port or (80 if index.scheme == "http" else 443)
+    reachable = []
+    
+    def connect() -> None:
+        try:
+            socket.create_connection((host, port), timeout=timeout).close()
+            reachable.append(True)
+        except OSError:
+            pass
+    
+    # getaddrinfo ignores socket timeouts, so bound the whole probe with a thread
+    probe = threading.Thread(target=connect, daemon=True)
+    probe.start()
+    probe.join(timeout)
+    return bool(reachable)
+
+
+def enable_offline_mode() -> None:
+    """Point every pip call at the local wheelhouse (or local index) instead of the network."""
+    wheels_dir = os.environ.get("WHEELS_DIR", str(HOME / "wheels"))
+    links = [wheels_dir] + [str(d) for d in BUNDLED_WHEEL_DIRS if d.is_dir()]
+    os.environ["PIP_FIND_LINKS"] = " ".join(links)
+    os.environ.pop("PIP_EXTRA_INDEX_URL", None)
+    if LOCAL_INDEX_URL:
+        os.environ["PIP_INDEX_URL"] = LOCAL_INDEX_URL
+    else:
+        os.environ["PIP_NO_INDEX"] = "1"
+    os.environ["PIP_DISABLE_PIP_VERSION_CHECK"] = "1"
+
+
+def network_available() -> bool:
+    """
+    Decide once per run whether the package index is reachable.
+    
+    The decision is kept in DROIDRUN_NETWORK so later phases and child
+    processes reuse it instead of probing (and timing out) again.
+    """
+    state = os.environ.get("DROIDRUN_NETWORK")
+    if state not in ("online", "offline"):
+        source = LOCAL_INDEX_URL or "the local wheelhouse"
+        if os.environ.get("DROIDRUN_OFFLINE") == "1":
+            online = False
+            log_info(f"Offline mode requested - installing from {source}, skipping network-only steps")
+        else:
+            online = _probe_index(NETWORK_PROBE_TIMEOUT)
+            if not online:
+                log_warning(f"Package index unreachable - installing offline from {source}, "
+                            "skipping network-only steps")
+        state = "online" if online else "offline"
+        os.environ["DROIDRUN_NETWORK"] = state
+    
+    if state == "offline":
+        enable_offline_mode()
+        return False
+    return True
+
+
 def setup_build_environment() -> None:
     """Setup build environment variables."""
     log_info("Setting up build environment...")
@@ -366,20 +562,7 @@ def setup_build_environment() -> None:
     os.environ["PREFIX"] = PREFIX
     
     # Set build parallelization based on available system memory
-    try:
-        if Path("/proc/meminfo").exists():
-            with open("/proc/meminfo", 'r') as f:
-                for line in f:
-                    if line.startswith("MemTotal:"):
-                        mem_kb = int(line.split()[1])
-                        mem_mb = mem_kb // 1024
-                        break
-                else:
-                    mem_mb = 0
-        else:
-            mem_mb = 0
-    except Exception:
-        mem_mb = 0
+    mem_mb = read_meminfo().get("MemTotal", 0) // 1024
     
     if mem_mb >= 3500:
         jobs = 4
@@ -410,8 +593,40 @@ def setup_build_environment() -> None:
     wheels_dir.mkdir(exist_ok=True)
     os.environ["WHEELS_DIR"] = str(wheels_dir)
     
+    # Decide online/offline before any pip call
+    network_available()
+    
+    # Rust builds share one CARGO_HOME and target directory (imported lazily to avoid a cycle)
+    try:
+        from .cargo_cache import configure_cargo_env
+    except ImportError:
+        from cargo_cache import configure_cargo_env
+    configure_cargo_env()
+    
     log_success("Build environment configured")
     save_env_vars()
+    
+    # Builds then go in a per-process workspace under ~/tmp that is removed at exit
+    # (after saving, so the env file keeps pointing at ~/tmp); imported lazily to avoid a cycle
+    try:
+        from .workspace import start_run_workspace
+    except ImportError:
+        from workspace import start_run_workspace
+    run_dir = start_run_workspace()
+
+    # Rust builds in the workspace take crates from the vendored mirror, if one was built
+    try:
+        from .crate_mirror import use_crate_mirror
+    except ImportError:
+        from crate_mirror import use_crate_mirror
+    use_crate_mirror(run_dir)
+
+    # pip also looks at whatever the prefetcher has downloaded
+    try:
+        from .prefetch import use_prefetched
+    except ImportError:
+        from prefetch import use_prefetched
+    use_prefetched()
 
 
 def get_clean_env() -> dict:
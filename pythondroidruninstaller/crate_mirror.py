@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""Local vendored mirror of the crates the Rust-based packages need, used through Cargo source replacement."""
+
+import os
+import re
+import sys
+import json
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Optional, List, Dict
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, network_available, HOME, log_info, log_success, log_warning, log_error
+    from .process_monitor import run_monitored
+    from .workspace import build_workspace, dir_size
+    from .prefetch import index_links, choose_file, download_file
+except ImportError:
+    from common import record_report, network_available, HOME, log_info, log_success, log_warning, log_error
+    from process_monitor import run_monitored
+    from workspace import build_workspace, dir_size
+    from prefetch import index_links, choose_file, download_file
+
+
+# Set to 0 to fetch crates from crates.io even offline with a mirror
+CRATE_MIRROR = os.environ.get("DROIDRUN_CRATE_MIRROR", "1") != "0"
+
+CRATE_MIRROR_DIR = Path(os.environ.get("DROIDRUN_CRATE_MIRROR_DIR", str(HOME / ".cache" / "droidrun-crates")))
+MANIFEST_NAME = "droidrun-mirror.json"
+SOURCE_NAME = "droidrun-vendor"
+
+
+def _has_native_code(dist) -> bool:
+    """Whether an installed distribution ships an extension module or an ELF executable."""
+    for entry in dist.files or []:
+        name = entry.parts[-1] if entry.parts else ""
+        if name.endswith((".so", ".pyd")) or ".so." in name:
+            return True
+        if entry.parts and entry.parts[0] == "..":
+            try:
+                with open(dist.locate_file(entry), 'rb') as f:
+                    if f.read(4) == b"\x7fELF":
+                        return True
+            except OSError:
+                continue
+    return False
+
+
+def pinned_requirements(pins: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    name==version for everything that may be built with Cargo: every entry of
+    pins if given, else every installed distribution.
+
+    Which ones are Rust is only known once their sdists are unpacked, so the
+    only ones left out here are installed at the pinned version with no
+    native code at all (pure Python, no Cargo build behind them).
+    """
+    from importlib import metadata
+    from packaging.utils import canonicalize_name
+
+    installed = {}
+    for dist in metadata.distributions():
+        name = canonicalize_name(dist.metadata["Name"] or "")
+        if name and name not in installed:
+            installed[name] = dist
+    if pins is None:
+        pins = {name: dist.version for name, dist in installed.items()}
+
+    requirements = []
+    for name, version in sorted(pins.items()):
+        dist = installed.get(canonicalize_name(name))
+        if dist is not None and dist.version == version and not _has_native_code(dist):
+            continue
+        requirements.append(f"{name}=={version}")
+    return requirements
+
+
+def _extract(sdist: Path, dest: Path) -> None:
+    if sdist.name.endswith(".zip"):
+        with zipfile.ZipFile(sdist) as zf:
+            zf.extractall(dest)
+        return
+    with tarfile.open(sdist) as tar:
+        if hasattr(tarfile, "data_filter"):
+            tar.extractall(dest, filter="data")
+        else:
+            tar.extractall(dest)
+
+
+def cargo_manifests(source_dir: Path) -> List[Path]:
+    """Cargo.toml files with a Cargo.lock next to them: the roots the build resolves crates for."""
+    return sorted(lock.parent / "Cargo.toml" for lock in source_dir.rglob("Cargo.lock")
+                  if (lock.parent / "Cargo.toml").exists())
+
+
+def download_sources(requirements: List[str], dest: Path) -> List[Path]:
+    """
+    Download the sdist of each requirement into dest; returns the ones that were found.
+
+    The index is asked directly, as in meson_builds: `pip download` would
+    prepare metadata, which for meson-python packages is a full build.
+    """
+    from packaging.requirements import Requirement, InvalidRequirement
+
+    sdists = []
+    for requirement in requirements:
+        try:
+            name = Requirement(requirement).name
+            links = [link for link in index_links(name) if not link[0].endswith(".whl")]
+            chosen = choose_file(name, requirement, links)
+            if chosen is None:
+                log_warning(f"No sdist of {requirement} on the index")
+                continue
+            download_file(chosen[1], dest / chosen[0])
+        except (OSError, ValueError, InvalidRequirement) as e:
+            log_warning(f"Could not download the source of {requirement}: {e}")
+            continue
+        sdists.append(dest / chosen[0])
+    return sdists
+
+
+def vendor_crates(manifests: List[Path], dest: Path) -> Optional[str]:
+    """
+    Vendor the locked crates of all manifests into dest with one `cargo vendor`.
+
+    Returns the source replacement config Cargo prints, naming dest, or None.
+    """
+    cmd = ["cargo", "vendor", "--versioned-dirs", "--manifest-path", str(manifests[0])]
+    for manifest in manifests[1:]:
+        cmd += ["--sync", str(manifest)]
+    # cargo vendor ignores [source] replacement, so an existing mirror does not hide crates.io here
+    result = run_monitored(cmd + [str(dest)], capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        log_error(f"cargo vendor failed: {(result.stderr or '').strip()[-500:]}")
+        return None
+    return result.stdout
+
+
+def build_mirror(requirements: List[str], dest: Path = CRATE_MIRROR_DIR) -> bool:
+    """Download the sources of requirements and replace the mirror with their vendored crates."""
+    if not shutil.which("cargo"):
+        log_error("cargo is not installed")
+        return False
+
+    with build_workspace("crate-mirror") as work_dir:
+        downloads = work_dir / "sdists"
+        downloads.mkdir()
+        manifests = []
+        sdists = []
+        for sdist in download_sources(requirements, downloads):
+            source_dir = work_dir / "src" / sdist.name
+            _extract(sdist, source_dir)
+            # Most sdists are not Rust; those without a Cargo.lock have nothing to vendor
+            found = cargo_manifests(source_dir)
+            if not found:
+                shutil.rmtree(source_dir, ignore_errors=True)
+                continue
+            sdists.append(sdist)
+            manifests.extend(found)
+        if not manifests:
+            log_error("No Cargo projects to vendor")
+            return False
+
+        # Vendor next to the mirror, then swap, so a failed run keeps the old mirror
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        staging = dest.with_name(f".{dest.name}.new")
+        shutil.rmtree(staging, ignore_errors=True)
+        config = vendor_crates(manifests, staging)
+        if config is None:
+            shutil.rmtree(staging, ignore_errors=True)
+            return False
+
+    config = config.replace("vendored-sources", SOURCE_NAME)
+    config = re.sub(r'(?m)^directory = .*$', f'directory = "{dest}"', config)
+    crates = sorted(p.name for p in staging.iterdir() if p.is_dir())
+    with open(staging / MANIFEST_NAME, 'w') as f:
+        json.dump({
+            "packages": sorted(sdist.name for sdist in sdists),
+            "crates": crates,
+            "config": config,
+        }, f, indent=2)
+
+    if dest.exists():
+        old = dest.with_name(f".{dest.name}.old")
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(dest, old)
+        os.replace(staging, dest)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(staging, dest)
+
+    size = dir_size(dest)
+    log_success(f"Mirrored {len(crates)} crates for {len(sdists)} packages "
+                f"({size / 1048576:.1f} MB) in {dest}")
+    record_report("crate_mirror", {
+        "packages": sorted(sdist.name for sdist in sdists),
+        "crates": len(crates),
+        "size_mb": round(size / 1048576, 1),
+    })
+    return True
+
+
+def load_mirror(mirror_dir: Path = CRATE_MIRROR_DIR) -> dict:
+    try:
+        with open(mirror_dir / MANIFEST_NAME, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def use_crate_mirror(config_root: Path) -> bool:
+    """
+    Make Cargo builds under config_root take crates from the mirror, when offline.
+
+    Cargo reads .cargo/config.toml from the directories above the build, and
+    pip builds inside the run workspace, so writing it there limits source
+    replacement to the installer's own builds. Source replacement has no
+    fallback: a crate the mirror lacks (a package that moved to a new
+    release, a Rust sdist pulled in as a dependency) fails to resolve. So
+    online runs keep using crates.io, and the mirror only stands in for it
+    when there is no network.
+    """
+    if not CRATE_MIRROR or network_available():
+        return False
+    manifest = load_mirror()
+    if not manifest.get("config"):
+        return False
+    cargo_dir = config_root / ".cargo"
+    cargo_dir.mkdir(parents=True, exist_ok=True)
+    (cargo_dir / "config.toml").write_text(manifest["config"])
+    log_info(f"Rust builds use the crate mirror ({len(manifest.get('crates', []))} crates)")
+    return True
+
+
+def main() -> int:
+    """Build, show or remove the crate mirror."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Vendored crate mirror for offline Rust builds")
+    subparsers = parser.add_subparsers(dest="command")
+    vendor_parser = subparsers.add_parser("vendor", help="(re)build the mirror")
+    vendor_parser.add_argument("--lock", type=Path, help="pip freeze style name==version list to mirror for")
+    vendor_parser.add_argument("requirements", nargs="*",
+                               help="requirements to mirror (default: every installed distribution, pinned)")
+    subparsers.add_parser("status", help="show what the mirror holds")
+    subparsers.add_parser("remove", help="delete the mirror")
+    args = parser.parse_args()
+
+    if args.command == "vendor":
+        pins = None
+        if args.lock:
+            try:
+                from .fast_install import read_pins
+            except ImportError:
+                from fast_install import read_pins
+            pins = read_pins(args.lock)
+        return 0 if build_mirror(args.requirements or pinned_requirements(pins)) else 1
+    if args.command == "remove":
+        shutil.rmtree(CRATE_MIRROR_DIR, ignore_errors=True)
+        log_success(f"Removed {CRATE_MIRROR_DIR}")
+        return 0
+
+    manifest = load_mirror()
+    if not manifest:
+        log_info("No crate mirror")
+        return 0
+    print(f"Mirror:   {CRATE_MIRROR_DIR} ({dir_size(CRATE_MIRROR_DIR) / 1048576:.1f} MB)")
+    print(f"Crates:   {len(manifest['crates'])}")
+    for package in manifest["packages"]:
+        print(f"  {package}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""Turn a verified installation into one Termux .deb, built from the installed RECORD files."""
+
+import io
+import os
+import sys
+import time
+import hashlib
+import platform
+import tarfile
+from pathlib import Path
+from typing import Optional, List, Dict, Set, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, PREFIX, log_info, log_success, log_warning, log_error
+    from .snapshots import site_dirs
+    from .elf_check import read_elf, resolve
+except ImportError:
+    from common import record_report, PREFIX, log_info, log_success, log_warning, log_error
+    from snapshots import site_dirs
+    from elf_check import read_elf, resolve
+
+
+DEB_NAME = "droidrun-env"
+MAINTAINER = "droidrun installer <noreply@droidrun.ai>"
+
+# The installer itself is not part of the environment it installs
+EXCLUDE = {"pythondroidruninstaller"}
+
+# Termux architecture names, by platform.machine()
+DEB_ARCHITECTURES = {
+    "aarch64": "aarch64",
+    "arm64": "aarch64",
+    "armv7l": "arm",
+    "armv8l": "arm",
+    "x86_64": "x86_64",
+    "amd64": "x86_64",
+    "i686": "i686",
+}
+
+
+class Distribution:
+    """An installed distribution, the files its RECORD lists, and those of them that are gone."""
+
+    def __init__(self, name: str, version: str, files: List[Path], missing: List[Path]):
+        self.name = name
+        self.version = version
+        self.files = files
+        self.missing = missing
+
+
+def zip_bundle() -> Tuple[List[Path], Set[Path]]:
+    """
+    (the zip and its .pth file, the files moved into the zip) for the
+    zipbundle of pure-Python distributions, if one exists. No RECORD lists
+    the zip or the .pth, and the bundled files are gone from disk.
+    """
+    try:
+        from .zipbundle import load_manifest, BUNDLE_NAME
+    except ImportError:
+        from zipbundle import load_manifest, BUNDLE_NAME
+
+    manifest = load_manifest()
+    if not manifest:
+        return [], set()
+    site = Path(manifest["site"])
+    files = [path for path in (site / f"{BUNDLE_NAME}.zip", site / f"{BUNDLE_NAME}.pth") if path.is_file()]
+    moved = {site / rel for entry in manifest.get("distributions", []) for rel in entry["files"]}
+    return files, moved
+
+
+def installed_distributions(sites: Optional[List[Path]] = None,
+                            bundled: Set[Path] = frozenset()) -> List[Distribution]:
+    """
+    The distributions in site-packages with the absolute paths of their files,
+    including console scripts and data installed outside site-packages.
+
+    Files a RECORD lists but that are gone go in missing, except files in
+    bundled (moved into the zipbundle) and cached bytecode, which Python
+    writes again.
+    """
+    from importlib import metadata
+    from packaging.utils import canonicalize_name
+
+    distributions: Dict[str, Distribution] = {}
+    for site in sites if sites is not None else site_dirs():
+        for dist in metadata.distributions(path=[str(site)]):
+            name = canonicalize_name(dist.metadata["Name"] or "")
+            if not name or name in distributions or name in EXCLUDE:
+                continue
+            files, missing = [], []
+            for entry in dist.files or []:
+                path = Path(os.path.normpath(dist.locate_file(entry)))
+                if path.is_file() or path.is_symlink():
+                    files.append(path)
+                elif path not in bundled and "__pycache__" not in path.parts:
+                    missing.append(path)
+            distributions[name] = Distribution(name, dist.version, files, missing)
+    return sorted(distributions.values(), key=lambda d: d.name)
+
+
+def missing_files(distributions: List[Distribution]) -> List[str]:
+    """One problem per distribution whose RECORD lists files that are not there."""
+    return [f"{dist.name}: {len(dist.missing)} files in its RECORD are missing ({dist.missing[0]})"
+            for dist in distributions if dist.missing]
+
+
+def dpkg_owners() -> Dict[str, str]:
+    """Map every path a deb installed to the deb's name, read from dpkg's .list files."""
+    owners: Dict[str, str] = {}
+    for info_dir in (Path(PREFIX) / "var" / "lib" / "dpkg" / "info", Path("/var/lib/dpkg/info")):
+        if not info_dir.is_dir():
+            continue
+        for list_file in info_dir.glob("*.list"):
+            # Multi-arch debs are listed as name:arch.list
+            package = list_file.stem.split(":", 1)[0]
+            try:
+                with open(list_file, 'r', errors="replace") as f:
+                    for line in f:
+                        owners.setdefault(line.rstrip("\n"), package)
+            except OSError:
+                continue
+        break
+    return owners
+
+
+def deb_owner(path: str, owners: Dict[str, str]) -> Optional[str]:
+    return owners.get(path) or owners.get(os.path.realpath(path))
+
+
+def deb_architecture() -> str:
+    return DEB_ARCHITECTURES.get(platform.machine().lower(), platform.machine().lower())
+
+
+def rewrite_shebang(data: bytes, old_prefix: str, new_prefix: str) -> bytes:
+    """Point a script's #! line at new_prefix if it names old_prefix; anything else is returned as is."""
+    if old_prefix == new_prefix or not data.startswith(b"#!"):
+        return data
+    line, sep, rest = data.partition(b"\n")
+    old, new = old_prefix.encode(), new_prefix.encode()
+    if old + b"/" not in line:
+        return data
+    return line.replace(old + b"/", new + b"/") + sep + rest
+
+
+def plan_package(distributions: List[Distribution],
+                 owners: Dict[str, str]) -> Tuple[List[Path], List[str], List[str], List[Tuple[str, str]]]:
+    """
+    Split the installation into what the .deb ships and what it depends on.
+
+    Returns (files to ship, debs to depend on, distributions left to their
+    debs, (file, library) pairs whose library no deb provides). A
+    distribution with any file owned by a deb (python-numpy, python-pip...)
+    is left to that deb and depended on, since shipping its files would
+    clash with it. The libraries the shipped extensions load make the rest
+    of Depends.
+    """
+    files: List[Path] = []
+    depends: List[str] = []
+    from_debs: List[str] = []
+    unowned: List[Tuple[str, str]] = []
+    shipped = set()
+
+    for dist in distributions:
+        deb = next((d for d in (deb_owner(str(p), owners) for p in dist.files) if d), None)
+        if deb:
+            from_debs.append(dist.name)
+            if deb not in depends:
+                depends.append(deb)
+            continue
+        files.extend(dist.files)
+    shipped.update(str(p) for p in files)
+
+    for path in files:
+        if not (path.name.endswith(".so") or ".so." in path.name) or path.is_symlink():
+            continue
+        info = read_elf(path)
+        if info is None:
+            continue
+        for lib in info.needed:
+            resolved = resolve(lib, info, str(path.parent))
+            if resolved is None or resolved in shipped:
+                continue
+            deb = deb_owner(resolved, owners)
+            if deb is None:
+                # Android's own libraries (libc, libm, liblog...) come with the system
+                if not resolved.startswith(f"{PREFIX}/"):
+                    continue
+                unowned.append((str(path), lib))
+            elif deb not in depends:
+                depends.append(deb)
+    return files, depends, from_debs, unowned
+
+
+def python_depends(python_deb: str) -> List[str]:
+    """The interpreter's deb, pinned to this Python version: the extensions are built for its ABI."""
+    major, minor = sys.version_info[:2]
+    return [f"{python_deb} (>= {major}.{minor})", f"{python_deb} (<< {major}.{minor + 1})"]
+
+
+def control_file(name: str, version: str, depends: List[str], installed_kb: int, summary: str) -> str:
+    return (
+        f"Package: {name}\n"
+        f"Version: {version}\n"
+        f"Architecture: {deb_architecture()}\n"
+        f"Maintainer: {MAINTAINER}\n"
+        f"Installed-Size: {installed_kb}\n"
+        f"Depends: {', '.join(depends)}\n"
+        f"Description: droidrun with its whole Python environment\n"
+        f" {summary}\n"
+    )
+
+
+def _tar_info(arcname: str, size: int, mode: int, mtime: float) -> tarfile.TarInfo:
+    info = tarfile.TarInfo(arcname)
+    info.size = size
+    info.mode = mode
+    info.mtime = int(mtime)
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    return info
+
+
+def _add_dirs(tar: tarfile.TarFile, arcname: str, added: set) -> None:
+    """Add the parent directories of arcname that are not in the archive yet, dpkg wants them listed."""
+    parts = arcname.split("/")[1:-1]
+    for i in range(1, len(parts) + 1):
+        directory = "./" + "/".join(parts[:i])
+        if directory in added:
+            continue
+        added.add(directory)
+        info = _tar_info(directory + "/", 0, 0o755, time.time())
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+
+
+def write_data_tar(files: List[Path], dest: Path, old_prefix: str, new_prefix: str) -> Tuple[str, int]:
+    """
+    Write data.tar.xz with files at their installed paths, moved from
+    old_prefix to new_prefix. Returns (md5sums file, installed size in bytes).
+    """
+    md5sums = []
+    size = 0
+    added: set = set()
+    with tarfile.open(dest, "w:xz") as tar:
+        for path in sorted(files):
+            target = str(path)
+            if target == old_prefix or target.startswith(old_prefix + "/"):
+                target = new_prefix + target[len(old_prefix):]
+            arcname = "." + target
+            _add_dirs(tar, arcname, added)
+            st = path.lstat()
+            if path.is_symlink():
+                info = _tar_info(arcname, 0, 0o777, st.st_mtime)
+                info.type = tarfile.SYMTYPE
+                info.linkname = os.readlink(path)
+                tar.addfile(info)
+                continue
+            data = path.read_bytes()
+            if path.parent.name == "bin":
+                data = rewrite_shebang(data, old_prefix, new_prefix)
+            elif path.suffix == ".pth" and old_prefix != new_prefix:
+                # Path lines, such as the zipbundle's
+                data = data.replace(old_prefix.encode() + b"/", new_prefix.encode() + b"/")
+            tar.addfile(_tar_info(arcname, len(data), st.st_mode & 0o7777, st.st_mtime), io.BytesIO(data))
+            md5sums.append(f"{hashlib.md5(data).hexdigest()}  {arcname[2:]}\n")
+            size += len(data)
+    return "".join(md5sums), size
+
+
+def write_control_tar(dest: Path, control: str, md5sums: str) -> None:
+    with tarfile.open(dest, "w:xz") as tar:
+        for name, text in (("control", control), ("md5sums", md5sums)):
+            data = text.encode()
+            tar.addfile(_tar_info(f"./{name}", len(data), 0o644, time.time()), io.BytesIO(data))
+
+
+def write_ar(dest: Path, members: List[Tuple[str, Path]]) -> None:
+    """Write the ar archive a .deb is: debian-binary first, then the control and data tarballs."""
+    with open(dest, 'wb') as out:
+        out.write(b"!<arch>\n")
+        for name, path in members:
+            size = path.stat().st_size
+            header = f"{name:<16}{int(time.time()):<12}{0:<6}{0:<6}{'100644':<8}{size:<10}`\n"
+            out.write(header.encode())
+            with open(path, 'rb') as f:
+                while True:
+                    block = f.read(1 << 20)
+                    if not block:
+                        break
+                    out.write(block)
+            if size % 2:
+                out.write(b"\n")
+
+
+def verify_installation() -> List[str]:
+    """Problems that make the installation unfit to export: version mismatches, or no droidrun."""
+    try:
+        from .check_dependencies import check_all
+    except ImportError:
+        from check_dependencies import check_all
+
+    report = check_all()
+    problems = [f"{r['package']} {r['found']} does not satisfy {r['spec']}"
+                for r in report["results"] if r["status"] == "mismatch"]
+    if not any(r["package"] == "droidrun" and r["status"] == "ok" for r in report["results"]):
+        problems.append("droidrun is not installed")
+    missing = [r["package"] for r in report["results"] if r["status"] == "missing"]
+    if missing:
+        log_warning(f"Not installed, so not in the package: {', '.join(missing)}")
+    return problems
+
+
+def export_deb(output_dir: Path, name: str = DEB_NAME, version: Optional[str] = None,
+               prefix: Optional[str] = None, force: bool = False) -> Optional[Path]:
+    """
+    Build <name>_<version>_<arch>.deb of the installed environment in output_dir.
+
+    The files come from the installed RECORDs, so exactly what pip installed
+    is shipped, compiled .pyc files included, plus the zipbundle if there is
+    one. prefix relocates the package:
+    paths under sys.prefix are moved under it and script shebangs rewritten
+    (the default, sys.prefix, installs everything where it is now).
+    Unless force is set, an installation that fails the dependency check, or
+    whose extensions need libraries nothing provides, is not exported.
+    """
+    from importlib import metadata
+
+    try:
+        from .workspace import build_workspace
+    except ImportError:
+        from workspace import build_workspace
+
+    started = time.monotonic()
+    problems = verify_installation()
+    owners = dpkg_owners()
+    if not owners:
+        log_warning("No dpkg database found, Depends only lists Python")
+    bundle_files, bundled = zip_bundle()
+    distributions = installed_distributions(bundled=bundled)
+    files, depends, from_debs, unowned = plan_package(distributions, owners)
+    files += bundle_files
+    problems += missing_files(distributions)
+    problems += [f"{path} needs {lib}, which no installed package provides" for path, lib in unowned]
+    if problems:
+        for problem in problems:
+            log_warning(problem)
+        if not force:
+            log_error("Installation not verified, nothing exported (use --force to export anyway)")
+            return None
+
+    python_deb = deb_owner(os.path.realpath(sys.executable), owners) or "python"
+    depends = python_depends(python_deb) + [d for d in depends if d != python_deb]
+    if version is None:
+        try:
+            droidrun_version = metadata.version("droidrun")
+        except metadata.PackageNotFoundError:
+            droidrun_version = "0"
+        # A rebuild of the same droidrun version is still an upgrade
+        version = f"{droidrun_version}+{time.strftime('%Y%m%d%H%M')}"
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    deb = output_dir / f"{name}_{version}_{deb_architecture()}.deb"
+    shipped = len(distributions) - len(from_debs)
+    with build_workspace("deb-export") as work_dir:
+        log_info(f"Packing {len(files)} files of {shipped} distributions...")
+        md5sums, size = write_data_tar(files, work_dir / "data.tar.xz", sys.prefix, prefix or sys.prefix)
+        summary = f"{shipped} Python distributions installed by the droidrun installer."
+        write_control_tar(work_dir / "control.tar.xz",
+                          control_file(name, version, depends, (size + 1023) // 1024, summary), md5sums)
+        (work_dir / "debian-binary").write_text("2.0\n")
+        partial = deb.with_name(f".{deb.name}.part")
+        write_ar(partial, [("debian-binary", work_dir / "debian-binary"),
+                           ("control.tar.xz", work_dir / "control.tar.xz"),
+                           ("data.tar.xz", work_dir / "data.tar.xz")])
+        os.replace(partial, deb)
+
+    elapsed = time.monotonic() - started
+    log_success(f"Wrote {deb} ({deb.stat().st_size / 1048576:.1f} MB, {elapsed:.0f}s)")
+    log_info(f"Depends: {', '.join(depends)}")
+    record_report("deb_export", {
+        "deb": str(deb),
+        "distributions": shipped,
+        "from_debs": from_debs,
+        "files": len(files),
+        "depends": depends,
+        "size_mb": round(deb.stat().st_size / 1048576, 1),
+        "seconds": round(elapsed, 1),
+    })
+    return deb
+
+
+def main() -> int:
+    """Export the installed environment as a .deb."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Package the installed droidrun environment as a .deb")
+    parser.add_argument("--output", type=Path, default=Path.cwd(), help="directory to write the .deb to")
+    parser.add_argument("--name", default=DEB_NAME, help="package name (default: %(default)s)")
+    parser.add_argument("--version", help="package version (default: droidrun's version and a timestamp)")
+    parser.add_argument("--prefix", help="prefix the .deb installs into, e.g. for another Termux "
+                                         "package name (default: this Python's prefix)")
+    parser.add_argument("--force", action="store_true", help="export even if the installation fails the checks")
+    args = parser.parse_args()
+
+    prefix = args.prefix.rstrip("/") if args.prefix else None
+    deb = export_deb(args.output, args.name, args.version, prefix, args.force)
+    return 0 if deb else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Static check that the shared libraries ELF files need can be found, without loading anything."""
+
+import os
+import sys
+import glob
+import time
+import struct
+import zipfile
+import posixpath
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, List, Dict, Set, Tuple, BinaryIO
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, IS_TERMUX, PREFIX, log_info, log_success, log_warning
+except ImportError:
+    from common import record_report, IS_TERMUX, PREFIX, log_info, log_success, log_warning
+
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+# Set to 0 to skip checking wheels after `pip wheel`
+ELF_CHECK = os.environ.get("DROIDRUN_ELF_CHECK", "1") != "0"
+
+# Bionic ignores DT_RPATH (and warns); only DT_RUNPATH and LD_LIBRARY_PATH count
+HONORS_RPATH = not IS_TERMUX
+
+ANDROID_LIB_DIRS = {
+    64: ["/system/lib64", "/apex/com.android.runtime/lib64/bionic", "/vendor/lib64", "/odm/lib64"],
+    32: ["/system/lib", "/apex/com.android.runtime/lib/bionic", "/vendor/lib", "/odm/lib"],
+}
+
+
+class ElfInfo:
+    """The dynamic section of an ELF file, as far as library lookup is concerned."""
+
+    def __init__(self, bits: int, machine: int, needed: List[str], rpath: List[str], runpath: List[str]):
+        self.bits = bits
+        self.machine = machine
+        self.needed = needed
+        self.rpath = rpath
+        self.runpath = runpath
+
+
+def _ident(header: bytes) -> Optional[Tuple[int, str, int]]:
+    """(bits, struct byte order, e_machine) from the first 20 bytes, or None if not ELF."""
+    if len(header) < 20 or header[:4] != b"\x7fELF" or header[4] not in (1, 2) or header[5] not in (1, 2):
+        return None
+    bits = 32 if header[4] == 1 else 64
+    order = "<" if header[5] == 1 else ">"
+    machine = struct.unpack_from(order + "H", header, 18)[0]
+    return bits, order, machine
+
+
+def _read_at(f: BinaryIO, offset: int, size: int) -> bytes:
+    f.seek(offset)
+    return f.read(size)
+
+
+def parse_elf(f: BinaryIO) -> Optional[ElfInfo]:
+    """
+    Read DT_NEEDED, DT_RPATH and DT_RUNPATH from a seekable ELF file.
+
+    Only the header, the program headers, the dynamic segment and the
+    dynamic string table are read. Returns None for files that are not
+    ELF; static files come back with no needed libraries.
+    """
+    header = _read_at(f, 0, 64)
+    ident = _ident(header)
+    if ident is None:
+        return None
+    bits, order, machine = ident
+    if bits == 64:
+        phoff, = struct.unpack_from(order + "Q", header, 32)
+        phentsize, phnum = struct.unpack_from(order + "HH", header, 54)
+        phdr_fmt, dyn_fmt = order + "IIQQQQ", order + "qQ"
+    else:
+        phoff, = struct.unpack_from(order + "I", header, 28)
+        phentsize, phnum = struct.unpack_from(order + "HH", header, 42)
+        phdr_fmt, dyn_fmt = order + "IIIIII", order + "iI"
+
+    loads = []
+    dynamic = None
+    table = _read_at(f, phoff, phentsize * phnum)
+    for i in range(phnum):
+        fields = struct.unpack_from(phdr_fmt, table, i * phentsize)
+        if bits == 64:
+            p_type, _, p_offset, p_vaddr, _, p_filesz = fields
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz, _ = fields
+        if p_type == PT_LOAD:
+            loads.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic = (p_offset, p_filesz)
+    if dynamic is None:
+        return ElfInfo(bits, machine, [], [], [])
+
+    entries: Dict[int, List[int]] = {}
+    data = _read_at(f, dynamic[0], dynamic[1])
+    entry_size = struct.calcsize(dyn_fmt)
+    for pos in range(0, len(data) - entry_size + 1, entry_size):
+        tag, value = struct.unpack_from(dyn_fmt, data, pos)
+        if tag == DT_NULL:
+            break
+        entries.setdefault(tag, []).append(value)
+
+    strtab = entries.get(DT_STRTAB, [None])[0]
+    strsz = entries.get(DT_STRSZ, [0])[0]
+    # DT_STRTAB is an address; the PT_LOAD that maps it gives the file offset
+    for vaddr, offset, filesz in loads:
+        if strtab is not None and vaddr <= strtab < vaddr + filesz:
+            strings = _read_at(f, strtab - vaddr + offset, strsz)
+            break
+    else:
+        return ElfInfo(bits, machine, [], [], [])
+
+    def string(index: int) -> str:
+        end = strings.find(b"\0", index)
+        return strings[index:end if end >= 0 else None].decode("utf-8", errors="replace")
+
+    def paths(tag: int) -> List[str]:
+        return [p for value in entries.get(tag, []) for p in string(value).split(":") if p]
+
+    return ElfInfo(bits, machine, [string(v) for v in entries.get(DT_NEEDED, [])],
+                   paths(DT_RPATH), paths(DT_RUNPATH))
+
+
+def read_elf(path: Path) -> Optional[ElfInfo]:
+    try:
+        with open(path, 'rb') as f:
+            return parse_elf(f)
+    except (OSError, struct.error):
+        return None
+
+
+@lru_cache(maxsize=None)
+def _library_ident(path: str) -> Optional[Tuple[int, int]]:
+    """(bits, machine) of a library on disk; a 32-bit library does not satisfy a 64-bit object."""
+    try:
+        with open(path, 'rb') as f:
+            ident = _ident(f.read(20))
+    except OSError:
+        return None
+    return (ident[0], ident[2]) if ident else None
+
+
+def _ld_so_conf(path: str = "/etc/ld.so.conf", depth: int = 0) -> List[str]:
+    dirs: List[str] = []
+    try:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return dirs
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if line.startswith("include ") and depth < 4:
+            pattern = line.split(None, 1)[1]
+            pattern = pattern if pattern.startswith("/") else os.path.join(os.path.dirname(path), pattern)
+            for conf in sorted(glob.glob(pattern)):
+                dirs.extend(_ld_so_conf(conf, depth + 1))
+        elif line:
+            dirs.append(line)
+    return dirs
+
+
+@lru_cache(maxsize=None)
+def system_lib_dirs(bits: int) -> Tuple[str, ...]:
+    """Directories the dynamic linker searches when nothing else matches."""
+    if IS_TERMUX:
+        return tuple(ANDROID_LIB_DIRS[bits])
+    default = ["/lib64", "/usr/lib64"] if bits == 64 else ["/lib32", "/usr/lib32"]
+    return tuple(_ld_so_conf() + default + ["/lib", "/usr/lib"])
+
+
+def search_dirs(info: ElfInfo, origin: str) -> List[str]:
+    """Where the dynamic linker looks for info's libraries, in order, with $ORIGIN expanded."""
+    def expand(entries: List[str]) -> List[str]:
+        return [e.replace("${ORIGIN}", origin).replace("$ORIGIN", origin) for e in entries]
+
+    dirs = []
+    if HONORS_RPATH and not info.runpath:
+        dirs += expand(info.rpath)
+    dirs += [d for d in os.environ.get("LD_LIBRARY_PATH", "").split(":") if d]
+    dirs += expand(info.runpath)
+    # The installer puts PREFIX/lib on LD_LIBRARY_PATH for everything it installs
+    dirs.append(f"{PREFIX}/lib")
+    dirs += system_lib_dirs(info.bits)
+    return dirs
+
+
+def resolve(name: str, info: ElfInfo, origin: str, bundled: Set[str] = frozenset()) -> Optional[str]:
+    """
+    Find the library the dynamic linker would load for name.
+
+    origin is the directory of the object. For an object inside a wheel it
+    is the archive path of that directory; search directories relative to
+    it are then looked up in bundled (the wheel's members) instead of on disk.
+    """
+    if "/" in name:
+        return name if os.path.exists(name) else None
+    for directory in search_dirs(info, origin):
+        if not directory.startswith("/"):
+            member = posixpath.normpath(posixpath.join(directory, name))
+            if member in bundled:
+                return member
+            continue
+        candidate = os.path.join(directory, name)
+        if _library_ident(candidate) == (info.bits, info.machine):
+            return candidate
+    return None
+
+
+def _is_shared_object(name: str) -> bool:
+    base = name.rsplit("/", 1)[-1]
+    return base.endswith(".so") or ".so." in base
+
+
+def check_wheel(wheel: Path) -> List[Tuple[str, str]]:
+    """(member, library) for every library a shared object in the wheel needs and cannot find."""
+    missing = []
+    with zipfile.ZipFile(wheel) as zf:
+        names = set(zf.namelist())
+        for name in sorted(names):
+            if not _is_shared_object(name):
+                continue
+            with zf.open(name) as f:
+                try:
+                    info = parse_elf(f)
+                except struct.error:
+                    info = None
+            if info is None:
+                continue
+            for lib in info.needed:
+                if resolve(lib, info, posixpath.dirname(name) or ".", names) is None:
+                    missing.append((name, lib))
+    return missing
+
+
+def check_installed(sites: Optional[List[Path]] = None) -> List[Tuple[str, str]]:
+    """(path, library) for every unresolvable library of the shared objects under site-packages."""
+    if sites is None:
+        try:
+            from .snapshots import site_dirs
+        except ImportError:
+            from snapshots import site_dirs
+        sites = site_dirs()
+    missing = []
+    for site in sites:
+        for root, _, files in os.walk(site):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                if not _is_shared_object(file_name) or os.path.islink(path):
+                    continue
+                info = read_elf(Path(path))
+                if info is None:
+                    continue
+                for lib in info.needed:
+                    if resolve(lib, info, root) is None:
+                        missing.append((path, lib))
+    return missing
+
+
+def check_wheels(wheels: List[Path]) -> Dict[str, List[Tuple[str, str]]]:
+    """Check wheels and warn about (and record) those with unresolvable libraries."""
+    problems = {}
+    for wheel in wheels:
+        started = time.monotonic()
+        try:
+            missing = check_wheel(wheel)
+        except (OSError, zipfile.BadZipFile) as e:
+            log_warning(f"Could not check {wheel.name}: {e}")
+            continue
+        if not missing:
+            continue
+        problems[wheel.name] = missing
+        libs = sorted({lib for _, lib in missing})
+        log_warning(f"{wheel.name}: {len(missing)} unresolvable dependencies ({', '.join(libs)})")
+        record_report("elf_check", {
+            "wheel": wheel.name,
+            "missing": [{"file": member, "library": lib} for member, lib in missing],
+            "ms": round((time.monotonic() - started) * 1000, 1),
+        })
+    return problems
+
+
+def main() -> int:
+    """Check wheels or installed extensions; exits 1 if a library cannot be found."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check that the libraries ELF files need can be found")
+    parser.add_argument("paths", nargs="*", type=Path, help="wheels or wheel directories")
+    parser.add_argument("--installed", action="store_true", help="check extensions in site-packages")
+    args = parser.parse_args()
+
+    if not args.paths and not args.installed:
+        parser.error("give wheels or wheel directories, or --installed")
+
+    missing: List[Tuple[str, str, str]] = []
+    started = time.monotonic()
+    count = 0
+    for path in args.paths:
+        wheels = sorted(path.glob("*.whl")) if path.is_dir() else [path]
+        for wheel in wheels:
+            count += 1
+            missing.extend((wheel.name, member, lib) for member, lib in check_wheel(wheel))
+    if args.installed:
+        missing.extend(("site-packages", path, lib) for path, lib in check_installed())
+    elapsed = time.monotonic() - started
+
+    for where, member, lib in missing:
+        print(f"{where}: {member} needs {lib}, not found")
+    if count:
+        log_info(f"Checked {count} wheels in {elapsed * 1000:.0f} ms")
+    if missing:
+        log_warning(f"{len(missing)} unresolvable library dependencies")
+        return 1
+    log_success("All library dependencies resolve")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Pack the installed environment into one archive and unpack it on another device, rewriting the prefix."""
+
+import io
+import os
+import sys
+import json
+import time
+import tarfile
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, IS_TERMUX, log_info, log_success, log_warning, log_error
+    from .deb_export import (
+        installed_distributions, zip_bundle, missing_files, dpkg_owners, plan_package, deb_architecture, deb_owner
+    )
+except ImportError:
+    from common import record_report, IS_TERMUX, log_info, log_success, log_warning, log_error
+    from deb_export import (
+        installed_distributions, zip_bundle, missing_files, dpkg_owners, plan_package, deb_architecture, deb_owner
+    )
+
+
+# First member of every archive
+MANIFEST_NAME = "droidrun-env.json"
+
+# How much of a file is read to tell text from binary
+TEXT_PROBE = 8192
+
+TEXT = "text"
+BINARY = "binary"
+
+
+def prefix_mode(data: bytes, prefix: bytes) -> Optional[str]:
+    """TEXT or BINARY if data contains prefix, else None."""
+    if prefix not in data:
+        return None
+    return BINARY if b"\0" in data[:TEXT_PROBE] else TEXT
+
+
+def rewrite_prefix(data: bytes, mode: str, old: bytes, new: bytes) -> Optional[bytes]:
+    """
+    Replace old with new in data.
+
+    Text files are rewritten as is. In binary files the prefix sits inside
+    NUL-terminated strings at fixed offsets, so each string keeps its length:
+    it is rewritten and padded with NULs, which only works if new is not
+    longer than old. Returns None when a binary file cannot be rewritten.
+    """
+    if mode == TEXT:
+        return data.replace(old, new)
+    if len(new) > len(old):
+        return None
+    out = bytearray(data)
+    start = data.find(old)
+    while start != -1:
+        end = data.find(b"\0", start)
+        end = len(data) if end == -1 else end
+        string = data[start:end].replace(old, new)
+        out[start:end] = string + b"\0" * (end - start - len(string))
+        start = data.find(old, end)
+    return bytes(out)
+
+
+def lib_additions(owners: Dict[str, str], prefix: str = sys.prefix) -> List[Path]:
+    """Shared libraries in prefix/lib that no deb installed: what the phases built or copied there."""
+    lib_dir = Path(prefix) / "lib"
+    if not owners or not lib_dir.is_dir():
+        return []
+    return sorted(path for path in lib_dir.iterdir()
+                  if (path.name.endswith(".so") or ".so." in path.name)
+                  and (path.is_file() or path.is_symlink()) and deb_owner(str(path), owners) is None)
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    info.mode = 0o644
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _compression(archive: Path) -> str:
+    for suffix, mode in ((".tar.gz", "gz"), (".tgz", "gz"), (".tar.xz", "xz"), (".tar.bz2", "bz2")):
+        if archive.name.endswith(suffix):
+            return mode
+    return ""
+
+
+def pack(archive: Path, force: bool = False) -> bool:
+    """
+    Write the installed environment to archive (.tar.gz, .tar.xz or .tar).
+
+    Everything the site-packages RECORDs list (console scripts included) is
+    packed, plus the zipbundle and the unowned libraries in $PREFIX/lib. A
+    RECORD file that is missing stops the pack. Distributions from a
+    deb, and the debs the extensions load libraries from, are not packed but
+    listed in the manifest for unpack to check. Files that contain the prefix
+    are listed too, so unpack can rewrite them as it extracts.
+    """
+    started = time.monotonic()
+    owners = dpkg_owners()
+    if not owners:
+        log_warning("No dpkg database found: deb-owned files cannot be told apart, packing everything")
+    bundle_files, bundled = zip_bundle()
+    distributions = installed_distributions(bundled=bundled)
+    files, depends, from_debs, unowned = plan_package(distributions, owners)
+    libs = lib_additions(owners)
+    files = sorted(set(files) | set(libs) | set(bundle_files))
+    lib_names = {lib.name for lib in libs}
+    problems = missing_files(distributions)
+    problems += [f"{path} needs {lib}, which nothing provides" for path, lib in unowned if lib not in lib_names]
+    if problems:
+        for problem in problems:
+            log_warning(problem)
+        if not force:
+            log_error("Environment incomplete, nothing packed (use --force to pack anyway)")
+            return False
+
+    prefix = sys.prefix.rstrip("/")
+    entries: List[Tuple[Path, str]] = []
+    outside = 0
+    for path in files:
+        if not str(path).startswith(prefix + "/"):
+            outside += 1
+            continue
+        entries.append((path, str(path)[len(prefix) + 1:]))
+    if outside:
+        log_warning(f"{outside} files outside {prefix} are not packed")
+
+    rewrites: Dict[str, str] = {}
+    for path, name in entries:
+        if path.is_symlink() or "__pycache__" in name:
+            # .pyc files only use the prefix in tracebacks, and rewriting would corrupt them
+            continue
+        mode = prefix_mode(path.read_bytes(), prefix.encode())
+        if mode:
+            rewrites[name] = mode
+
+    manifest = {
+        "prefix": prefix,
+        "python": "%d.%d" % sys.version_info[:2],
+        "architecture": deb_architecture(),
+        "debs": depends,
+        "from_debs": from_debs,
+        "rewrites": rewrites,
+        "files": len(entries),
+        "created": time.time(),
+    }
+    archive.parent.mkdir(parents=True, exist_ok=True)
+    partial = archive.with_name(f".{archive.name}.part")
+    log_info(f"Packing {len(entries)} files ({len(libs)} libraries from {prefix}/lib)...")
+    try:
+        with tarfile.open(partial, f"w:{_compression(archive)}" if _compression(archive) else "w") as tar:
+            _add_bytes(tar, MANIFEST_NAME, json.dumps(manifest, indent=2).encode())
+            for path, name in entries:
+                tar.add(str(path), arcname=name, recursive=False)
+        os.replace(partial, archive)
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+    elapsed = time.monotonic() - started
+    size = archive.stat().st_size
+    log_success(f"Packed {len(distributions) - len(from_debs)} distributions into {archive} "
+                f"({size / 1048576:.1f} MB, {elapsed:.0f}s)")
+    if depends:
+        log_info(f"The target needs these debs: {', '.join(depends)}")
+    record_report("env_pack", {
+        "archive": str(archive),
+        "files": len(entries),
+        "libraries": len(libs),
+        "rewrites": len(rewrites),
+        "size_mb": round(size / 1048576, 1),
+        "seconds": round(elapsed, 1),
+    })
+    return True
+
+
+def _safe_name(name: str) -> bool:
+    return not name.startswith("/") and ".." not in Path(name).parts
+
+
+def _write(path: Path, data: bytes, mode: int) -> None:
+    # Unlink first: site-packages snapshots hardlink these files, so writing in place would change them too
+    if path.is_symlink() or path.exists():
+        path.unlink()
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.chmod(path, mode)
+
+
+def unpack(archive: Path, prefix: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Extract archive into prefix (default: this Python's), in one pass.
+
+    The archive is read as a stream: the manifest comes first, then every
+    member is written straight to its place, rewritten on the way if it
+    contains the old prefix. The Python version and architecture must match
+    the packing device, and the debs it lists should be installed.
+    """
+    try:
+        from .snapshots import take_snapshot, SNAPSHOT_KEEP
+        from .prefetch import installed_debs
+    except ImportError:
+        from snapshots import take_snapshot, SNAPSHOT_KEEP
+        from prefetch import installed_debs
+
+    started = time.monotonic()
+    new_prefix = (prefix or sys.prefix).rstrip("/")
+    with tarfile.open(archive, "r|*") as tar:
+        first = tar.next()
+        if first is None or first.name != MANIFEST_NAME:
+            log_error(f"{archive} is not an environment archive")
+            return False
+        manifest = json.loads(tar.extractfile(first).read())
+
+        problems = []
+        python = "%d.%d" % sys.version_info[:2]
+        if manifest["python"] != python:
+            problems.append(f"packed for Python {manifest['python']}, this is Python {python}")
+        if manifest["architecture"] != deb_architecture():
+            problems.append(f"packed for {manifest['architecture']}, this is {deb_architecture()}")
+        installed = installed_debs() if IS_TERMUX else None
+        if installed is not None:
+            missing = [deb for deb in manifest["debs"] if deb not in installed]
+            if missing:
+                problems.append(f"install these first: pkg install {' '.join(missing)}")
+        if problems:
+            for problem in problems:
+                log_warning(problem)
+            if not force:
+                log_error("Not unpacking (use --force to unpack anyway)")
+                return False
+
+        if SNAPSHOT_KEEP > 0 and new_prefix == sys.prefix.rstrip("/"):
+            take_snapshot("before-unpack")
+
+        old, new = manifest["prefix"].encode(), new_prefix.encode()
+        rewrites = manifest["rewrites"] if old != new else {}
+        count = 0
+        unrewritable = []
+        # tar.next(), not iteration: iterating a stream starts over at the manifest
+        for member in iter(tar.next, None):
+            if not _safe_name(member.name) or (member.islnk() and not _safe_name(member.linkname)):
+                log_warning(f"Skipping unsafe path {member.name}")
+                continue
+            target = Path(new_prefix) / member.name
+            if member.isdir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if member.issym():
+                if target.is_symlink() or target.exists():
+                    target.unlink()
+                link = member.linkname
+                if link.startswith(manifest["prefix"] + "/"):
+                    link = new_prefix + link[len(manifest["prefix"]):]
+                os.symlink(link, target)
+            elif member.islnk():
+                # A second name for a file already extracted
+                if target.is_symlink() or target.exists():
+                    target.unlink()
+                os.link(Path(new_prefix) / member.linkname, target)
+            elif member.isfile():
+                data = tar.extractfile(member).read()
+                mode = rewrites.get(member.name)
+                if mode:
+                    rewritten = rewrite_prefix(data, mode, old, new)
+                    if rewritten is None:
+                        unrewritable.append(member.name)
+                    else:
+                        data = rewritten
+                _write(target, data, member.mode & 0o7777)
+            else:
+                continue
+            count += 1
+
+    for name in unrewritable:
+        log_warning(f"{name} still names {manifest['prefix']}: the new prefix is longer")
+    elapsed = time.monotonic() - started
+    log_success(f"Unpacked {count} files into {new_prefix} in {elapsed:.0f}s")
+    record_report("env_unpack", {
+        "archive": str(archive),
+        "files": count,
+        "rewritten": len(rewrites) - len(unrewritable),
+        "unrewritable": unrewritable,
+        "seconds": round(elapsed, 1),
+    })
+    return True
+
+
+def main() -> int:
+    """Pack or unpack an environment archive."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack the installed environment, or unpack one")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="write the installed environment to an archive")
+    pack_parser.add_argument("archive", type=Path, nargs="?",
+                             help="output .tar.gz, .tar.xz or .tar (default: droidrun-env-<arch>-py<version>.tar.gz)")
+    pack_parser.add_argument("--force", action="store_true", help="pack even if libraries are missing")
+    unpack_parser = subparsers.add_parser("unpack", help="extract an archive into this Python's prefix")
+    unpack_parser.add_argument("archive", type=Path)
+    unpack_parser.add_argument("--prefix", help="prefix to extract into (default: this Python's prefix)")
+    unpack_parser.add_argument("--force", action="store_true",
+                               help="unpack even if Python, architecture or debs do not match")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        archive = args.archive or Path(f"droidrun-env-{deb_architecture()}-py%d.%d.tar.gz" % sys.version_info[:2])
+        return 0 if pack(archive, args.force) else 1
+    return 0 if unpack(args.archive, args.prefix, args.force) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
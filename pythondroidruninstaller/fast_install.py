@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""Fast parallel installer for a fully pinned, pre-built wheel set (no resolver, no pip startup)."""
+
+import os
+import sys
+import csv
+import io
+import base64
+import hashlib
+import stat
+import sysconfig
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from email.parser import Parser
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+from packaging.tags import sys_tags
+from packaging.utils import canonicalize_name, parse_wheel_filename, InvalidWheelFilename
+from packaging.version import Version, InvalidVersion
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import log_info, log_success, log_warning, log_error
+    from .wheelhouse import mark_used
+except ImportError:
+    from common import log_info, log_success, log_warning, log_error
+    from wheelhouse import mark_used
+
+
+# Extraction threads (zlib and file writes release the GIL)
+FAST_INSTALL_JOBS = int(os.environ.get("DROIDRUN_FAST_INSTALL_JOBS", str(os.cpu_count() or 2)))
+
+# Same launcher pip generates for console_scripts and gui_scripts
+SCRIPT_TEMPLATE = """#!{python}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {import_name}
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])
+    sys.exit({func}())
+"""
+
+
+class FastInstallError(Exception):
+    """The wheel set cannot be installed safely without pip."""
+
+
+class WheelPlan:
+    """Where every file of one wheel goes."""
+
+    def __init__(self, path: Path, name: str, version: str, info_dir: str, lib_dir: str,
+                 files: Dict[str, str], entry_points: Dict[str, str]):
+        self.path = path
+        self.name = name
+        self.version = version
+        self.info_dir = info_dir
+        self.lib_dir = lib_dir
+        # Archive member -> destination path
+        self.files = files
+        # Script name -> "module:attr"
+        self.entry_points = entry_points
+
+    def script_paths(self, scripts_dir: str) -> List[str]:
+        return [os.path.join(scripts_dir, name) for name in self.entry_points]
+
+
+def _scheme(name: str) -> Dict[str, str]:
+    paths = sysconfig.get_paths()
+    return {
+        "purelib": paths["purelib"],
+        "platlib": paths["platlib"],
+        "scripts": paths["scripts"],
+        "data": paths["data"],
+        "headers": os.path.join(paths["include"], name),
+    }
+
+
+def _record_hash(data: bytes) -> str:
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+    return f"sha256={digest.decode('ascii')}"
+
+
+def _record_path(path: str, lib_dir: str) -> str:
+    return os.path.relpath(path, lib_dir).replace(os.path.sep, "/")
+
+
+def _destination(base: str, member: str, wheel: str) -> str:
+    """base/member, refusing members that leave base (absolute paths, ../), as pip does."""
+    path = os.path.normpath(os.path.join(base, member))
+    if os.path.isabs(member) or os.path.commonpath([base, path]) != os.path.normpath(base):
+        raise FastInstallError(f"{wheel}: {member!r} would be installed outside {base}")
+    return path
+
+
+def plan_wheel(path: Path) -> WheelPlan:
+    """Read a wheel's metadata and map each member to its install location."""
+    name, version, _, _ = parse_wheel_filename(path.name)
+    with zipfile.ZipFile(path) as zf:
+        members = [m for m in zf.namelist() if not m.endswith("/")]
+        info_dirs = {m.split("/", 1)[0] for m in members if m.split("/", 1)[0].endswith(".dist-info")}
+        if len(info_dirs) != 1:
+            raise FastInstallError(f"{path.name}: expected one .dist-info directory, found {len(info_dirs)}")
+        info_dir = info_dirs.pop()
+        wheel_meta = Parser().parsestr(zf.read(f"{info_dir}/WHEEL").decode("utf-8"))
+        entry_points = {}
+        if f"{info_dir}/entry_points.txt" in members:
+            parser = ConfigParser(delimiters=("=",))
+            parser.optionxform = str
+            parser.read_string(zf.read(f"{info_dir}/entry_points.txt").decode("utf-8"))
+            for section in ("console_scripts", "gui_scripts"):
+                if parser.has_section(section):
+                    entry_points.update({k.strip(): v.strip() for k, v in parser.items(section)})
+
+    scheme = _scheme(str(name))
+    purelib = wheel_meta.get("Root-Is-Purelib", "true").strip().lower() == "true"
+    lib_dir = scheme["purelib"] if purelib else scheme["platlib"]
+    data_prefix = f"{info_dir[:-len('.dist-info')]}.data/"
+    files = {}
+    for member in members:
+        if member in (f"{info_dir}/RECORD", f"{info_dir}/RECORD.jws", f"{info_dir}/RECORD.p7s"):
+            continue
+        if member.startswith(data_prefix):
+            key, _, rest = member[len(data_prefix):].partition("/")
+            if key not in scheme or not rest:
+                raise FastInstallError(f"{path.name}: unknown data directory {key!r}")
+            files[member] = _destination(scheme[key], rest, path.name)
+        else:
+            files[member] = _destination(lib_dir, member, path.name)
+    return WheelPlan(path, str(name), str(version), info_dir, lib_dir, files, entry_points)
+
+
+def select_wheels(wheels: List[Path], pins: Optional[Dict[str, str]] = None) -> List[Path]:
+    """
+    Pick exactly one compatible wheel per distribution.
+
+    Args:
+        wheels: Candidate wheel files
+        pins: Optional canonical name -> version; only pinned distributions are installed
+
+    Raises:
+        FastInstallError: if the set is not fully pinned (several versions of one
+            distribution) or a pinned distribution has no compatible wheel
+    """
+    # Lower is better: sys_tags() lists the most specific tags first, as pip ranks them
+    priority = {tag: rank for rank, tag in enumerate(sys_tags())}
+    versions: Dict[str, Version] = {}
+    if pins is not None:
+        for name, pin in pins.items():
+            try:
+                versions[name] = Version(pin)
+            except InvalidVersion:
+                raise FastInstallError(f"Invalid pinned version: {name}=={pin}")
+    chosen: Dict[str, Tuple[Path, Version, int]] = {}
+    for wheel in wheels:
+        try:
+            name, version, _, tags = parse_wheel_filename(wheel.name)
+        except InvalidWheelFilename:
+            log_warning(f"Skipping invalid wheel filename: {wheel.name}")
+            continue
+        ranks = [priority[tag] for tag in tags if tag in priority]
+        if not ranks:
+            continue
+        if pins is not None and versions.get(name) != version:
+            continue
+        if name in chosen and chosen[name][1] != version:
+            raise FastInstallError(f"Wheel set is not pinned: {name} {chosen[name][1]} and {version}")
+        if name not in chosen or min(ranks) < chosen[name][2]:
+            chosen[name] = (wheel, version, min(ranks))
+
+    if pins is not None:
+        missing = sorted(set(pins) - set(chosen))
+        if missing:
+            raise FastInstallError(f"No compatible wheel for pinned: {', '.join(missing)}")
+    return [wheel for wheel, _, _ in chosen.values()]
+
+
+def read_pins(lock_file: Path) -> Dict[str, str]:
+    """Read name==version lines (pip freeze format)."""
+    pins = {}
+    for line in lock_file.read_text().splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        if "==" not in line:
+            raise FastInstallError(f"Not pinned: {line}")
+        name, version = line.split("==", 1)
+        pins[canonicalize_name(name.split("[", 1)[0].strip())] = version.split(";", 1)[0].strip()
+    return pins
+
+
+def check_conflicts(plans: List[WheelPlan]) -> List[WheelPlan]:
+    """
+    Refuse file conflicts; skip distributions that are already installed at the same version.
+
+    Raises:
+        FastInstallError: on two wheels writing the same file, an installed
+            distribution at another version, or a destination file that already exists
+    """
+    from importlib import metadata
+
+    installed = {}
+    for dist in metadata.distributions():
+        if dist.metadata["Name"]:
+            installed.setdefault(canonicalize_name(dist.metadata["Name"]), dist.version)
+
+    scripts_dir = sysconfig.get_paths()["scripts"]
+    owners: Dict[str, str] = {}
+    conflicts = []
+    pending = []
+    for plan in plans:
+        if plan.name in installed:
+            if installed[plan.name] == plan.version:
+                continue
+            conflicts.append(f"{plan.name} {installed[plan.name]} is installed (wheel is {plan.version})")
+            continue
+        pending.append(plan)
+        for dest in list(plan.files.values()) + plan.script_paths(scripts_dir):
+            dest = os.path.normpath(dest)
+            if dest in owners:
+                conflicts.append(f"{dest} is in both {owners[dest]} and {plan.name}")
+            elif os.path.lexists(dest):
+                conflicts.append(f"{dest} already exists ({plan.name})")
+            owners[dest] = plan.name
+
+    if conflicts:
+        shown = "\n  ".join(conflicts[:20])
+        more = f"\n  ... and {len(conflicts) - 20} more" if len(conflicts) > 20 else ""
+        raise FastInstallError(f"Refusing to install, {len(conflicts)} conflict(s):\n  {shown}{more}")
+    return pending
+
+
+def _write(path: str, data: bytes, mode: int) -> None:
+    with open(path, "wb") as f:
+        f.write(data)
+    os.chmod(path, mode)
+
+
+def install_wheel(plan: WheelPlan, requested: bool = False) -> int:
+    """Extract one wheel and write RECORD, INSTALLER (and REQUESTED) and console scripts like pip does."""
+    scripts_dir = sysconfig.get_paths()["scripts"]
+    written: List[str] = []
+    rows = []
+    try:
+        with zipfile.ZipFile(plan.path) as zf:
+            for member, dest in plan.files.items():
+                info = zf.getinfo(member)
+                data = zf.read(info)
+                # Keep the executable bit from the archive
+                executable = (info.external_attr >> 16) & stat.S_IXUSR
+                mode = 0o755 if executable else 0o644
+                if dest.startswith(scripts_dir + os.path.sep) and data.startswith(b"#!python"):
+                    # pip rewrites the placeholder interpreter of data scripts
+                    data = b"#!" + sys.executable.encode() + data[len(b"#!python"):]
+                    mode = 0o755
+                _write(dest, data, mode)
+                written.append(dest)
+                rows.append((_record_path(dest, plan.lib_dir), _record_hash(data), str(len(data))))
+
+        for script, spec in plan.entry_points.items():
+            module, _, func = spec.partition(":")
+            func = func.split("[", 1)[0].strip() or "main"
+            data = SCRIPT_TEMPLATE.format(python=sys.executable, module=module.strip(),
+                                          import_name=func.split(".")[0], func=func).encode()
+            dest = os.path.join(scripts_dir, script)
+            _write(dest, data, 0o755)
+            written.append(dest)
+            rows.append((_record_path(dest, plan.lib_dir), _record_hash(data), str(len(data))))
+
+        info_dir = os.path.join(plan.lib_dir, plan.info_dir)
+        installer = os.path.join(info_dir, "INSTALLER")
+        _write(installer, b"pip\n", 0o644)
+        written.append(installer)
+        rows.append((_record_path(installer, plan.lib_dir), _record_hash(b"pip\n"), "4"))
+        if requested:
+            # pip marks distributions the user asked for, as opposed to dependencies
+            marker = os.path.join(info_dir, "REQUESTED")
+            _write(marker, b"", 0o644)
+            written.append(marker)
+            rows.append((_record_path(marker, plan.lib_dir), _record_hash(b""), "0"))
+
+        record = os.path.join(info_dir, "RECORD")
+        rows.append((_record_path(record, plan.lib_dir), "", ""))
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(sorted(rows))
+        _write(record, buffer.getvalue().encode("utf-8"), 0o644)
+        written.append(record)
+    except BaseException:
+        # Leave nothing half-installed
+        for path in written:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        raise
+    return len(written)
+
+
+def fast_install(wheels: List[Path], pins: Optional[Dict[str, str]] = None,
+                 jobs: int = FAST_INSTALL_JOBS, requested: Optional[List[str]] = None) -> bool:
+    """
+    Install a fully pinned wheel set by unpacking the wheels concurrently.
+
+    Args:
+        wheels: Wheel files to choose from (one per distribution unless pinned)
+        pins: Optional canonical name -> version to install
+        jobs: Extraction threads
+        requested: Distributions to mark as explicitly requested (REQUESTED file)
+
+    Returns:
+        True if every wheel was installed (or already was)
+    """
+    started = time.monotonic()
+    try:
+        plans = check_conflicts([plan_wheel(w) for w in select_wheels(wheels, pins)])
+    except (FastInstallError, zipfile.BadZipFile, KeyError) as e:
+        log_error(str(e))
+        return False
+    if not plans:
+        log_success("All wheels are already installed")
+        return True
+
+    # Create directories up front so worker threads never race on them
+    scripts_dir = sysconfig.get_paths()["scripts"]
+    os.makedirs(scripts_dir, exist_ok=True)
+    for directory in sorted({os.path.dirname(dest) for plan in plans for dest in plan.files.values()}):
+        os.makedirs(directory, exist_ok=True)
+
+    log_info(f"Unpacking {len(plans)} wheels with {jobs} threads...")
+    failed = []
+    files = 0
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        # Biggest wheels first so they do not finish last
+        plans.sort(key=lambda p: p.path.stat().st_size, reverse=True)
+        marked = {canonicalize_name(name) for name in requested or []}
+        futures = {plan.name: pool.submit(install_wheel, plan, plan.name in marked) for plan in plans}
+        for name, future in futures.items():
+            try:
+                files += future.result()
+            except Exception as e:
+                log_error(f"Failed to install {name}: {e}")
+                failed.append(name)
+
+    elapsed = time.monotonic() - started
+    if failed:
+        log_error(f"Fast install failed for: {', '.join(failed)}")
+        return False
+    mark_used(plan.path for plan in plans)
+    log_success(f"Installed {len(plans)} wheels ({files} files) in {elapsed:.1f}s")
+    return True
+
+
+def main() -> int:
+    """Install every wheel in a directory, or the pinned subset listed in a lock file."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Unpack a fully pinned wheel set into site-packages in parallel")
+    parser.add_argument("wheelhouse", nargs="?", default=os.environ.get("WHEELS_DIR", str(Path.home() / "wheels")),
+                        help="directory of wheels (default: WHEELS_DIR)")
+    parser.add_argument("--lock", type=Path, help="pip freeze style name==version list to install")
+    parser.add_argument("--jobs", type=int, default=FAST_INSTALL_JOBS, help="extraction threads")
+    parser.add_argument("--requested", action="append", help="mark a distribution as requested (repeatable)")
+    args = parser.parse_args()
+
+    try:
+        pins = read_pins(args.lock) if args.lock else None
+    except (OSError, FastInstallError) as e:
+        log_error(str(e))
+        return 1
+    wheels = sorted(Path(args.wheelhouse).glob("*.whl"))
+    if not wheels:
+        log_error(f"No wheels found in {args.wheelhouse}")
+        return 1
+    return 0 if fast_install(wheels, pins, args.jobs, args.requested) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
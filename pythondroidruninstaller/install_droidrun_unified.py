@@ -3,9 +3,6 @@
 
 import sys
 import os
-import subprocess
-import shutil
-import zipfile
 from pathlib import Path
 from typing import Optional, Dict, List
 
@@ -14,18 +11,42 @@ sys.path.insert(0, str(current_dir))
 
 try:
     from .common import (
-        should_skip_phase, mark_phase_complete, setup_build_environment,
+        should_skip_phase, is_phase_complete, mark_phase_complete, setup_build_environment,
         python_pkg_installed, pkg_installed, command_exists, IS_TERMUX, HOME, PREFIX,
-        get_build_env_with_compilers, get_clean_env,
+        get_build_env_with_compilers, get_clean_env, network_available, reset_report, load_report, save_report, record_report, set_phase, REPORT_FILE,
         log_info, log_error, log_success, log_warning
     )
+    from .process_monitor import run_monitored, format_usage_table, STALLS, USAGE_SORT
+    from .resource_sampler import start_sampler
+    from .build_history import EtaTracker
+    from .snapshots import snapshot_before_phase
+    from .workspace import log_workspace_usage
+    from .precompile import precompile_after_install
+    from .zipbundle import bundle_after_install
+    from .startup_profile import profile_after_install
+    from .wheelhouse import place_wheels, gc_after_install
+    from .cargo_cache import prune_after_install
+    from .meson_builds import meson_pip_args
+    from .prefetch import start_prefetch
 except ImportError:
     from common import (
-        should_skip_phase, mark_phase_complete, setup_build_environment,
+        should_skip_phase, is_phase_complete, mark_phase_complete, setup_build_environment,
         python_pkg_installed, pkg_installed, command_exists, IS_TERMUX, HOME, PREFIX,
-        get_build_env_with_compilers, get_clean_env,
+        get_build_env_with_compilers, get_clean_env, network_available, reset_report, load_report, save_report, record_report, set_phase, REPORT_FILE,
         log_info, log_error, log_success, log_warning
     )
+    from process_monitor import run_monitored, format_usage_table, STALLS, USAGE_SORT
+    from resource_sampler import start_sampler
+    from build_history import EtaTracker
+    from snapshots import snapshot_before_phase
+    from workspace import log_workspace_usage
+    from precompile import precompile_after_install
+    from zipbundle import bundle_after_install
+    from startup_profile import profile_after_install
+    from wheelhouse import place_wheels, gc_after_install
+    from cargo_cache import prune_after_install
+    from meson_builds import meson_pip_args
+    from prefetch import start_prefetch
 
 
 def install_with_wheel_preservation(
@@ -34,7 +55,8 @@ def install_with_wheel_preservation(
     build_env: Optional[Dict[str, str]] = None,
     no_build_isolation: bool = False,
     no_deps: bool = False,
-    extra_flags: Optional[List[str]] = None
+    extra_flags: Optional[List[str]] = None,
+    build_args: Optional[List[str]] = None
 ) -> bool:
     """
     Install a package with wheel preservation.
@@ -50,6 +72,7 @@ def install_with_wheel_preservation(
         no_build_isolation: Pass --no-build-isolation to pip wheel
         no_deps: Pass --no-deps to pip wheel (don't download dependencies)
         extra_flags: Additional flags to pass to pip wheel
+        build_args: What pip wheel builds in place of pkg_spec (e.g. a source tree and its flags)
     
     Returns:
         True if installation succeeded, False otherwise
@@ -58,7 +81,7 @@ def install_with_wheel_preservation(
     
     # Step 1: Build/download all wheels (including dependencies)
     log_info(f"Building/downloading wheels for {pkg_spec} (including dependencies)...")
-    wheel_cmd = [sys.executable, "-m", "pip", "wheel", pkg_spec, "--wheel-dir", str(wheels_dir)]
+    wheel_cmd = [sys.executable, "-m", "pip", "wheel"] + (build_args or [pkg_spec]) + ["--wheel-dir", str(wheels_dir)]
     
     if no_build_isolation:
         wheel_cmd.append("--no-build-isolation")
@@ -71,7 +94,7 @@ def install_with_wheel_preservation(
     
     env = build_env if build_env is not None else get_clean_env()
     
-    result = subprocess.run(wheel_cmd, env=env, check=False)
+    result = run_monitored(wheel_cmd, env=env, check=False)
     if result.returncode != 0:
         log_error(f"Failed to build/download wheels for {pkg_spec}")
         return False
@@ -87,7 +110,7 @@ def install_with_wheel_preservation(
         pkg_spec
     ]
     
-    result = subprocess.run(install_cmd, env=env, check=False)
+    result = run_monitored(install_cmd, env=env, check=False)
     if result.returncode != 0:
         log_error(f"Failed to install {pkg_spec} from wheels")
         return False
@@ -102,43 +125,6 @@ def install_with_wheel_preservation(
         return False
 
 
-def fix_grpcio_wheel(wheel_file: Path) -> bool:
-    """Fix grpcio wheel by adding abseil library dependencies."""
-    extract_dir = wheel_file.parent / "grpcio_extract"
-    extract_dir.mkdir(exist_ok=True)
-    
-    try:
-        with zipfile.ZipFile(wheel_file, 'r') as zf:
-            zf.extractall(extract_dir)
-        
-        so_files = list(extract_dir.rglob("cygrpc*.so"))
-        if not so_files:
-            return False
-        
-        # Fix with patchelf if available
-        if shutil.which("patchelf"):
-            so_file = so_files[0]
-            for lib in ["libabsl_flags_internal.so", "libabsl_flags.so", 
-                       "libabsl_flags_commandlineflag.so", "libabsl_flags_reflection.so"]:
-                subprocess.run(["patchelf", "--add-needed", lib, str(so_file)], check=False)
-            subprocess.run(["patchelf", "--set-rpath", f"{PREFIX}/lib", str(so_file)], check=False)
-        
-        # Repackage
-        fixed_wheel = wheel_file.parent / "grpcio-fixed.whl"
-        with zipfile.ZipFile(fixed_wheel, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    zf.write(Path(root) / file, Path(root).relative_to(extract_dir) / file)
-        
-        wheel_file.unlink()
-        fixed_wheel.rename(wheel_file)
-        shutil.rmtree(extract_dir, ignore_errors=True)
-        return True
-    except Exception:
-        shutil.rmtree(extract_dir, ignore_errors=True)
-        return False
-
-
 def ensure_gfortran_symlink() -> bool:
     """Ensure gfortran symlink exists (required for scipy)."""
     gfortran_path = Path(f"{PREFIX}/bin/gfortran")
@@ -173,13 +159,13 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
     # Install system packages if needed
     if IS_TERMUX and command_exists("pkg"):
         if not pkg_installed("python-pip"):
-            subprocess.run(["pkg", "install", "-y", "python-pip"], check=False)
+            run_monitored(["pkg", "install", "-y", "python-pip"], check=False)
         else:
             log_info("python-pip is already installed")
         
         if not pkg_installed("flang"):
             log_info("Installing flang...")
-            result = subprocess.run(["pkg", "install", "-y", "flang"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "flang"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install flang - scikit-learn build may fail")
             else:
@@ -191,7 +177,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         for pkg_name in ["autoconf", "automake", "libtool"]:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name}...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some builds may fail")
                 else:
@@ -202,7 +188,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         # Install patchelf (required for fixing ELF binaries)
         if not pkg_installed("patchelf"):
             log_info("Installing patchelf...")
-            result = subprocess.run(["pkg", "install", "-y", "patchelf"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "patchelf"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install patchelf - some wheel fixes may fail")
             else:
@@ -214,7 +200,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         for pkg_name in ["libarrow-cpp", "libjpeg-turbo", "libpng", "libtiff", "libwebp", "freetype", "abseil-cpp"]:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name}...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some builds may fail")
                 else:
@@ -227,7 +213,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         for pkg_name in python_packages:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name} via pkg (required for droidrun)...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some droidrun features may not work")
                 else:
@@ -243,7 +229,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
     if IS_TERMUX and command_exists("pkg"):
         if not pkg_installed("rust"):
             log_info("Installing rust via pkg (more stable)...")
-            result = subprocess.run(["pkg", "install", "-y", "rust"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "rust"], check=False)
             if result.returncode == 0:
                 log_success("rust installed successfully via pkg")
                 rust_installed = True
@@ -257,7 +243,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
     if not rust_installed:
         rust_maturin_script = Path(__file__).parent / "install_rust_maturin.py"
         if rust_maturin_script.exists():
-            result = subprocess.run([sys.executable, str(rust_maturin_script)], check=False)
+            result = run_monitored([sys.executable, str(rust_maturin_script)], check=False)
             if result.returncode != 0:
                 log_error("Failed to install Rust and maturin")
                 return 1
@@ -271,6 +257,8 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         ("setuptools", "setuptools"),
         ("Cython", "Cython"),
         ("meson-python", "meson-python<0.19.0,>=0.16.0"),
+        # Needed by the install source selector
+        ("packaging", "packaging>=21.0"),
     ]
     
     clean_env = get_clean_env()
@@ -312,7 +300,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         if IS_TERMUX and command_exists("pkg"):
             if not pkg_installed("python-pillow"):
                 log_info("Installing python-pillow via pkg (more stable)...")
-                result = subprocess.run(["pkg", "install", "-y", "python-pillow"], check=False)
+                result = run_monitored(["pkg", "install", "-y", "python-pillow"], check=False)
                 if result.returncode == 0:
                     if python_pkg_installed("pillow", "pillow"):
                         log_success("python-pillow installed successfully via pkg")
@@ -348,7 +336,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
         if IS_TERMUX and command_exists("pkg"):
             if not pkg_installed("python-grpcio"):
                 log_info("Installing python-grpcio via pkg (more stable)...")
-                result = subprocess.run(["pkg", "install", "-y", "python-grpcio"], check=False)
+                result = run_monitored(["pkg", "install", "-y", "python-grpcio"], check=False)
                 if result.returncode == 0:
                     if python_pkg_installed("grpcio", "grpcio"):
                         log_success("python-grpcio installed successfully via pkg")
@@ -378,7 +366,7 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
             # Build wheel first (with dependencies - no --no-deps to capture all deps)
             wheels_dir.mkdir(parents=True, exist_ok=True)
             log_info("Building/downloading grpcio and dependencies to wheels directory...")
-            result = subprocess.run(
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "wheel", "grpcio", "--no-build-isolation", 
                  "--wheel-dir", str(wheels_dir)],
                 env=clean_env,
@@ -386,15 +374,13 @@ def run_phase1_build_tools(wheels_dir: Path) -> int:
             )
             
             if result.returncode == 0:
-                grpcio_wheels = list(wheels_dir.glob("grpcio*.whl"))
+                grpcio_wheels = sorted(wheels_dir.glob("grpcio-*.whl"), key=lambda w: w.stat().st_mtime, reverse=True)
                 if grpcio_wheels:
-                    log_info("Fixing grpcio wheel with patchelf...")
-                    fix_grpcio_wheel(grpcio_wheels[0])
                     log_success("grpcio and dependency wheels saved to wheels directory")
                     
                     # Install from wheels directory (pip will find dependencies there too)
                     log_info("Installing grpcio from wheels directory...")
-                    install_result = subprocess.run(
+                    install_result = run_monitored(
                         [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir),
                          "--no-index", "grpcio"],
                         env=clean_env,
@@ -449,7 +435,7 @@ def run_phase2_numpy(wheels_dir: Path) -> int:
     if not pkg_installed("patchelf"):
         log_info("Installing patchelf system package (required for numpy builds)...")
         if IS_TERMUX and command_exists("pkg"):
-            result = subprocess.run(["pkg", "install", "-y", "patchelf"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "patchelf"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install patchelf system package - numpy build may fail")
             else:
@@ -461,7 +447,8 @@ def run_phase2_numpy(wheels_dir: Path) -> int:
     # numpy needs CC/CXX overrides for C/Fortran extensions
     build_env = get_build_env_with_compilers()
     
-    if not install_with_wheel_preservation("numpy>=1.26.0", wheels_dir, build_env=build_env):
+    if not install_with_wheel_preservation("numpy>=1.26.0", wheels_dir, build_env=build_env,
+                                           build_args=meson_pip_args("numpy", "numpy>=1.26.0")):
         log_error("numpy installation failed")
         return 1
     
@@ -505,7 +492,7 @@ def run_phase3_scikit_learn(wheels_dir: Path) -> int:
             return 1
         
         # Run the standalone script
-        result = subprocess.run([sys.executable, str(standalone_script)], check=False)
+        result = run_monitored([sys.executable, str(standalone_script)], check=False)
         if result.returncode != 0:
             log_error("scikit-learn installation failed (standalone script returned error)")
             return 1
@@ -515,18 +502,11 @@ def run_phase3_scikit_learn(wheels_dir: Path) -> int:
             log_error("scikit-learn installation succeeded but package not found")
             return 1
         
-        # Copy any wheels built by the standalone script to our wheels directory
-        # The standalone script uses HOME / "wheels", so copy from there
+        # Link any wheels built by the standalone script into our wheels directory
+        # The standalone script uses HOME / "wheels", so take them from there
         standalone_wheels_dir = HOME / "wheels"
-        if standalone_wheels_dir.exists():
-            log_info(f"Copying wheels from {standalone_wheels_dir} to {wheels_dir}...")
-            wheels_dir.mkdir(parents=True, exist_ok=True)
-            for wheel_file in standalone_wheels_dir.glob("*.whl"):
-                try:
-                    shutil.copy2(wheel_file, wheels_dir / wheel_file.name)
-                    log_info(f"Copied wheel: {wheel_file.name}")
-                except Exception as e:
-                    log_warning(f"Failed to copy wheel {wheel_file.name}: {e}")
+        if standalone_wheels_dir.exists() and standalone_wheels_dir.resolve() != wheels_dir.resolve():
+            place_wheels(standalone_wheels_dir.glob("*.whl"), wheels_dir)
         
         log_success("scikit-learn installed successfully")
     else:
@@ -560,74 +540,6 @@ def run_phase3_scikit_learn(wheels_dir: Path) -> int:
     return 0
 
 
-def try_install_via_pkg(python_pkg_name: str) -> bool:
-    """
-    Try to install a Python package via pkg if available.
-    
-    Args:
-        python_pkg_name: Python package name (e.g., "pydantic-core", "pandas")
-    
-    Returns:
-        True if installed or already installed, False otherwise
-    """
-    if not IS_TERMUX or not command_exists("pkg"):
-        return False
-    
-    # Map Python package names to pkg package names
-    # Most follow the pattern python-{package_name}, but some differ
-    pkg_name_map = {
-        "grpcio": "python-grpcio",
-        "pillow": "python-pillow",
-        "scipy": "python-scipy",
-        "numpy": "python-numpy",
-        "scikit-learn": "python-scikit-learn",
-        "pydantic-core": "python-pydantic-core",
-        "pandas": "python-pandas",
-        "pyarrow": "python-pyarrow",
-        "psutil": "python-psutil",
-        "cryptography": "python-cryptography",
-    }
-    
-    # Check if already installed as Python package
-    if python_pkg_installed(python_pkg_name, python_pkg_name):
-        return True
-    
-    # Get pkg name (default to python-{package_name})
-    pkg_name = pkg_name_map.get(python_pkg_name, f"python-{python_pkg_name}")
-    
-    # Check if pkg package is already installed via pkg
-    if pkg_installed(pkg_name):
-        # Package is installed via pkg, check if Python package is importable
-        if python_pkg_installed(python_pkg_name, python_pkg_name):
-            return True
-        else:
-            log_warning(f"{pkg_name} is installed via pkg but {python_pkg_name} not found as Python package")
-            return False
-    
-    # Check if pkg package exists (try pkg show)
-    check_cmd = ["pkg", "show", pkg_name]
-    result = subprocess.run(check_cmd, capture_output=True, check=False)
-    if result.returncode != 0:
-        # Package not available via pkg
-        return False
-    
-    # Try installing via pkg
-    log_info(f"Installing {python_pkg_name} via pkg ({pkg_name})...")
-    install_cmd = ["pkg", "install", "-y", pkg_name]
-    result = subprocess.run(install_cmd, check=False)
-    
-    if result.returncode == 0:
-        if python_pkg_installed(python_pkg_name, python_pkg_name):
-            log_success(f"{python_pkg_name} installed successfully via pkg")
-            return True
-        else:
-            log_warning(f"{pkg_name} installed via pkg but {python_pkg_name} not found as Python package")
-            return False
-    else:
-        log_warning(f"Failed to install {pkg_name} via pkg")
-        return False
-
-
 def run_phase4_droidrun(wheels_dir: Path) -> int:
     """Phase 4: Install droidrun."""
     if python_pkg_installed("droidrun", "droidrun"):
@@ -639,26 +551,28 @@ def run_phase4_droidrun(wheels_dir: Path) -> int:
     log_info("Installing droidrun...")
     clean_env = get_clean_env()
     
-    # List of packages that are commonly available via pkg and should be installed via pkg first
-    # to avoid rebuilding them
-    pkg_available_deps = [
+    try:
+        from .source_selector import install_from_best_source, PREBUILT_SOURCES
+    except ImportError:
+        from source_selector import install_from_best_source, PREBUILT_SOURCES
+    
+    # Heavy compiled dependencies that are often available pre-built (Termux package,
+    # cached wheel or binary wheel); installing them first avoids rebuilding them
+    prebuilt_candidate_deps = [
         "grpcio", "pillow", "scipy", "numpy", "scikit-learn",
         "pydantic-core", "pandas", "pyarrow", "psutil", "cryptography"
     ]
     
-    # Try installing packages via pkg first (if available)
-    log_info("Checking for packages available via pkg install...")
-    installed_via_pkg = []
-    for dep in pkg_available_deps:
-        if try_install_via_pkg(dep):
-            installed_via_pkg.append(dep)
-        elif python_pkg_installed(dep, dep):
-            installed_via_pkg.append(dep)
+    log_info("Checking for pre-built packages...")
+    installed_prebuilt = []
+    for dep in prebuilt_candidate_deps:
+        if install_from_best_source(dep, sources=PREBUILT_SOURCES):
+            installed_prebuilt.append(dep)
     
     wheels_dir.mkdir(parents=True, exist_ok=True)
     
-    if installed_via_pkg:
-        log_info(f"Packages installed/available via pkg: {', '.join(installed_via_pkg)}")
+    if installed_prebuilt:
+        log_info(f"Packages installed/available pre-built: {', '.join(installed_prebuilt)}")
         log_info("Using pip install (respects already-installed packages, avoids rebuilding)")
         
         # Use pip install directly - it won't rebuild already-installed packages
@@ -668,25 +582,26 @@ def run_phase4_droidrun(wheels_dir: Path) -> int:
             "droidrun"
         ]
         
-        result = subprocess.run(install_cmd, env=clean_env, check=False)
+        result = run_monitored(install_cmd, env=clean_env, check=False)
         if result.returncode != 0:
             log_error("droidrun installation failed")
             return 1
         
         # Download wheels for droidrun and new dependencies (not already-installed ones)
-        log_info("Downloading wheels for droidrun and new dependencies...")
-        # Use pip download to get wheels without installing
-        download_cmd = [
-            sys.executable, "-m", "pip", "download",
-            "--dest", str(wheels_dir),
-            "--no-cache-dir",
-            "droidrun"
-        ]
-        subprocess.run(download_cmd, env=clean_env, check=False)
-        
-        log_info("Wheels downloaded (already-installed packages skipped)")
+        if network_available():
+            log_info("Downloading wheels for droidrun and new dependencies...")
+            # Use pip download to get wheels without installing
+            download_cmd = [
+                sys.executable, "-m", "pip", "download",
+                "--dest", str(wheels_dir),
+                "--no-cache-dir",
+                "droidrun"
+            ]
+            run_monitored(download_cmd, env=clean_env, check=False)
+            
+            log_info("Wheels downloaded (already-installed packages skipped)")
     else:
-        # No pkg-installed deps, use normal wheel preservation
+        # No pre-built deps, use normal wheel preservation
         log_info("Installing droidrun with wheel preservation...")
         if not install_with_wheel_preservation("droidrun", wheels_dir, build_env=clean_env):
             log_error("droidrun installation failed")
@@ -700,6 +615,106 @@ def run_phase4_droidrun(wheels_dir: Path) -> int:
     return 0
 
 
+# Phases run by the unified installer, in order
+PHASES = [
+    (1, "Installing build tools...", run_phase1_build_tools),
+    (2, "Installing numpy...", run_phase2_numpy),
+    (3, "Installing scipy and scikit-learn...", run_phase3_scikit_learn),
+    (4, "Installing droidrun...", run_phase4_droidrun),
+]
+
+
+# Phases of the separate phase scripts (check_dependencies.PACKAGES_BY_PHASE) each phase covers
+PREFETCH_PHASES = {1: [1], 2: [2], 3: [3], 4: [4, 5, 6, 7]}
+
+
+# First-run duration estimates per phase (seconds), replaced by build history once recorded
+PHASE_ESTIMATES = {
+    "unified-phase-1": 2400,
+    "unified-phase-2": 1200,
+    "unified-phase-3": 5400,
+    "unified-phase-4": 1800,
+}
+
+
+def record_doctor(phase: int, when: str) -> None:
+    """Record which requirements are satisfied; fast enough to run around every phase."""
+    try:
+        try:
+            from .check_dependencies import check_all
+        except ImportError:
+            from check_dependencies import check_all
+    except ImportError:
+        # packaging is only guaranteed once phase 1 has run
+        return
+    
+    report = check_all()
+    summary = report["summary"]
+    record_report("doctor", {
+        "phase": phase,
+        "when": when,
+        "summary": summary,
+        "problems": {r["package"]: r["found"] or "missing" for r in report["results"] if r["status"] != "ok"},
+        "ms": report["timings_ms"]["total"],
+    })
+    log_info(f"Requirements {when} phase {phase}: {summary['ok']}/{summary['total']} satisfied "
+             f"({report['timings_ms']['total']:.0f} ms)")
+
+
+def run_phases(wheels_dir: Path) -> int:
+    """Run every phase in order, stopping at the first failure."""
+    keys = [f"unified-phase-{phase}" for phase, _, _ in PHASES]
+    eta = EtaTracker(keys, {key: keys[:i] for i, key in enumerate(keys)},
+                     label="installation", defaults=PHASE_ESTIMATES)
+    prefetcher = None
+    try:
+        for key, (phase, description, run_phase) in zip(keys, PHASES):
+            log_info("\n" + "=" * 70)
+            log_info(f"Phase {phase}: {description}")
+            log_info("=" * 70)
+            set_phase(phase)
+            already_complete = is_phase_complete(phase)
+            if already_complete:
+                eta.skip(key)
+            else:
+                snapshot_before_phase(phase)
+                eta.start(key)
+                # Download what the later phases need while this one builds
+                if prefetcher is None:
+                    prefetcher = start_prefetch([p for later, _, _ in PHASES if later > phase
+                                                 for p in PREFETCH_PHASES[later]])
+            record_doctor(phase, "before")
+            result = run_phase(wheels_dir)
+            record_doctor(phase, "after")
+            if result != 0:
+                log_error(f"Phase {phase} failed")
+                return result
+            if not already_complete:
+                eta.finish(key)
+        return 0
+    finally:
+        if prefetcher:
+            prefetcher.stop()
+
+
+def log_run_statistics() -> None:
+    """Log per-command resource usage and watchdog stalls for this run."""
+    commands = load_report().get("commands", [])
+    if commands:
+        log_info(f"Resource usage per command (sorted by {USAGE_SORT}, set DROIDRUN_USAGE_SORT to change):")
+        for line in format_usage_table(commands, USAGE_SORT):
+            log_info(line)
+        log_info("=" * 70)
+    
+    if STALLS:
+        log_warning(f"{len(STALLS)} command(s) were killed by the inactivity watchdog:")
+        for stall in STALLS:
+            log_warning(f"  {stall['package'] or stall['command']} (no progress for {stall['idle_seconds']}s)")
+    log_workspace_usage()
+    save_report()
+    log_info(f"Run report: {REPORT_FILE}")
+
+
 def main() -> int:
     """Main installation function."""
     log_info("=" * 70)
@@ -708,47 +723,31 @@ def main() -> int:
     log_info("This script will install droidrun and preserve ALL wheels")
     log_info("(including transitive dependencies) for easy export to another device.")
     log_info("=" * 70)
+    reset_report()
     
     # Setup wheels directory
     wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
     wheels_dir.mkdir(parents=True, exist_ok=True)
     log_info(f"Wheels will be preserved in: {wheels_dir}")
     
-    # Phase 1: Build tools
-    log_info("\n" + "=" * 70)
-    log_info("Phase 1: Installing build tools...")
-    log_info("=" * 70)
-    result = run_phase1_build_tools(wheels_dir)
-    if result != 0:
-        log_error("Phase 1 failed")
-        return result
-    
-    # Phase 2: numpy
-    log_info("\n" + "=" * 70)
-    log_info("Phase 2: Installing numpy...")
-    log_info("=" * 70)
-    result = run_phase2_numpy(wheels_dir)
-    if result != 0:
-        log_error("Phase 2 failed")
-        return result
+    # Optional resource timeline (DROIDRUN_SAMPLE_INTERVAL=<seconds>)
+    sampler = start_sampler()
+    try:
+        result = run_phases(wheels_dir)
+    finally:
+        if sampler:
+            sampler.stop()
+            sampler.export()
     
-    # Phase 3: scipy + scikit-learn
-    log_info("\n" + "=" * 70)
-    log_info("Phase 3: Installing scipy and scikit-learn...")
-    log_info("=" * 70)
-    result = run_phase3_scikit_learn(wheels_dir)
     if result != 0:
-        log_error("Phase 3 failed")
+        log_run_statistics()
         return result
     
-    # Phase 4: droidrun
-    log_info("\n" + "=" * 70)
-    log_info("Phase 4: Installing droidrun...")
-    log_info("=" * 70)
-    result = run_phase4_droidrun(wheels_dir)
-    if result != 0:
-        log_error("Phase 4 failed")
-        return result
+    gc_after_install(wheels_dir)
+    prune_after_install()
+    precompile_after_install()
+    bundle_after_install()
+    profile_after_install()
     
     # Final summary
     log_info("\n" + "=" * 70)
@@ -761,10 +760,10 @@ def main() -> int:
     log_info("You can now copy the wheels directory to another device and install from it:")
     log_info(f"  pip install --find-links {wheels_dir} --no-index droidrun")
     log_info("=" * 70)
+    log_run_statistics()
     
     return 0
 
 
 if __name__ == "__main__":
     sys.exit(main())
-
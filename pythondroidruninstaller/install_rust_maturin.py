@@ -2,9 +2,6 @@
 """Install Rust and maturin - separate script for testing"""
 
 import sys
-import os
-import subprocess
-import shutil
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
@@ -12,29 +9,16 @@ sys.path.insert(0, str(current_dir))
 
 try:
     from .common import (
-        command_exists, pkg_installed, python_pkg_installed,
-        IS_TERMUX, HOME, log_info, log_success, log_error, log_warning
+        command_exists, pkg_installed, python_pkg_installed, network_available,
+        IS_TERMUX, log_info, log_success, log_error, log_warning
     )
+    from .process_monitor import run_monitored
 except ImportError:
     from common import (
-        command_exists, pkg_installed, python_pkg_installed,
-        IS_TERMUX, HOME, log_info, log_success, log_error, log_warning
+        command_exists, pkg_installed, python_pkg_installed, network_available,
+        IS_TERMUX, log_info, log_success, log_error, log_warning
     )
-
-
-def find_wheel(name: str) -> Path:
-    """Find pre-built wheel."""
-    for deps_dir in [
-        Path(__file__).parent.parent.parent / "depedencies" / "wheels",
-        HOME / "droidrundepedency" / "depedencies" / "wheels",
-        HOME / "depedencies" / "wheels",
-    ]:
-        for arch_dir in [deps_dir / "_x86_64_wheels", deps_dir / "arch64_wheels"]:
-            if arch_dir.exists():
-                wheel = next(arch_dir.glob(f"{name}*.whl"), None)
-                if wheel:
-                    return wheel
-    return None
+    from process_monitor import run_monitored
 
 
 def install_rust() -> bool:
@@ -48,14 +32,17 @@ def install_rust() -> bool:
         return False
     
     # CRITICAL: Upgrade LLVM first - fixes rustc LLVM symbol linking issues
-    log_info("Upgrading LLVM (required for rustc to work)...")
-    subprocess.run(["pkg", "upgrade", "-y", "llvm", "libllvm", "clang", "lld"], capture_output=True, check=False)
+    if network_available():
+        log_info("Upgrading LLVM (required for rustc to work)...")
+        run_monitored(["pkg", "upgrade", "-y", "llvm", "libllvm", "clang", "lld"], capture_output=True, check=False)
+    else:
+        log_warning("Offline - skipping LLVM upgrade")
     
     if pkg_installed("rust"):
         log_success("Rust is already installed")
     else:
         log_info("Installing Rust via pkg...")
-        result = subprocess.run(["pkg", "install", "-y", "rust"], capture_output=True, check=False)
+        result = run_monitored(["pkg", "install", "-y", "rust"], capture_output=True, check=False)
         
         if result.returncode != 0:
             log_error(f"Failed to install Rust (exit code: {result.returncode})")
@@ -70,37 +57,10 @@ def install_rust() -> bool:
         return False
 
 
-def install_maturin() -> bool:
-    """Install maturin - try pre-built wheel first, then pip (now that LLVM is fixed)."""
-    if python_pkg_installed("maturin", "maturin<2,>=1.9.4"):
-        log_success("maturin is already installed")
-        return True
-    
-    # Try pre-built wheel first (faster if available)
-    maturin_wheel = find_wheel("maturin")
-    if maturin_wheel:
-        log_info(f"Found pre-built maturin wheel: {maturin_wheel.name}")
-        wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
-        wheels_dir.mkdir(exist_ok=True)
-        shutil.copy2(maturin_wheel, wheels_dir / maturin_wheel.name)
-        
-        log_info("Installing maturin from pre-built wheel...")
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), 
-             "--no-index", str(maturin_wheel)],
-            capture_output=True,
-            check=False
-        )
-        
-        if result.returncode == 0 and python_pkg_installed("maturin", "maturin<2,>=1.9.4"):
-            log_success("maturin installed from pre-built wheel")
-            return True
-        else:
-            log_warning("Pre-built wheel installation failed, trying pip install...")
-    
-    # Try pip install (should work now that LLVM is fixed)
+def build_maturin() -> bool:
+    """Build maturin with pip (should work now that LLVM is fixed)."""
     log_info("Installing maturin via pip (this may take a while)...")
-    result = subprocess.run(
+    result = run_monitored(
         [sys.executable, "-m", "pip", "install", "maturin<2,>=1.9.4"],
         capture_output=True,
         check=False
@@ -123,6 +83,27 @@ def install_maturin() -> bool:
         return False
 
 
+def install_maturin() -> bool:
+    """Install maturin - try pre-built wheel first, then pip (now that LLVM is fixed)."""
+    if python_pkg_installed("maturin", "maturin<2,>=1.9.4"):
+        log_success("maturin is already installed")
+        return True
+    
+    # source_selector needs packaging, which phase 1 only installs after this fallback
+    if not python_pkg_installed("packaging"):
+        result = run_monitored([sys.executable, "-m", "pip", "install", "packaging"], capture_output=True, check=False)
+        if result.returncode != 0:
+            log_warning("Could not install packaging, building maturin directly...")
+            return build_maturin()
+
+    # Pre-built wheel first (faster if available), then pip
+    try:
+        from .source_selector import install_from_best_source
+    except ImportError:
+        from source_selector import install_from_best_source
+    return install_from_best_source("maturin", "maturin<2,>=1.9.4", build=build_maturin) is not None
+
+
 def verify_rust() -> bool:
     """Verify Rust is working."""
     if not command_exists("rustc"):
@@ -130,7 +111,7 @@ def verify_rust() -> bool:
         return False
     
     log_info("Verifying rustc...")
-    result = subprocess.run(["rustc", "--version"], capture_output=True, check=False)
+    result = run_monitored(["rustc", "--version"], capture_output=True, check=False)
     if result.returncode == 0:
         version = result.stdout.decode('utf-8', errors='ignore').strip()
         log_success(f"Rust version: {version}")
@@ -155,7 +136,7 @@ def verify_maturin() -> bool:
         return False
     
     log_info("Verifying maturin...")
-    result = subprocess.run([sys.executable, "-m", "maturin", "--version"], capture_output=True, check=False)
+    result = run_monitored([sys.executable, "-m", "maturin", "--version"], capture_output=True, check=False)
     if result.returncode == 0:
         version = result.stdout.decode('utf-8', errors='ignore').strip()
         log_success(f"maturin version: {version}")
@@ -3,25 +3,31 @@
 
 import sys
 import os
-import subprocess
 import shutil
 from pathlib import Path
+from typing import Optional
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
     from .common import (
-        setup_build_environment, python_pkg_installed, HOME, PREFIX,
+        setup_build_environment, python_pkg_installed, network_available, HOME, PREFIX,
         get_build_env_with_compilers, get_clean_env,
         log_info, log_success, log_error, log_warning, IS_TERMUX
     )
+    from .process_monitor import run_monitored
+    from .workspace import build_workspace
+    from .meson_builds import meson_pip_args
 except ImportError:
     from common import (
-        setup_build_environment, python_pkg_installed, HOME, PREFIX,
+        setup_build_environment, python_pkg_installed, network_available, HOME, PREFIX,
         get_build_env_with_compilers, get_clean_env,
         log_info, log_success, log_error, log_warning, IS_TERMUX
     )
+    from process_monitor import run_monitored
+    from workspace import build_workspace
+    from meson_builds import meson_pip_args
 
 
 def ensure_gfortran_symlink() -> bool:
@@ -69,8 +75,8 @@ def install_scipy() -> bool:
     build_env["F77"] = f"{PREFIX}/bin/flang"
     build_env["F90"] = f"{PREFIX}/bin/flang"
     
-    result = subprocess.run(
-        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "scipy>=1.8.0,<1.17.0"],
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + meson_pip_args("scipy", "scipy>=1.8.0,<1.17.0"),
         env=build_env,
         check=False
     )
@@ -87,65 +93,8 @@ def install_scipy() -> bool:
     return True
 
 
-def install_scikit_learn() -> bool:
-    """Install scikit-learn with proper fixes."""
-    if python_pkg_installed("scikit-learn", "scikit-learn"):
-        log_success("scikit-learn is already installed")
-        return True
-    
-    # Check prerequisites
-    if not python_pkg_installed("numpy"):
-        log_error("numpy must be installed first")
-        return False
-    
-    if not python_pkg_installed("scipy", "scipy>=1.8.0"):
-        log_error("scipy must be installed first")
-        return False
-    
-    log_info("Installing scikit-learn...")
-    
-    # Set up build environment
-    setup_build_environment()
-    
-    # Install dependencies first (pure Python, no CC/CXX needed)
-    clean_env = get_clean_env()
-    for dep in ["joblib>=1.3.0", "threadpoolctl>=3.2.0"]:
-        if not python_pkg_installed(dep.split(">=")[0].split("==")[0]):
-            log_info(f"Installing {dep}...")
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "--no-cache-dir", dep],
-                env=clean_env,
-                check=False
-            )
-            if result.returncode != 0:
-                log_warning(f"Failed to install {dep}, but continuing...")
-    
-    # Try installing scikit-learn with --no-build-isolation to avoid building scipy
-    build_env = get_build_env_with_compilers()
-    
-    # Method 1: Try direct pip install with --no-build-isolation
-    log_info("Attempting direct pip install with --no-build-isolation...")
-    result = subprocess.run(
-        [
-            sys.executable, "-m", "pip", "install", "--no-cache-dir",
-            "--no-build-isolation", "scikit-learn"
-        ],
-        env=build_env,
-        check=False
-    )
-    
-    if result.returncode == 0:
-        if python_pkg_installed("scikit-learn", "scikit-learn"):
-            log_success("scikit-learn installed successfully")
-            return True
-    
-    # Method 2: Build from source with fixes (using build_scikit_learn.sh approach)
-    log_info("Direct install failed, trying build from source with fixes...")
-    
-    wheels_dir = HOME / "wheels"
-    wheels_dir.mkdir(exist_ok=True)
-    
-    # Download source tarball directly from PyPI (bypasses metadata preparation)
+def download_scikit_learn_source(wheels_dir: Path) -> Optional[Path]:
+    """Fetch the latest scikit-learn sdist from PyPI into wheels_dir (reusing an existing download)."""
     log_info("Downloading scikit-learn source tarball directly from PyPI...")
     
     import urllib.request
@@ -203,7 +152,81 @@ def install_scikit_learn() -> bool:
             source_file = actual_source_file
         except Exception as e:
             log_error(f"Failed to download source tarball: {e}")
+            return None
+    
+    return source_file
+
+
+def install_scikit_learn() -> bool:
+    """Install scikit-learn with proper fixes."""
+    if python_pkg_installed("scikit-learn", "scikit-learn"):
+        log_success("scikit-learn is already installed")
+        return True
+    
+    # Check prerequisites
+    if not python_pkg_installed("numpy"):
+        log_error("numpy must be installed first")
+        return False
+    
+    if not python_pkg_installed("scipy", "scipy>=1.8.0"):
+        log_error("scipy must be installed first")
+        return False
+    
+    log_info("Installing scikit-learn...")
+    
+    # Set up build environment
+    setup_build_environment()
+    
+    # Install dependencies first (pure Python, no CC/CXX needed)
+    clean_env = get_clean_env()
+    for dep in ["joblib>=1.3.0", "threadpoolctl>=3.2.0"]:
+        if not python_pkg_installed(dep.split(">=")[0].split("==")[0]):
+            log_info(f"Installing {dep}...")
+            result = run_monitored(
+                [sys.executable, "-m", "pip", "install", "--no-cache-dir", dep],
+                env=clean_env,
+                check=False
+            )
+            if result.returncode != 0:
+                log_warning(f"Failed to install {dep}, but continuing...")
+    
+    # Try installing scikit-learn with --no-build-isolation to avoid building scipy
+    build_env = get_build_env_with_compilers()
+    
+    # Method 1: Try direct pip install with --no-build-isolation
+    # (in the persistent meson build directory, with the source fixes, when possible)
+    log_info("Attempting direct pip install with --no-build-isolation...")
+    target = meson_pip_args("scikit-learn", "scikit-learn")
+    if "--no-build-isolation" not in target:
+        target.append("--no-build-isolation")
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + target,
+        env=build_env,
+        check=False
+    )
+    
+    if result.returncode == 0:
+        if python_pkg_installed("scikit-learn", "scikit-learn"):
+            log_success("scikit-learn installed successfully")
+            return True
+    
+    # Method 2: Build from source with fixes (using build_scikit_learn.sh approach)
+    log_info("Direct install failed, trying build from source with fixes...")
+    
+    wheels_dir = HOME / "wheels"
+    wheels_dir.mkdir(exist_ok=True)
+    
+    if network_available():
+        source_file = download_scikit_learn_source(wheels_dir)
+        if source_file is None:
+            return False
+    else:
+        # Offline: only a previously downloaded tarball can be used
+        local_sources = sorted(wheels_dir.glob("scikit[-_]learn-*.tar.gz"))
+        if not local_sources:
+            log_error(f"Offline and no scikit-learn source tarball in {wheels_dir}")
             return False
+        source_file = local_sources[-1]
     
     if not source_file.exists():
         log_error("Downloaded source file not found")
@@ -211,14 +234,13 @@ def install_scikit_learn() -> bool:
     
     log_info(f"Using source: {source_file.name}")
     
-    # Extract and fix
-    import tempfile
-    with tempfile.TemporaryDirectory() as tmpdir:
-        extract_dir = Path(tmpdir)
+    # Extract and fix; the unpacked source is about five times the tarball
+    size_hint_mb = source_file.stat().st_size * 5 / 1048576
+    with build_workspace("scikit-learn-src", size_hint_mb) as extract_dir:
         
         # Extract
         log_info("Extracting source...")
-        result = subprocess.run(
+        result = run_monitored(
             ["tar", "-xzf", str(source_file), "-C", str(extract_dir)],
             check=False
         )
@@ -264,8 +286,8 @@ def install_scikit_learn() -> bool:
         
         # Repackage
         log_info("Repackaging fixed source...")
-        fixed_source = wheels_dir / f"scikit-learn-{pkg_version}-fixed.tar.gz"
-        result = subprocess.run(
+        fixed_source = extract_dir / f"scikit-learn-{pkg_version}-fixed.tar.gz"
+        result = run_monitored(
             [
                 "tar", "-czf", str(fixed_source),
                 "-C", str(extract_dir), pkg_dir.name
@@ -278,7 +300,7 @@ def install_scikit_learn() -> bool:
         
         # Build wheel
         log_info("Building wheel from fixed source...")
-        result = subprocess.run(
+        result = run_monitored(
             [
                 sys.executable, "-m", "pip", "wheel",
                 "--no-deps", "--no-build-isolation",
@@ -294,13 +316,13 @@ def install_scikit_learn() -> bool:
             return False
         
         # Install wheel
-        wheel_files = list(wheels_dir.glob("scikit_learn-*.whl"))
+        wheel_files = sorted(wheels_dir.glob("scikit_learn-*.whl"), key=lambda w: w.stat().st_mtime, reverse=True)
         if not wheel_files:
             log_error("Built wheel not found")
             return False
         
         log_info("Installing wheel...")
-        result = subprocess.run(
+        result = run_monitored(
             [
                 sys.executable, "-m", "pip", "install",
                 "--find-links", str(wheels_dir), "--no-index",
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""Persistent meson build directories, so numpy, scipy, pandas and scikit-learn rebuild incrementally."""
+
+import os
+import sys
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, network_available, HOME, log_info, log_success, log_warning
+    from .build_utils import fix_source_tree
+    from .workspace import build_workspace, dir_size
+    from .wheelhouse import same_content
+    from .prefetch import index_links, download_file, PREFETCH_DIR
+except ImportError:
+    from common import record_report, network_available, HOME, log_info, log_success, log_warning
+    from build_utils import fix_source_tree
+    from workspace import build_workspace, dir_size
+    from wheelhouse import same_content
+    from prefetch import index_links, download_file, PREFETCH_DIR
+
+
+# Set to 0 to build these packages in a fresh temporary directory every time
+MESON_BUILD_DIRS = os.environ.get("DROIDRUN_MESON_BUILD_DIRS", "1") != "0"
+
+MESON_BUILD_ROOT = Path(os.environ.get("DROIDRUN_MESON_BUILD_ROOT", str(HOME / ".cache" / "droidrun-meson")))
+
+# meson-python packages, with the source fix (build_utils.fix_source_tree) each one needs
+MESON_PACKAGES: Dict[str, Optional[str]] = {
+    "numpy": None,
+    "scipy": None,
+    "pandas": "pandas",
+    "scikit-learn": "scikit-learn",
+}
+
+
+def package_root(pkg_name: str) -> Path:
+    return MESON_BUILD_ROOT / pkg_name
+
+
+def source_dir(pkg_name: str) -> Path:
+    # One path for every version: meson and ninja key everything on absolute source paths.
+    # Named after the package so process_monitor.infer_package labels the build
+    return package_root(pkg_name) / pkg_name
+
+
+def build_dir(pkg_name: str) -> Path:
+    return package_root(pkg_name) / f"build-{sys.implementation.cache_tag}"
+
+
+def _sdist_version(pkg_name: str, filename: str):
+    from packaging.utils import canonicalize_name, parse_sdist_filename, InvalidSdistFilename
+
+    try:
+        name, version = parse_sdist_filename(filename)
+    except InvalidSdistFilename:
+        return None
+    return version if name == canonicalize_name(pkg_name) else None
+
+
+def _best(candidates: List[Tuple], version_spec: str) -> Optional[Tuple]:
+    """The (version, ...) candidate with the newest version satisfying version_spec, skipping pre-releases."""
+    from packaging.requirements import Requirement
+
+    specifier = Requirement(version_spec).specifier
+    matching = [c for c in candidates if c[0] is not None and specifier.contains(c[0])]
+    return max(matching, key=lambda c: c[0]) if matching else None
+
+
+def index_sdists(pkg_name: str) -> List[Tuple[object, str, str]]:
+    """(version, filename, url) of the installable sdists the index lists for pkg_name."""
+    return [(_sdist_version(pkg_name, filename), filename, url)
+            for filename, url in index_links(pkg_name) if _sdist_version(pkg_name, filename) is not None]
+
+
+def find_sdist(pkg_name: str, version_spec: str) -> Optional[Path]:
+    """
+    The newest sdist of pkg_name satisfying version_spec.
+
+    The index is asked directly rather than through `pip download`, because
+    meson-python has no metadata hook and pip would run a full build just to
+    learn the version. Downloads are kept, so offline runs reuse them, and
+    a copy the prefetcher already fetched is used as is.
+    """
+    sdists_dir = package_root(pkg_name) / "sdists"
+    sdists_dir.mkdir(parents=True, exist_ok=True)
+    wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
+    local_dirs = [sdists_dir, PREFETCH_DIR, wheels_dir]
+    local = [(_sdist_version(pkg_name, p.name), p)
+             for directory in local_dirs if directory.is_dir()
+             for p in directory.iterdir() if p.name.endswith((".tar.gz", ".zip"))]
+
+    if network_available():
+        try:
+            best = _best(index_sdists(pkg_name), version_spec)
+        except (OSError, ValueError) as e:
+            log_warning(f"Could not list {pkg_name} sdists: {e}")
+            best = None
+        if best is not None:
+            _, filename, url = best
+            for directory in local_dirs:
+                if (directory / filename).is_file():
+                    return directory / filename
+            log_info(f"Downloading {filename}...")
+            try:
+                download_file(url, sdists_dir / filename)
+                return sdists_dir / filename
+            except OSError as e:
+                log_warning(f"Could not download {filename}: {e}")
+
+    best = _best(local, version_spec)
+    return best[1] if best else None
+
+
+def _extract(sdist: Path, dest: Path) -> Path:
+    """Unpack sdist into dest and return its top-level directory."""
+    if sdist.name.endswith(".zip"):
+        with zipfile.ZipFile(sdist) as zf:
+            zf.extractall(dest)
+    else:
+        with tarfile.open(sdist) as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(dest, filter="data")
+            else:
+                tar.extractall(dest)
+    entries = [p for p in dest.iterdir() if p.is_dir()]
+    return entries[0] if len(entries) == 1 else dest
+
+
+def sync_tree(src: Path, dest: Path) -> Tuple[int, int]:
+    """
+    Make dest a copy of src, rewriting only files whose content differs.
+
+    Unchanged files keep their old mtime, and changed ones get the current
+    time, so ninja recompiles exactly what depends on the changed files.
+    Returns (files written, files removed).
+    """
+    written = removed = 0
+    wanted = set()
+    for root, dirs, files in os.walk(src):
+        rel = Path(root).relative_to(src)
+        target_dir = dest / rel
+        if target_dir.is_symlink() or (target_dir.exists() and not target_dir.is_dir()):
+            target_dir.unlink()
+        target_dir.mkdir(parents=True, exist_ok=True)
+        wanted.add(rel)
+        for name in dirs + files:
+            path = Path(root) / name
+            if name in dirs and not path.is_symlink():
+                continue
+            wanted.add(rel / name)
+            target = target_dir / name
+            if path.is_symlink():
+                if target.is_symlink() and os.readlink(target) == os.readlink(path):
+                    continue
+            elif target.is_file() and not target.is_symlink() and same_content(path, target):
+                continue
+            if target.is_dir() and not target.is_symlink():
+                shutil.rmtree(target)
+            elif target.exists() or target.is_symlink():
+                target.unlink()
+            shutil.copyfile(path, target, follow_symlinks=False)
+            if not path.is_symlink():
+                shutil.copymode(path, target)
+            written += 1
+
+    for root, dirs, files in os.walk(dest, topdown=False):
+        rel = Path(root).relative_to(dest)
+        for name in files:
+            if rel / name not in wanted:
+                (Path(root) / name).unlink()
+                removed += 1
+        for name in dirs:
+            path = Path(root) / name
+            if rel / name not in wanted:
+                if path.is_symlink():
+                    path.unlink()
+                else:
+                    shutil.rmtree(path, ignore_errors=True)
+    return written, removed
+
+
+def missing_build_requirements(tree: Path) -> List[str]:
+    """
+    Build requirements from pyproject.toml that the current environment does not satisfy.
+
+    A persistent build directory only helps without build isolation: pip's
+    isolated environment lives at a new path every time, which changes every
+    compiler command line and makes ninja rebuild everything.
+    """
+    from importlib import metadata
+    from packaging.requirements import Requirement, InvalidRequirement
+
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            return ["tomllib"]
+    try:
+        with open(tree / "pyproject.toml", 'rb') as f:
+            requires = tomllib.load(f).get("build-system", {}).get("requires", [])
+    except (OSError, ValueError):
+        return ["pyproject.toml"]
+
+    missing = []
+    for line in requires:
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            missing.append(line)
+            continue
+        if requirement.marker and not requirement.marker.evaluate():
+            continue
+        try:
+            version = metadata.version(requirement.name)
+        except metadata.PackageNotFoundError:
+            missing.append(line)
+            continue
+        if requirement.specifier and not requirement.specifier.contains(version, prereleases=True):
+            missing.append(line)
+    return missing
+
+
+def meson_pip_args(pkg_name: str, version_spec: str) -> List[str]:
+    """
+    What to pass pip in place of version_spec to build pkg_name.
+
+    For the meson-python packages this is a persistent source tree, refreshed
+    from the newest matching sdist (with its build_utils fix applied), plus
+    --no-build-isolation and a persistent meson build directory. A retry, or
+    a new sdist that changes a few files, then only recompiles what changed.
+    Anything that stops this (no sdist, unmet build requirements) falls back
+    to [version_spec], the usual fresh build.
+    """
+    if not MESON_BUILD_DIRS or pkg_name not in MESON_PACKAGES:
+        return [version_spec]
+
+    sdist = find_sdist(pkg_name, version_spec)
+    if sdist is None:
+        log_warning(f"No {pkg_name} sdist found, building in a fresh directory")
+        return [version_spec]
+
+    version = _sdist_version(pkg_name, sdist.name)
+    with build_workspace(f"{pkg_name}-sdist", sdist.stat().st_size * 5 / 1048576) as work_dir:
+        tree = _extract(sdist, work_dir / "extract")
+        # The fixes read the version from the directory name
+        staged = work_dir / f"{pkg_name}-{version}"
+        os.replace(tree, staged)
+        if MESON_PACKAGES[pkg_name]:
+            fix_source_tree(staged, pkg_name, MESON_PACKAGES[pkg_name])
+
+        missing = missing_build_requirements(staged)
+        if missing:
+            log_warning(f"{pkg_name}: build requirements not installed ({', '.join(missing)}), "
+                        "building in a fresh directory")
+            return [version_spec]
+
+        reused = build_dir(pkg_name).joinpath("build.ninja").exists()
+        written, removed = sync_tree(staged, source_dir(pkg_name))
+
+    if reused:
+        log_info(f"{pkg_name} {version}: reusing meson build directory "
+                 f"({written} files changed, {removed} removed)")
+    else:
+        log_info(f"{pkg_name} {version}: new meson build directory {build_dir(pkg_name)}")
+    record_report("meson_builds", {
+        "package": pkg_name,
+        "version": str(version),
+        "reused": reused,
+        "changed_files": written,
+        "removed_files": removed,
+    })
+    return [str(source_dir(pkg_name)), "--no-build-isolation",
+            f"--config-settings=build-dir={build_dir(pkg_name)}"]
+
+
+def main() -> int:
+    """Show or clear the persistent meson build directories."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Persistent meson build directories")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("status", help="show the build directories and their sizes")
+    clear_parser = subparsers.add_parser("clear", help="remove build directories and sources")
+    clear_parser.add_argument("packages", nargs="*", help="packages to clear (default: all)")
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        for pkg_name in args.packages or list(MESON_PACKAGES):
+            shutil.rmtree(package_root(pkg_name), ignore_errors=True)
+        log_success(f"Cleared {', '.join(args.packages) or MESON_BUILD_ROOT}")
+        return 0
+
+    for pkg_name in MESON_PACKAGES:
+        root = package_root(pkg_name)
+        if not root.is_dir():
+            print(f"{pkg_name:14} -")
+            continue
+        build = build_dir(pkg_name)
+        state = "configured" if build.joinpath("build.ninja").exists() else "not built"
+        print(f"{pkg_name:14} {dir_size(root) / 1048576:8.1f} MB  {state}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
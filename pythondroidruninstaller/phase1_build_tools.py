@@ -3,9 +3,6 @@
 
 import sys
 import os
-import subprocess
-import shutil
-import zipfile
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
@@ -13,89 +10,43 @@ sys.path.insert(0, str(current_dir))
 
 try:
     from .common import (
-        should_skip_phase, mark_phase_complete, setup_build_environment,
+        set_phase, should_skip_phase, mark_phase_complete, setup_build_environment,
         python_pkg_installed, pkg_installed, command_exists, IS_TERMUX, HOME, PREFIX,
         get_build_env_with_compilers, get_clean_env,
         log_info, log_error, log_success, log_warning
     )
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
 except ImportError:
     from common import (
-        should_skip_phase, mark_phase_complete, setup_build_environment,
+        set_phase, should_skip_phase, mark_phase_complete, setup_build_environment,
         python_pkg_installed, pkg_installed, command_exists, IS_TERMUX, HOME, PREFIX,
         get_build_env_with_compilers, get_clean_env,
         log_info, log_error, log_success, log_warning
     )
-
-
-def find_wheel(name: str) -> Path:
-    """Find pre-built wheel."""
-    for deps_dir in [
-        Path(__file__).parent.parent.parent / "depedencies" / "wheels",
-        HOME / "droidrundepedency" / "depedencies" / "wheels",
-        HOME / "depedencies" / "wheels",
-    ]:
-        for arch_dir in [deps_dir / "_x86_64_wheels", deps_dir / "arch64_wheels"]:
-            if arch_dir.exists():
-                wheel = next(arch_dir.glob(f"{name}*.whl"), None)
-                if wheel:
-                    return wheel
-    return None
-
-
-def fix_grpcio_wheel(wheel_file: Path) -> bool:
-    """Fix grpcio wheel by adding abseil library dependencies."""
-    extract_dir = wheel_file.parent / "grpcio_extract"
-    extract_dir.mkdir(exist_ok=True)
-    
-    try:
-        with zipfile.ZipFile(wheel_file, 'r') as zf:
-            zf.extractall(extract_dir)
-        
-        so_files = list(extract_dir.rglob("cygrpc*.so"))
-        if not so_files:
-            return False
-        
-        # Fix with patchelf if available
-        if shutil.which("patchelf"):
-            so_file = so_files[0]
-            for lib in ["libabsl_flags_internal.so", "libabsl_flags.so", 
-                       "libabsl_flags_commandlineflag.so", "libabsl_flags_reflection.so"]:
-                subprocess.run(["patchelf", "--add-needed", lib, str(so_file)], check=False)
-            subprocess.run(["patchelf", "--set-rpath", f"{PREFIX}/lib", str(so_file)], check=False)
-        
-        # Repackage
-        fixed_wheel = wheel_file.parent / "grpcio-fixed.whl"
-        with zipfile.ZipFile(fixed_wheel, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    zf.write(Path(root) / file, Path(root).relative_to(extract_dir) / file)
-        
-        wheel_file.unlink()
-        fixed_wheel.rename(wheel_file)
-        shutil.rmtree(extract_dir, ignore_errors=True)
-        return True
-    except Exception:
-        shutil.rmtree(extract_dir, ignore_errors=True)
-        return False
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
 
 
 def main() -> int:
+    set_phase(1)
     if should_skip_phase(1):
         log_info("Phase 1 is already complete. Set FORCE_RERUN=1 to rerun.")
         return 0
     
     setup_build_environment()
+    snapshot_before_phase(1)
     
     # Install system packages if needed
     if IS_TERMUX and command_exists("pkg"):
         if not pkg_installed("python-pip"):
-            subprocess.run(["pkg", "install", "-y", "python-pip"], check=False)
+            run_monitored(["pkg", "install", "-y", "python-pip"], check=False)
         else:
             log_info("python-pip is already installed")
         
         if not pkg_installed("flang"):
             log_info("Installing flang...")
-            result = subprocess.run(["pkg", "install", "-y", "flang"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "flang"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install flang - scikit-learn build may fail")
             else:
@@ -107,7 +58,7 @@ def main() -> int:
         for pkg_name in ["autoconf", "automake", "libtool"]:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name}...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some builds may fail")
                 else:
@@ -118,7 +69,7 @@ def main() -> int:
         # Install patchelf (required for fixing ELF binaries)
         if not pkg_installed("patchelf"):
             log_info("Installing patchelf...")
-            result = subprocess.run(["pkg", "install", "-y", "patchelf"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "patchelf"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install patchelf - some wheel fixes may fail")
             else:
@@ -130,7 +81,7 @@ def main() -> int:
         for pkg_name in ["libarrow-cpp", "libjpeg-turbo", "libpng", "libtiff", "libwebp", "freetype", "abseil-cpp"]:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name}...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some builds may fail")
                 else:
@@ -144,7 +95,7 @@ def main() -> int:
         for pkg_name in python_packages:
             if not pkg_installed(pkg_name):
                 log_info(f"Installing {pkg_name} via pkg (required for droidrun)...")
-                result = subprocess.run(["pkg", "install", "-y", pkg_name], check=False)
+                result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
                 if result.returncode != 0:
                     log_warning(f"Failed to install {pkg_name} - some droidrun features may not work")
                 else:
@@ -160,7 +111,7 @@ def main() -> int:
     if IS_TERMUX and command_exists("pkg"):
         if not pkg_installed("rust"):
             log_info("Installing rust via pkg (more stable)...")
-            result = subprocess.run(["pkg", "install", "-y", "rust"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "rust"], check=False)
             if result.returncode == 0:
                 log_success("rust installed successfully via pkg")
                 rust_installed = True
@@ -174,7 +125,7 @@ def main() -> int:
     if not rust_installed:
         rust_maturin_script = Path(__file__).parent / "install_rust_maturin.py"
         if rust_maturin_script.exists():
-            result = subprocess.run([sys.executable, str(rust_maturin_script)], check=False)
+            result = run_monitored([sys.executable, str(rust_maturin_script)], check=False)
             if result.returncode != 0:
                 log_error("Failed to install Rust and maturin")
                 return 1
@@ -188,12 +139,14 @@ def main() -> int:
         ("setuptools", "setuptools"),
         ("Cython", "Cython"),
         ("meson-python", "meson-python<0.19.0,>=0.16.0"),
+        # Needed by the install source selector
+        ("packaging", "packaging>=21.0"),
     ]
     
     for name, spec in essential:
         if not python_pkg_installed(name, spec):
             log_info(f"Installing {name}...")
-            result = subprocess.run(
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "install", "--no-cache-dir", spec],
                 check=False
             )
@@ -209,21 +162,18 @@ def main() -> int:
             log_info(f"{name} is already installed")
     
     # maturin (optional - needed for Phase 4 jiter, but not critical for Phase 1)
-    # Try pre-built wheel first, then pip install (may fail if rust has issues, that's OK)
+    # Cached or bundled wheel first, then pip install (may fail if rust has issues, that's OK)
     if not python_pkg_installed("maturin", "maturin<2,>=1.9.4"):
         log_info("Installing maturin...")
-        maturin_wheel = find_wheel("maturin")
-        if maturin_wheel:
-            wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
-            shutil.copy2(maturin_wheel, wheels_dir / maturin_wheel.name)
-            subprocess.run(
-                [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), 
-                 "--no-index", str(maturin_wheel)],
-                check=False
-            )
-        else:
-            # Try pip install - may fail if rust has linking issues, that's acceptable
-            subprocess.run([sys.executable, "-m", "pip", "install", "maturin<2,>=1.9.4"], check=False)
+        try:
+            from .source_selector import install_from_best_source
+        except ImportError:
+            from source_selector import install_from_best_source
+        install_from_best_source(
+            "maturin", "maturin<2,>=1.9.4",
+            build=lambda: run_monitored([sys.executable, "-m", "pip", "install", "maturin<2,>=1.9.4"],
+                                        check=False).returncode == 0
+        )
     else:
         log_info("maturin is already installed")
     
@@ -277,7 +227,7 @@ def main() -> int:
         if IS_TERMUX and command_exists("pkg"):
             if not pkg_installed("python-pillow"):
                 log_info("Installing python-pillow via pkg (more stable)...")
-                result = subprocess.run(["pkg", "install", "-y", "python-pillow"], check=False)
+                result = run_monitored(["pkg", "install", "-y", "python-pillow"], check=False)
                 if result.returncode == 0:
                     # Verify it's actually available as Python package
                     if python_pkg_installed("pillow", "pillow"):
@@ -301,7 +251,7 @@ def main() -> int:
                 "LDFLAGS": f"-L{PREFIX}/lib",
                 "CPPFLAGS": f"-I{PREFIX}/include",
             })
-            result = subprocess.run(
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pillow"],
                 env=build_env,
                 check=False
@@ -323,7 +273,7 @@ def main() -> int:
         if IS_TERMUX and command_exists("pkg"):
             if not pkg_installed("python-grpcio"):
                 log_info("Installing python-grpcio via pkg (more stable)...")
-                result = subprocess.run(["pkg", "install", "-y", "python-grpcio"], check=False)
+                result = run_monitored(["pkg", "install", "-y", "python-grpcio"], check=False)
                 if result.returncode == 0:
                     # Verify it's actually available as Python package
                     if python_pkg_installed("grpcio", "grpcio"):
@@ -354,7 +304,7 @@ def main() -> int:
             # Ensure Cython is installed (required for grpcio build)
             if not python_pkg_installed("Cython", "Cython"):
                 log_info("Installing Cython (required for grpcio build)...")
-                cython_result = subprocess.run(
+                cython_result = run_monitored(
                     [sys.executable, "-m", "pip", "install", "--no-cache-dir", "Cython"],
                     env=clean_env,
                     check=False
@@ -365,7 +315,7 @@ def main() -> int:
             # Ensure typing-extensions is installed (required for grpcio)
             if not python_pkg_installed("typing-extensions", "typing-extensions>=4.12"):
                 log_info("Installing typing-extensions (required by grpcio)...")
-                typing_ext_result = subprocess.run(
+                typing_ext_result = run_monitored(
                     [sys.executable, "-m", "pip", "install", "--no-cache-dir", "typing-extensions>=4.12"],
                     env=clean_env,
                     check=False
@@ -374,7 +324,7 @@ def main() -> int:
                     log_warning("Failed to install typing-extensions - grpcio installation may fail")
             
             # Try simple pip install first
-            result = subprocess.run(
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "install", "--no-cache-dir", "grpcio"],
                 env=clean_env,
                 check=False
@@ -387,7 +337,7 @@ def main() -> int:
                 wheels_dir.mkdir(parents=True, exist_ok=True)
                 
                 # Build wheel with --no-build-isolation so Cython from main env is available
-                result = subprocess.run(
+                result = run_monitored(
                     [sys.executable, "-m", "pip", "wheel", "grpcio", "--no-deps", 
                      "--no-build-isolation", "--wheel-dir", str(wheels_dir)],
                     env=clean_env,
@@ -395,20 +345,17 @@ def main() -> int:
                 )
                 
                 if result.returncode == 0:
-                    grpcio_wheels = list(wheels_dir.glob("grpcio*.whl"))
+                    grpcio_wheels = sorted(wheels_dir.glob("grpcio-*.whl"), key=lambda w: w.stat().st_mtime, reverse=True)
                     if grpcio_wheels:
-                        log_info("Fixing grpcio wheel with patchelf...")
-                        fix_grpcio_wheel(grpcio_wheels[0])
-                        
                         # Install typing-extensions first
                         if not python_pkg_installed("typing-extensions", "typing-extensions>=4.12"):
-                            dep_result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-cache-dir", "typing-extensions>=4.12"], 
+                            dep_result = run_monitored([sys.executable, "-m", "pip", "install", "--no-cache-dir", "typing-extensions>=4.12"], 
                                          env=clean_env, check=False)
                             if dep_result.returncode != 0:
                                 log_warning(f"Failed to install typing-extensions: {dep_result.returncode}")
                         
                         # Install grpcio from fixed wheel
-                        install_result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-deps", str(grpcio_wheels[0])], 
+                        install_result = run_monitored([sys.executable, "-m", "pip", "install", "--no-deps", str(grpcio_wheels[0])], 
                                      env=clean_env, check=False)
                         if install_result.returncode != 0:
                             log_warning(f"Failed to install grpcio from wheel: {install_result.returncode} (will be handled in Phase 5 if needed)")
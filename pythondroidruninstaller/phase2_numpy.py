@@ -3,16 +3,21 @@
 
 import sys
 import os
-import subprocess
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, get_build_env_with_compilers, log_info, log_success, log_error, log_warning, pkg_installed, IS_TERMUX, command_exists
+    from .common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, get_build_env_with_compilers, log_info, log_success, log_error, log_warning, pkg_installed, IS_TERMUX, command_exists
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
+    from .meson_builds import meson_pip_args
 except ImportError:
-    from common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, get_build_env_with_compilers, log_info, log_success, log_error, log_warning, pkg_installed, IS_TERMUX, command_exists
+    from common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, get_build_env_with_compilers, log_info, log_success, log_error, log_warning, pkg_installed, IS_TERMUX, command_exists
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
+    from meson_builds import meson_pip_args
 
 
 def verify_numpy() -> bool:
@@ -35,6 +40,7 @@ def verify_numpy() -> bool:
 
 
 def main() -> int:
+    set_phase(2)
     if should_skip_phase(2):
         # Still verify even if phase is marked complete
         if verify_numpy():
@@ -44,6 +50,7 @@ def main() -> int:
             # Don't return 0 - force reinstall
     
     setup_build_environment()
+    snapshot_before_phase(2)
     
     # Check if numpy is already installed and working
     if verify_numpy():
@@ -55,7 +62,7 @@ def main() -> int:
     if not pkg_installed("patchelf"):
         log_info("Installing patchelf system package (required for numpy builds)...")
         if IS_TERMUX and command_exists("pkg"):
-            result = subprocess.run(["pkg", "install", "-y", "patchelf"], check=False)
+            result = run_monitored(["pkg", "install", "-y", "patchelf"], check=False)
             if result.returncode != 0:
                 log_warning("Failed to install patchelf system package - numpy build may fail")
             else:
@@ -67,9 +74,9 @@ def main() -> int:
     # numpy needs CC/CXX overrides for C/Fortran extensions
     build_env = get_build_env_with_compilers()
     
-    # Try simple pip install first
-    result = subprocess.run(
-        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "numpy>=1.26.0"],
+    # Try simple pip install first (in the persistent meson build directory when possible)
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + meson_pip_args("numpy", "numpy>=1.26.0"),
         env=build_env,
         check=False
     )
@@ -2,95 +2,143 @@
 """Phase 3: Install scipy, pandas, scikit-learn"""
 
 import sys
-import subprocess
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from .common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
+    from .build_history import EtaTracker
+    from .source_selector import install_from_best_source, SOURCE
+    from .meson_builds import meson_pip_args
 except ImportError:
-    from common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
+    from build_history import EtaTracker
+    from source_selector import install_from_best_source, SOURCE
+    from meson_builds import meson_pip_args
 
 
-def main() -> int:
-    if should_skip_phase(3):
-        return 0
-    
-    setup_build_environment()
-    
-    # scipy - needs CC/CXX for C/Fortran extensions
+# Requirement each package must satisfy, and the packages it is built against
+PACKAGE_SPECS = {
+    "scipy": "scipy>=1.8.0,<1.17.0",
+    "pandas": "pandas<2.3.0",
+    "scikit-learn": "scikit-learn",
+}
+PACKAGE_DEPS = {
+    "scikit-learn": ["scipy"],
+}
+
+
+def install_scipy() -> bool:
+    """Install scipy - needs CC/CXX for C/Fortran extensions."""
+    log_info("Installing scipy...")
+    build_env = get_build_env_with_compilers()
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + meson_pip_args("scipy", PACKAGE_SPECS["scipy"]),
+        env=build_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_error(f"scipy installation failed with exit code {result.returncode}")
+        log_error("Check the output above for detailed error messages")
+        return False
     if not python_pkg_installed("scipy", "scipy>=1.8.0,<1.17.0"):
-        log_info("Installing scipy...")
-        build_env = get_build_env_with_compilers()
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "scipy>=1.8.0,<1.17.0"],
-            env=build_env,
-            check=False
-        )
+        log_error("scipy installation succeeded but package not found")
+        return False
+    log_success("scipy installed successfully")
+    return True
+
+
+def install_pandas() -> bool:
+    """Install pandas - needs CC/CXX for C extensions."""
+    log_info("Installing pandas...")
+    # Install deps first (pure Python, no CC/CXX needed)
+    clean_env = get_clean_env()
+    for dep in ["python-dateutil>=2.8.2", "pytz>=2020.1", "tzdata>=2022.7"]:
+        result = run_monitored([sys.executable, "-m", "pip", "install", "--no-cache-dir", dep], 
+                     env=clean_env, check=False)
         if result.returncode != 0:
-            log_error(f"scipy installation failed with exit code {result.returncode}")
-            log_error("Check the output above for detailed error messages")
-            return 1
-        if not python_pkg_installed("scipy", "scipy>=1.8.0,<1.17.0"):
-            log_error("scipy installation succeeded but package not found")
-            return 1
-        log_success("scipy installed successfully")
+            log_warning(f"Failed to install {dep}, but continuing...")
     
-    # pandas - needs CC/CXX for C extensions
+    # Direct pip install with CC/CXX
+    build_env = get_build_env_with_compilers()
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + meson_pip_args("pandas", PACKAGE_SPECS["pandas"]),
+        env=build_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_error(f"pandas installation failed with exit code {result.returncode}")
+        log_error("Check the output above for detailed error messages")
+        return False
     if not python_pkg_installed("pandas", "pandas<2.3.0"):
-        log_info("Installing pandas...")
-        # Install deps first (pure Python, no CC/CXX needed)
-        clean_env = get_clean_env()
-        for dep in ["python-dateutil>=2.8.2", "pytz>=2020.1", "tzdata>=2022.7"]:
-            result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-cache-dir", dep], 
-                         env=clean_env, check=False)
-            if result.returncode != 0:
-                log_warning(f"Failed to install {dep}, but continuing...")
-        
-        # Direct pip install with CC/CXX
-        build_env = get_build_env_with_compilers()
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pandas<2.3.0"],
-            env=build_env,
-            check=False
-        )
+        log_error("pandas installation succeeded but package not found")
+        return False
+    log_success("pandas installed successfully")
+    return True
+
+
+def install_scikit_learn() -> bool:
+    """Install scikit-learn - needs CC/CXX for C extensions."""
+    log_info("Installing scikit-learn...")
+    # Install deps first (pure Python, no CC/CXX needed)
+    clean_env = get_clean_env()
+    for dep in ["joblib>=1.3.0", "threadpoolctl>=3.2.0"]:
+        result = run_monitored([sys.executable, "-m", "pip", "install", "--no-cache-dir", dep], 
+                     env=clean_env, check=False)
         if result.returncode != 0:
-            log_error(f"pandas installation failed with exit code {result.returncode}")
-            log_error("Check the output above for detailed error messages")
-            return 1
-        if not python_pkg_installed("pandas", "pandas<2.3.0"):
-            log_error("pandas installation succeeded but package not found")
-            return 1
-        log_success("pandas installed successfully")
+            log_warning(f"Failed to install {dep}, but continuing...")
     
-    # scikit-learn - needs CC/CXX for C extensions
+    # Direct pip install with CC/CXX
+    build_env = get_build_env_with_compilers()
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir"] + meson_pip_args("scikit-learn", PACKAGE_SPECS["scikit-learn"]),
+        env=build_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_error(f"scikit-learn installation failed with exit code {result.returncode}")
+        log_error("Check the output above for detailed error messages")
+        return False
     if not python_pkg_installed("scikit-learn", "scikit-learn"):
-        log_info("Installing scikit-learn...")
-        # Install deps first (pure Python, no CC/CXX needed)
-        clean_env = get_clean_env()
-        for dep in ["joblib>=1.3.0", "threadpoolctl>=3.2.0"]:
-            result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-cache-dir", dep], 
-                         env=clean_env, check=False)
-            if result.returncode != 0:
-                log_warning(f"Failed to install {dep}, but continuing...")
-        
-        # Direct pip install with CC/CXX
-        build_env = get_build_env_with_compilers()
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "scikit-learn"],
-            env=build_env,
-            check=False
-        )
-        if result.returncode != 0:
-            log_error(f"scikit-learn installation failed with exit code {result.returncode}")
-            log_error("Check the output above for detailed error messages")
-            return 1
-        if not python_pkg_installed("scikit-learn", "scikit-learn"):
-            log_error("scikit-learn installation succeeded but package not found")
+        log_error("scikit-learn installation succeeded but package not found")
+        return False
+    log_success("scikit-learn installed successfully")
+    return True
+
+
+INSTALLERS = {
+    "scipy": install_scipy,
+    "pandas": install_pandas,
+    "scikit-learn": install_scikit_learn,
+}
+
+
+def main() -> int:
+    set_phase(3)
+    if should_skip_phase(3):
+        return 0
+    
+    setup_build_environment()
+    snapshot_before_phase(3)
+    
+    # Longest remaining build chain first, based on build history
+    eta = EtaTracker(list(INSTALLERS), PACKAGE_DEPS, label="Phase 3 builds")
+    for pkg in eta.order:
+        if python_pkg_installed(pkg, PACKAGE_SPECS[pkg]):
+            eta.skip(pkg)
+            continue
+        eta.start(pkg)
+        source = install_from_best_source(pkg, PACKAGE_SPECS[pkg], build=INSTALLERS[pkg])
+        # Only source builds say anything about build duration
+        eta.finish(pkg, source is not None, record=source == SOURCE)
+        if source is None:
             return 1
-        log_success("scikit-learn installed successfully")
     
     # Verify all required packages are installed before marking complete
     required_packages = [
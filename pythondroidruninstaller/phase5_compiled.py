@@ -3,181 +3,183 @@
 
 import sys
 import os
-import subprocess
-import zipfile
-import shutil
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, PREFIX, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from .common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, PREFIX, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
+    from .build_history import EtaTracker
+    from .source_selector import install_from_best_source, SOURCE
 except ImportError:
-    from common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, PREFIX, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, PREFIX, get_build_env_with_compilers, get_clean_env, log_info, log_success, log_error, log_warning
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
+    from build_history import EtaTracker
+    from source_selector import install_from_best_source, SOURCE
 
 
-def fix_grpcio_wheel(wheel_file: Path) -> bool:
-    """Fix grpcio wheel."""
-    extract_dir = wheel_file.parent / "grpcio_extract"
-    extract_dir.mkdir(exist_ok=True)
+def install_pyarrow() -> bool:
+    """Install pyarrow (optional) - needs CC/CXX for C++ extensions."""
+    log_info("Installing pyarrow...")
+    build_env = get_build_env_with_compilers()
+    build_env["ARROW_HOME"] = PREFIX
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pyarrow"],
+        env=build_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_warning(f"pyarrow installation failed with exit code {result.returncode} (optional, continuing...)")
+        return False
+    elif not python_pkg_installed("pyarrow", "pyarrow"):
+        log_warning("pyarrow installation succeeded but package not found (optional, continuing...)")
+        return False
+    log_success("pyarrow installed successfully")
+    return True
+
+
+def install_psutil() -> bool:
+    """Install psutil (optional) - can work without CC/CXX."""
+    log_info("Installing psutil...")
+    clean_env = get_clean_env()
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "psutil"],
+        env=clean_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_warning(f"psutil installation failed with exit code {result.returncode} (optional, continuing...)")
+        return False
+    elif not python_pkg_installed("psutil", "psutil"):
+        log_warning("psutil installation succeeded but package not found (optional, continuing...)")
+        return False
+    log_success("psutil installed successfully")
+    return True
+
+
+def install_grpcio() -> bool:
+    """Install grpcio (required) - can try without CC/CXX first, but may need special handling."""
+    log_info("Installing grpcio...")
+    clean_env = get_clean_env()
+    clean_env.update({
+        "GRPC_PYTHON_BUILD_SYSTEM_OPENSSL": "1",
+        "GRPC_PYTHON_BUILD_SYSTEM_ZLIB": "1",
+        "GRPC_PYTHON_BUILD_SYSTEM_CARES": "1",
+        "GRPC_PYTHON_BUILD_SYSTEM_RE2": "1",
+        "GRPC_PYTHON_BUILD_SYSTEM_ABSL": "1",
+        "GRPC_PYTHON_BUILD_WITH_CYTHON": "1",
+    })
     
-    try:
-        with zipfile.ZipFile(wheel_file, 'r') as zf:
-            zf.extractall(extract_dir)
-        
-        so_files = list(extract_dir.rglob("cygrpc*.so"))
-        if not so_files:
-            return False
-        
-        # Fix with patchelf if available
-        if shutil.which("patchelf"):
-            so_file = so_files[0]
-            for lib in ["libabsl_flags_internal.so", "libabsl_flags.so", 
-                       "libabsl_flags_commandlineflag.so", "libabsl_flags_reflection.so"]:
-                subprocess.run(["patchelf", "--add-needed", lib, str(so_file)], check=False)
-            subprocess.run(["patchelf", "--set-rpath", f"{PREFIX}/lib", str(so_file)], check=False)
-        
-        # Repackage
-        fixed_wheel = wheel_file.parent / "grpcio-fixed.whl"
-        with zipfile.ZipFile(fixed_wheel, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(extract_dir):
-                for file in files:
-                    zf.write(Path(root) / file, Path(root).relative_to(extract_dir) / file)
+    # Try simple pip install first
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "grpcio"],
+        env=clean_env,
+        check=False
+    )
+    
+    if result.returncode != 0 or not python_pkg_installed("grpcio", "grpcio"):
+        # Fallback to wheel build method
+        log_warning("Direct install failed, trying wheel build method...")
+        wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
+        wheels_dir.mkdir(parents=True, exist_ok=True)
+        result = run_monitored(
+            [sys.executable, "-m", "pip", "wheel", "grpcio", "--no-deps", 
+             "--no-build-isolation", "--wheel-dir", str(wheels_dir)],
+            env=clean_env,
+            check=False
+        )
         
-        wheel_file.unlink()
-        fixed_wheel.rename(wheel_file)
-        shutil.rmtree(extract_dir, ignore_errors=True)
-        return True
-    except Exception:
-        shutil.rmtree(extract_dir, ignore_errors=True)
+        if result.returncode == 0:
+            grpcio_wheels = sorted(wheels_dir.glob("grpcio-*.whl"), key=lambda w: w.stat().st_mtime, reverse=True)
+            if grpcio_wheels:
+                # Install typing-extensions first
+                if not python_pkg_installed("typing-extensions", "typing-extensions>=4.12"):
+                    dep_result = run_monitored([sys.executable, "-m", "pip", "install", "--no-cache-dir", "typing-extensions>=4.12"], 
+                                 env=clean_env, check=False)
+                    if dep_result.returncode != 0:
+                        log_warning(f"Failed to install typing-extensions: {dep_result.returncode}")
+                
+                # Install grpcio
+                install_result = run_monitored([sys.executable, "-m", "pip", "install", "--no-deps", str(grpcio_wheels[0])], 
+                             env=clean_env, check=False)
+                if install_result.returncode != 0:
+                    log_error(f"Failed to install grpcio from wheel: {install_result.returncode}")
+                    return False
+    
+    if not python_pkg_installed("grpcio", "grpcio"):
+        log_error("grpcio installation failed - required package")
+        log_error("Check the output above for detailed error messages")
         return False
+    
+    log_success("grpcio installed successfully")
+    
+    # Set LD_LIBRARY_PATH
+    os.environ["LD_LIBRARY_PATH"] = f"{PREFIX}/lib:{os.environ.get('LD_LIBRARY_PATH', '')}"
+    bashrc = HOME / ".bashrc"
+    if bashrc.exists() and "LD_LIBRARY_PATH.*PREFIX/lib" not in bashrc.read_text():
+        with open(bashrc, 'a') as f:
+            f.write("export LD_LIBRARY_PATH=$PREFIX/lib:$LD_LIBRARY_PATH\n")
+    return True
+
+
+def install_pillow() -> bool:
+    """Install pillow (optional) - needs CC/CXX for C extensions."""
+    log_info("Installing pillow...")
+    build_env = get_build_env_with_compilers()
+    build_env.update({
+        "PKG_CONFIG_PATH": f"{PREFIX}/lib/pkgconfig",
+        "LDFLAGS": f"-L{PREFIX}/lib",
+        "CPPFLAGS": f"-I{PREFIX}/include",
+    })
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pillow"],
+        env=build_env,
+        check=False
+    )
+    if result.returncode != 0:
+        log_warning(f"pillow installation failed with exit code {result.returncode} (optional, continuing...)")
+        return False
+    elif not python_pkg_installed("pillow", "pillow"):
+        log_warning("pillow installation succeeded but package not found (optional, continuing...)")
+        return False
+    log_success("pillow installed successfully")
+    return True
+
+
+# Installers for this phase; only grpcio is required
+INSTALLERS = {
+    "pyarrow": install_pyarrow,
+    "psutil": install_psutil,
+    "grpcio": install_grpcio,
+    "pillow": install_pillow,
+}
+REQUIRED = ["grpcio"]
 
 
 def main() -> int:
+    set_phase(5)
     if should_skip_phase(5):
         return 0
     
     setup_build_environment()
+    snapshot_before_phase(5)
     
-    # pyarrow (optional) - needs CC/CXX for C++ extensions
-    if not python_pkg_installed("pyarrow", "pyarrow"):
-        log_info("Installing pyarrow...")
-        build_env = get_build_env_with_compilers()
-        build_env["ARROW_HOME"] = PREFIX
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pyarrow"],
-            env=build_env,
-            check=False
-        )
-        if result.returncode != 0:
-            log_warning(f"pyarrow installation failed with exit code {result.returncode} (optional, continuing...)")
-        elif not python_pkg_installed("pyarrow", "pyarrow"):
-            log_warning("pyarrow installation succeeded but package not found (optional, continuing...)")
-        else:
-            log_success("pyarrow installed successfully")
-    
-    # psutil (optional) - can work without CC/CXX
-    if not python_pkg_installed("psutil", "psutil"):
-        log_info("Installing psutil...")
-        clean_env = get_clean_env()
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "psutil"],
-            env=clean_env,
-            check=False
-        )
-        if result.returncode != 0:
-            log_warning(f"psutil installation failed with exit code {result.returncode} (optional, continuing...)")
-        elif not python_pkg_installed("psutil", "psutil"):
-            log_warning("psutil installation succeeded but package not found (optional, continuing...)")
-        else:
-            log_success("psutil installed successfully")
-    
-    # grpcio - can try without CC/CXX first, but may need special handling
-    if not python_pkg_installed("grpcio", "grpcio"):
-        log_info("Installing grpcio...")
-        clean_env = get_clean_env()
-        clean_env.update({
-            "GRPC_PYTHON_BUILD_SYSTEM_OPENSSL": "1",
-            "GRPC_PYTHON_BUILD_SYSTEM_ZLIB": "1",
-            "GRPC_PYTHON_BUILD_SYSTEM_CARES": "1",
-            "GRPC_PYTHON_BUILD_SYSTEM_RE2": "1",
-            "GRPC_PYTHON_BUILD_SYSTEM_ABSL": "1",
-            "GRPC_PYTHON_BUILD_WITH_CYTHON": "1",
-        })
-        
-        # Try simple pip install first
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "grpcio"],
-            env=clean_env,
-            check=False
-        )
-        
-        if result.returncode != 0 or not python_pkg_installed("grpcio", "grpcio"):
-            # Fallback to wheel build method
-            log_warning("Direct install failed, trying wheel build method...")
-            wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
-            wheels_dir.mkdir(parents=True, exist_ok=True)
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "wheel", "grpcio", "--no-deps", 
-                 "--no-build-isolation", "--wheel-dir", str(wheels_dir)],
-                env=clean_env,
-                check=False
-            )
-            
-            if result.returncode == 0:
-                grpcio_wheels = list(wheels_dir.glob("grpcio*.whl"))
-                if grpcio_wheels:
-                    fix_grpcio_wheel(grpcio_wheels[0])
-                    
-                    # Install typing-extensions first
-                    if not python_pkg_installed("typing-extensions", "typing-extensions>=4.12"):
-                        dep_result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-cache-dir", "typing-extensions>=4.12"], 
-                                     env=clean_env, check=False)
-                        if dep_result.returncode != 0:
-                            log_warning(f"Failed to install typing-extensions: {dep_result.returncode}")
-                    
-                    # Install grpcio
-                    install_result = subprocess.run([sys.executable, "-m", "pip", "install", "--no-deps", str(grpcio_wheels[0])], 
-                                 env=clean_env, check=False)
-                    if install_result.returncode != 0:
-                        log_error(f"Failed to install grpcio from wheel: {install_result.returncode}")
-                        return 1
-        
-        if not python_pkg_installed("grpcio", "grpcio"):
-            log_error("grpcio installation failed - required package")
-            log_error("Check the output above for detailed error messages")
+    # Longest builds first, based on build history
+    eta = EtaTracker(list(INSTALLERS), label="Phase 5 builds")
+    for pkg in eta.order:
+        if python_pkg_installed(pkg, pkg):
+            eta.skip(pkg)
+            continue
+        eta.start(pkg)
+        source = install_from_best_source(pkg, build=INSTALLERS[pkg])
+        # Only source builds say anything about build duration
+        eta.finish(pkg, source is not None, record=source == SOURCE)
+        if source is None and pkg in REQUIRED:
             return 1
-        
-        log_success("grpcio installed successfully")
-        
-        # Set LD_LIBRARY_PATH
-        os.environ["LD_LIBRARY_PATH"] = f"{PREFIX}/lib:{os.environ.get('LD_LIBRARY_PATH', '')}"
-        bashrc = HOME / ".bashrc"
-        if bashrc.exists() and "LD_LIBRARY_PATH.*PREFIX/lib" not in bashrc.read_text():
-            with open(bashrc, 'a') as f:
-                f.write("export LD_LIBRARY_PATH=$PREFIX/lib:$LD_LIBRARY_PATH\n")
-    
-    # pillow (optional) - needs CC/CXX for C extensions
-    if not python_pkg_installed("pillow", "pillow"):
-        log_info("Installing pillow...")
-        build_env = get_build_env_with_compilers()
-        build_env.update({
-            "PKG_CONFIG_PATH": f"{PREFIX}/lib/pkgconfig",
-            "LDFLAGS": f"-L{PREFIX}/lib",
-            "CPPFLAGS": f"-I{PREFIX}/include",
-        })
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", "pillow"],
-            env=build_env,
-            check=False
-        )
-        if result.returncode != 0:
-            log_warning(f"pillow installation failed with exit code {result.returncode} (optional, continuing...)")
-        elif not python_pkg_installed("pillow", "pillow"):
-            log_warning("pillow installation succeeded but package not found (optional, continuing...)")
-        else:
-            log_success("pillow installed successfully")
     
     # Verify required packages are installed (grpcio is required, others optional)
     required_packages = [
@@ -212,5 +214,4 @@ def main() -> int:
 
 
 if __name__ == "__main__":
-    import subprocess
     sys.exit(main())
@@ -3,39 +3,57 @@
 
 import sys
 import os
-import shutil
-import subprocess
 from pathlib import Path
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, log_error, log_info, log_success
+    from .common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, log_error, log_info, log_success
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
+    from .build_history import EtaTracker
+    from .source_selector import install_from_best_source, SOURCE
 except ImportError:
-    from common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, log_error, log_info, log_success
+    from common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, log_error, log_info, log_success
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
+    from build_history import EtaTracker
+    from source_selector import install_from_best_source, SOURCE
 
 
-def find_wheels(pkg_name: str) -> Path:
-    """Find pre-built wheel."""
-    for deps_dir in [
-        Path(__file__).parent.parent.parent / "depedencies" / "wheels",
-        HOME / "droidrundepedency" / "depedencies" / "wheels",
-        HOME / "depedencies" / "wheels",
-    ]:
-        for arch_dir in [deps_dir / "_x86_64_wheels", deps_dir / "arch64_wheels"]:
-            if arch_dir.exists():
-                wheel = next(arch_dir.glob(f"{pkg_name}*.whl"), None)
-                if wheel:
-                    return wheel
-    return None
+def build_from_source(pkg: str) -> bool:
+    """Build a package with pip, without the CC/CXX overrides."""
+    log_info(f"Installing {pkg} from source...")
+    
+    # Create a clean environment for pip install
+    # Some packages (like tokenizers) build better without CC/CXX overrides
+    clean_env = os.environ.copy()
+    # Remove compiler overrides that might interfere with Rust/maturin builds
+    clean_env.pop("CC", None)
+    clean_env.pop("CXX", None)
+    
+    # Use direct pip install - it will build from source automatically
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", pkg],
+        env=clean_env,
+        check=False
+    )
+    
+    if result.returncode != 0:
+        log_error(f"{pkg} installation failed with exit code {result.returncode}")
+        log_error("Check the output above for detailed error messages")
+        return False
+    return True
 
 
 def main() -> int:
+    set_phase(6)
     if should_skip_phase(6):
         return 0
     
     setup_build_environment()
+    snapshot_before_phase(6)
     
     packages = ["tokenizers", "safetensors", "cryptography", "pydantic-core", "orjson"]
     missing = [pkg for pkg in packages if not python_pkg_installed(pkg, pkg)]
@@ -44,54 +62,16 @@ def main() -> int:
         mark_phase_complete(6)
         return 0
     
-    wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
-    
-    # Copy pre-built wheels
-    installed_from_wheels = []
-    for pkg in missing[:]:  # Use slice copy to avoid modification during iteration
-        wheel = find_wheels(pkg)
-        if wheel:
-            wheels_dir.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(wheel, wheels_dir / wheel.name)
-            result = subprocess.run(
-                [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), pkg],
-                check=False
-            )
-            if result.returncode == 0 and python_pkg_installed(pkg, pkg):
-                installed_from_wheels.append(pkg)
-                missing.remove(pkg)
-    
-    # Install remaining packages directly from source using pip
-    # This is simpler and more reliable than the build_package approach
-    # For some packages like tokenizers, we need a clean environment without CC/CXX overrides
-    for pkg in missing:
-        log_info(f"Installing {pkg} from source...")
-        
-        # Create a clean environment for pip install
-        # Some packages (like tokenizers) build better without CC/CXX overrides
-        clean_env = os.environ.copy()
-        # Remove compiler overrides that might interfere with Rust/maturin builds
-        clean_env.pop("CC", None)
-        clean_env.pop("CXX", None)
-        
-        # Use direct pip install - it will build from source automatically
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", pkg],
-            env=clean_env,
-            check=False
-        )
-        
-        if result.returncode != 0:
-            log_error(f"{pkg} installation failed with exit code {result.returncode}")
-            log_error("Check the output above for detailed error messages")
-            return 1
-        
-        # Verify installation
-        if not python_pkg_installed(pkg, pkg):
-            log_error(f"{pkg} installation succeeded but package not found")
+    # Cheapest source first (cached wheel, Termux package, binary wheel), building
+    # from source only when nothing pre-built is available; longest builds first
+    eta = EtaTracker(missing, label="Phase 6 builds")
+    for pkg in eta.order:
+        eta.start(pkg)
+        source = install_from_best_source(pkg, build=lambda pkg=pkg: build_from_source(pkg))
+        eta.finish(pkg, source is not None, record=source == SOURCE)
+        if source is None:
+            log_error(f"{pkg} could not be installed from any source")
             return 1
-        
-        log_success(f"{pkg} installed successfully")
     
     # Verify all packages are installed and can be imported
     still_missing = [pkg for pkg in packages if not python_pkg_installed(pkg, pkg)]
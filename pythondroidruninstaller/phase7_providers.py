@@ -3,17 +3,30 @@
 
 import sys
 import os
-import subprocess
-import shutil
 from pathlib import Path
+from typing import List, Tuple
 
 current_dir = Path(__file__).parent.absolute()
 sys.path.insert(0, str(current_dir))
 
 try:
-    from .common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, log_info, log_success, log_error, log_warning
+    from .common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, network_available, HOME, log_info, log_success, log_error, log_warning
+    from .process_monitor import run_monitored
+    from .snapshots import snapshot_before_phase
+    from .wheelhouse import place_wheel, gc_after_install
+    from .cargo_cache import prune_after_install
+    from .precompile import precompile_after_install
+    from .zipbundle import bundle_after_install
+    from .startup_profile import profile_after_install
 except ImportError:
-    from common import should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, HOME, log_info, log_success, log_error, log_warning
+    from common import set_phase, should_skip_phase, mark_phase_complete, setup_build_environment, python_pkg_installed, network_available, HOME, log_info, log_success, log_error, log_warning
+    from process_monitor import run_monitored
+    from snapshots import snapshot_before_phase
+    from wheelhouse import place_wheel, gc_after_install
+    from cargo_cache import prune_after_install
+    from precompile import precompile_after_install
+    from zipbundle import bundle_after_install
+    from startup_profile import profile_after_install
 
 
 def find_droidrun_wheel() -> Path:
@@ -32,21 +45,51 @@ def find_droidrun_wheel() -> Path:
     return None
 
 
-def check_network_connectivity() -> bool:
-    """Check if network connectivity is available."""
-    try:
-        import socket
-        socket.create_connection(("pypi.org", 443), timeout=3)
-        return True
-    except (OSError, socket.timeout):
-        return False
+def install_providers(providers: List[str], wheels_dir: Path, env: dict) -> Tuple[List[str], List[str]]:
+    """
+    Install providers as one combined extras spec, so the shared dependency tree
+    is resolved once. If that fails, split the set in half and retry each half
+    until the failing providers are isolated.
+
+    Returns:
+        (installed providers, failed providers)
+    """
+    if not providers:
+        return [], []
+    
+    spec = f"droidrun[{','.join(providers)}]"
+    log_info(f"Installing {spec}...")
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
+         "--upgrade-strategy", "only-if-needed", "--no-build-isolation",
+         spec, "--find-links", str(wheels_dir)],
+        env=env,
+        check=False
+    )
+    
+    if result.returncode == 0:
+        log_success(f"{spec} installed successfully")
+        return list(providers), []
+    
+    if len(providers) == 1:
+        log_warning(f"{spec} installation failed with exit code {result.returncode}")
+        log_warning("Check the output above for detailed error messages")
+        return [], list(providers)
+    
+    log_warning(f"{spec} installation failed, splitting providers to find the failing ones...")
+    middle = len(providers) // 2
+    installed_first, failed_first = install_providers(providers[:middle], wheels_dir, env)
+    installed_second, failed_second = install_providers(providers[middle:], wheels_dir, env)
+    return installed_first + installed_second, failed_first + failed_second
 
 
 def main() -> int:
+    set_phase(7)
     if should_skip_phase(7):
         return 0
     
     setup_build_environment()
+    snapshot_before_phase(7)
     
     wheels_dir = Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
     wheels_dir.mkdir(exist_ok=True)
@@ -64,11 +107,10 @@ def main() -> int:
         droidrun_wheel = find_droidrun_wheel()
         if droidrun_wheel:
             log_info(f"Found local droidrun wheel: {droidrun_wheel.name}")
-            wheels_dir.mkdir(parents=True, exist_ok=True)
-            shutil.copy2(droidrun_wheel, wheels_dir / droidrun_wheel.name)
-            result = subprocess.run(
+            placed_wheel = place_wheel(droidrun_wheel, wheels_dir)[0]
+            result = run_monitored(
                 [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), 
-                 "--no-index", str(wheels_dir / droidrun_wheel.name)],
+                 "--no-index", str(placed_wheel)],
                 env=clean_env,
                 check=False
             )
@@ -80,8 +122,8 @@ def main() -> int:
         
         # If no local wheel or local wheel failed, try PyPI
         if not droidrun_wheel or not python_pkg_installed("droidrun", "droidrun"):
-            # Check network connectivity
-            if not check_network_connectivity():
+            # Connectivity is probed once per run by setup_build_environment
+            if not network_available():
                 log_error("Network connectivity unavailable - cannot download droidrun from PyPI")
                 log_error("Please ensure internet connection is available or provide local droidrun wheel")
                 log_error("Expected wheel locations:")
@@ -95,7 +137,7 @@ def main() -> int:
             
             if pandas_installed:
                 log_info("pandas is already installed, using --no-build-isolation to prevent rebuild...")
-                result = subprocess.run(
+                result = run_monitored(
                     [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
                      "--no-build-isolation", "droidrun", "--find-links", str(wheels_dir)],
                     env=clean_env,
@@ -104,7 +146,7 @@ def main() -> int:
                 
                 if result.returncode != 0:
                     log_warning("--no-build-isolation failed, trying normal install...")
-                    result = subprocess.run(
+                    result = run_monitored(
                         [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
                          "--upgrade-strategy", "only-if-needed", "droidrun", "--find-links", str(wheels_dir)],
                         env=clean_env,
@@ -112,7 +154,7 @@ def main() -> int:
                     )
             else:
                 # Normal install if pandas is not installed
-                result = subprocess.run(
+                result = run_monitored(
                     [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
                      "--upgrade-strategy", "only-if-needed", "droidrun", "--find-links", str(wheels_dir)],
                     env=clean_env,
@@ -146,35 +188,20 @@ def main() -> int:
     
     log_info("Installing droidrun providers...")
     
-    for provider in providers:
-        # Skip deepseek if tokenizers is not available
-        if provider == "deepseek" and not tokenizers_available:
-            log_warning(f"Skipping {provider} provider (requires tokenizers)")
-            failed_providers.append(f"{provider} (requires tokenizers)")
-            continue
-        
-        log_info(f"Installing droidrun[{provider}] provider...")
-        
-        # Create clean environment without CC/CXX overrides
-        clean_env = os.environ.copy()
-        clean_env.pop("CC", None)
-        clean_env.pop("CXX", None)
-        
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
-             "--upgrade-strategy", "only-if-needed", "--no-build-isolation",
-             f"droidrun[{provider}]", "--find-links", str(wheels_dir)],
-            env=clean_env,
-            check=False
-        )
-        
-        if result.returncode == 0:
-            log_success(f"droidrun[{provider}] installed successfully")
-            installed_providers.append(provider)
-        else:
-            log_warning(f"droidrun[{provider}] installation failed with exit code {result.returncode}")
-            log_warning("Check the output above for detailed error messages")
-            failed_providers.append(provider)
+    # Skip deepseek if tokenizers is not available
+    if "deepseek" in providers and not tokenizers_available:
+        log_warning("Skipping deepseek provider (requires tokenizers)")
+        failed_providers.append("deepseek (requires tokenizers)")
+    to_install = [p for p in providers if p != "deepseek" or tokenizers_available]
+    
+    # Create clean environment without CC/CXX overrides
+    clean_env = os.environ.copy()
+    clean_env.pop("CC", None)
+    clean_env.pop("CXX", None)
+    
+    installed, failed = install_providers(to_install, wheels_dir, clean_env)
+    installed_providers.extend(installed)
+    failed_providers.extend(failed)
     
     # Summary
     log_info("==========================================")
@@ -205,6 +232,11 @@ def main() -> int:
     
     log_success(f"Phase 7 complete: Installed {len(installed_providers)} out of {len(providers)} providers")
     mark_phase_complete(7)
+    gc_after_install(wheels_dir)
+    prune_after_install()
+    precompile_after_install()
+    bundle_after_install()
+    profile_after_install()
     return 0
 
 
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Precompile site-packages to bytecode in parallel so the first droidrun launch does not have to."""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import py_compile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, log_info, log_success, log_warning
+    from .process_monitor import run_monitored
+    from .snapshots import site_dirs
+except ImportError:
+    from common import record_report, log_info, log_success, log_warning
+    from process_monitor import run_monitored
+    from snapshots import site_dirs
+
+
+# Worker processes (0 means one per CPU)
+PRECOMPILE_JOBS = int(os.environ.get("DROIDRUN_PRECOMPILE_JOBS", "0"))
+
+# Set to 0 to skip precompilation after a successful install
+PRECOMPILE = os.environ.get("DROIDRUN_PRECOMPILE", "1") != "0"
+
+# Module whose first import is timed before and after
+MEASURE_MODULE = os.environ.get("DROIDRUN_PRECOMPILE_MEASURE", "droidrun")
+
+# Source files per worker task
+CHUNK_SIZE = 64
+
+TIMESTAMP = py_compile.PycInvalidationMode.TIMESTAMP
+CHECKED_HASH = py_compile.PycInvalidationMode.CHECKED_HASH
+UNCHECKED_HASH = py_compile.PycInvalidationMode.UNCHECKED_HASH
+
+
+def _is_editable(dist) -> bool:
+    """Editable installs point at a working tree whose sources change under the pyc."""
+    try:
+        info = json.loads(dist.read_text("direct_url.json") or "{}")
+    except ValueError:
+        return False
+    return bool(info.get("dir_info", {}).get("editable"))
+
+
+def collect_sources(sites: Optional[List[Path]] = None) -> Dict[str, Optional[str]]:
+    """
+    Map every .py file under site-packages to its RECORD hash.
+
+    Files owned by an installed (non-editable) distribution get their RECORD
+    sha256, or "" if RECORD lists no hash or pip did not install the
+    distribution (Termux debs put theirs in the same site-packages); files no
+    distribution owns map to None.
+    """
+    from importlib import metadata
+
+    sites = sites if sites is not None else site_dirs()
+    sources: Dict[str, Optional[str]] = {}
+    for site in sites:
+        for root, dirs, files in os.walk(site):
+            dirs[:] = [d for d in dirs if d != "__pycache__"]
+            for name in files:
+                if name.endswith(".py"):
+                    sources[os.path.join(root, name)] = None
+
+    for dist in metadata.distributions(path=[str(site) for site in sites]):
+        if _is_editable(dist):
+            continue
+        by_pip = (dist.read_text("INSTALLER") or "").strip() == "pip"
+        for entry in dist.files or []:
+            if not str(entry).endswith(".py"):
+                continue
+            path = os.path.normpath(str(entry.locate()))
+            if path in sources:
+                hash_ = entry.hash
+                sources[path] = hash_.value if by_pip and hash_ and hash_.mode == "sha256" else ""
+    return sources
+
+
+def _choose_mode(source: bytes, record_hash: Optional[str]) -> py_compile.PycInvalidationMode:
+    """
+    Unchecked hash pycs skip the source stat on every import. They are only safe
+    for files pip owns and will replace (removing the pyc) on upgrade, and that
+    nobody has edited since install. Everything else owned by a distribution
+    gets checked hash pycs: edited files, files with no RECORD hash to compare,
+    and deb files, which `pkg upgrade` replaces without touching __pycache__.
+    """
+    if record_hash is None:
+        return TIMESTAMP
+    if not record_hash:
+        return CHECKED_HASH
+    digest = base64.urlsafe_b64encode(hashlib.sha256(source).digest()).rstrip(b"=").decode()
+    return UNCHECKED_HASH if digest == record_hash else CHECKED_HASH
+
+
+def _pyc_current(path: str, source: bytes, cfile: str, mode: py_compile.PycInvalidationMode) -> bool:
+    """Whether cfile already holds bytecode for this source in this invalidation mode."""
+    try:
+        with open(cfile, 'rb') as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    if len(header) < 16 or header[:4] != importlib.util.MAGIC_NUMBER:
+        return False
+    flags = int.from_bytes(header[4:8], "little")
+    if mode == TIMESTAMP:
+        st = os.stat(path)
+        expected = (int(st.st_mtime) & 0xFFFFFFFF).to_bytes(4, "little") + (st.st_size & 0xFFFFFFFF).to_bytes(4, "little")
+        return flags == 0 and header[8:16] == expected
+    expected_flags = 0b11 if mode == CHECKED_HASH else 0b01
+    return flags == expected_flags and header[8:16] == importlib.util.source_hash(source)
+
+
+def _compile_chunk(chunk: List[Tuple[str, Optional[str]]]) -> Tuple[int, int, int]:
+    """Compile a batch of sources in a worker; returns (compiled, skipped, failed)."""
+    compiled = skipped = failed = 0
+    for path, record_hash in chunk:
+        try:
+            with open(path, 'rb') as f:
+                source = f.read()
+            mode = _choose_mode(source, record_hash)
+            cfile = importlib.util.cache_from_source(path)
+            if _pyc_current(path, source, cfile, mode):
+                skipped += 1
+                continue
+            py_compile.compile(path, cfile=cfile, doraise=True, invalidation_mode=mode)
+            compiled += 1
+        except (py_compile.PyCompileError, OSError, ValueError):
+            # Python 2 leftovers and templates that are not meant to be imported
+            failed += 1
+    return compiled, skipped, failed
+
+
+def compile_sources(sources: Dict[str, Optional[str]], jobs: int = PRECOMPILE_JOBS) -> Tuple[int, int, int]:
+    """Compile sources with a process pool, falling back to this process if pools are unavailable."""
+    items = sorted(sources.items())
+    chunks = [items[i:i + CHUNK_SIZE] for i in range(0, len(items), CHUNK_SIZE)]
+    totals = [0, 0, 0]
+    try:
+        with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+            for future in as_completed([pool.submit(_compile_chunk, chunk) for chunk in chunks]):
+                for i, count in enumerate(future.result()):
+                    totals[i] += count
+    except (ImportError, NotImplementedError, OSError) as e:
+        # Android's libc has no sem_open unless Termux's shim is installed
+        log_warning(f"Process pool unavailable ({e}), compiling in one process")
+        totals = [0, 0, 0]
+        for chunk in chunks:
+            for i, count in enumerate(_compile_chunk(chunk)):
+                totals[i] += count
+    return totals[0], totals[1], totals[2]
+
+
+def measure_import(module: str, write_bytecode: bool = True) -> Optional[float]:
+    """
+    Wall time of importing a module in a fresh interpreter, or None if it fails.
+
+    With write_bytecode=False the import compiles whatever has no pyc yet without
+    saving it, which is what a first launch costs without leaving anything behind.
+    """
+    env = os.environ.copy()
+    if write_bytecode:
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+    else:
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    started = time.monotonic()
+    result = run_monitored([sys.executable, "-c", f"import {module}"], env=env,
+                           capture_output=True, check=False)
+    if result.returncode != 0:
+        return None
+    return time.monotonic() - started
+
+
+def precompile(module: Optional[str] = MEASURE_MODULE, jobs: int = PRECOMPILE_JOBS) -> bool:
+    """
+    Compile site-packages to bytecode and report the time saved on the first
+    import of `module` (skipped when module is None or not importable).
+    """
+    if module and importlib.util.find_spec(module) is None:
+        module = None
+    before = measure_import(module, write_bytecode=False) if module else None
+
+    started = time.monotonic()
+    sources = collect_sources()
+    compiled, skipped, failed = compile_sources(sources, jobs)
+    elapsed = time.monotonic() - started
+    log_success(f"Precompiled {compiled} files in {elapsed:.1f}s "
+                f"({skipped} already compiled, {failed} not compilable)")
+
+    entry = {
+        "files": len(sources),
+        "compiled": compiled,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": round(elapsed, 1),
+    }
+    if before is not None:
+        after = measure_import(module)
+        if after is not None:
+            log_info(f"First 'import {module}': {before:.2f}s before, {after:.2f}s after "
+                     f"({before - after:.2f}s saved)")
+            entry.update(module=module, import_before=round(before, 2), import_after=round(after, 2))
+    record_report("precompile", entry)
+    return True
+
+
+def precompile_after_install() -> None:
+    """Post-install precompilation (skipped when DROIDRUN_PRECOMPILE=0)."""
+    if not PRECOMPILE:
+        return
+    log_info("Precompiling installed packages to bytecode...")
+    try:
+        precompile()
+    except Exception as e:
+        log_warning(f"Precompilation failed: {e}")
+
+
+def main() -> int:
+    """Precompile site-packages."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompile site-packages to bytecode in parallel")
+    parser.add_argument("--jobs", type=int, default=PRECOMPILE_JOBS, help="worker processes (default: one per CPU)")
+    parser.add_argument("--measure", default=MEASURE_MODULE,
+                        help="module whose first import is timed before and after (default: %(default)s)")
+    parser.add_argument("--no-measure", action="store_true", help="skip the import timing")
+    args = parser.parse_args()
+
+    return 0 if precompile(None if args.no_measure else args.measure, args.jobs) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
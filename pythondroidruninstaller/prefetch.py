@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""Background download of the sdists, wheels, debs and crates later phases need, while builds run."""
+
+import os
+import re
+import sys
+import html
+import time
+import shutil
+import hashlib
+import platform
+import threading
+import subprocess
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Iterable
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import (
+        record_report, network_available, pkg_installed, command_exists,
+        IS_TERMUX, HOME, PREFIX, log_info, log_success, log_warning
+    )
+    from .workspace import build_workspace
+except ImportError:
+    from common import (
+        record_report, network_available, pkg_installed, command_exists,
+        IS_TERMUX, HOME, PREFIX, log_info, log_success, log_warning
+    )
+    from workspace import build_workspace
+
+
+# Set to 0 to download everything in the foreground, when each step needs it
+PREFETCH = os.environ.get("DROIDRUN_PREFETCH", "1") != "0"
+
+# Downloaded sdists and wheels; source_selector installs them, and offline pip finds them through PIP_FIND_LINKS
+PREFETCH_DIR = Path(os.environ.get("DROIDRUN_PREFETCH_DIR", str(HOME / ".cache" / "droidrun-prefetch")))
+
+# Downloads running at once
+PREFETCH_JOBS = max(1, int(os.environ.get("DROIDRUN_PREFETCH_JOBS", "2")))
+
+# Bandwidth for all prefetch downloads together in KB/s (0 means no limit); the
+# builds in the foreground still need the index
+PREFETCH_RATE_KB = float(os.environ.get("DROIDRUN_PREFETCH_RATE_KB", "1024"))
+
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+
+# Cargo.lock source of crates.io packages, and where cargo downloads them from
+CRATES_IO_SOURCE = "registry+https://github.com/rust-lang/crates.io-index"
+CRATES_DOWNLOAD_URL = "https://static.crates.io/crates"
+
+# Crates wait here until they are moved into Cargo's download cache
+CRATE_STAGING_DIR = PREFETCH_DIR / "crates"
+
+# Termux packages each phase installs with pkg
+SYSTEM_PACKAGES_BY_PHASE = {
+    1: ["python-pip", "flang", "autoconf", "automake", "libtool", "patchelf",
+        "libarrow-cpp", "libjpeg-turbo", "libpng", "libtiff", "libwebp", "freetype", "abseil-cpp",
+        "python-pillow", "python-scipy", "python-numpy", "python-grpcio", "python-orjson",
+        "python-scikit-learn", "python-cryptography", "rust"],
+    2: ["patchelf"],
+    5: ["python-pillow", "python-grpcio"],
+}
+
+_ANCHOR = re.compile(r'<a\s([^>]*)>([^<]+)</a>', re.IGNORECASE)
+_ATTR = re.compile(r'([\w-]+)="([^"]*)"')
+_LOCK_FIELD = re.compile(r'^(name|version|source|checksum) = "([^"]*)"$')
+
+
+class RateLimiter:
+    """Token bucket shared by the download threads."""
+
+    def __init__(self, rate_kb: float):
+        self.rate = rate_kb * 1024
+        self._lock = threading.Lock()
+        self._allowance = self.rate
+        self._last = time.monotonic()
+
+    def consume(self, size: int) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate)
+            self._last = now
+            self._allowance -= size
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def index_links(pkg_name: str) -> List[Tuple[str, str]]:
+    """(filename, url) of the files the index lists for pkg_name, minus yanked and wrong-Python ones."""
+    from packaging.specifiers import SpecifierSet, InvalidSpecifier
+    from packaging.utils import canonicalize_name
+
+    index_url = os.environ.get("PIP_INDEX_URL") or DEFAULT_INDEX_URL
+    page_url = f"{index_url.rstrip('/')}/{canonicalize_name(pkg_name)}/"
+    with urllib.request.urlopen(page_url, timeout=30) as response:
+        page = response.read().decode("utf-8", errors="replace")
+
+    links = []
+    for attrs, text in _ANCHOR.findall(page):
+        attrs = {k.lower(): html.unescape(v) for k, v in _ATTR.findall(attrs)}
+        if "href" not in attrs or "data-yanked" in attrs:
+            continue
+        requires_python = attrs.get("data-requires-python")
+        if requires_python:
+            try:
+                if not SpecifierSet(requires_python).contains(platform.python_version()):
+                    continue
+            except InvalidSpecifier:
+                pass
+        links.append((text.strip(), urllib.parse.urljoin(page_url, attrs["href"])))
+    return links
+
+
+def download_file(url: str, dest: Path, limiter: Optional[RateLimiter] = None,
+                  stop: Optional[threading.Event] = None) -> bool:
+    """
+    Download url to dest, checking the #sha256= the index gives.
+
+    The file appears under its name only once complete, so a pip reading the
+    same directory never sees half of it. Returns False if stopped.
+    """
+    expected = urllib.parse.urlparse(url).fragment
+    partial = dest.with_name(f".{dest.name}.part")
+    digest = hashlib.sha256()
+    try:
+        with urllib.request.urlopen(url.split("#", 1)[0], timeout=60) as response, open(partial, 'wb') as f:
+            for block in iter(lambda: response.read(1 << 16), b""):
+                if stop is not None and stop.is_set():
+                    return False
+                if limiter is not None:
+                    limiter.consume(len(block))
+                digest.update(block)
+                f.write(block)
+        if expected.startswith("sha256=") and digest.hexdigest() != expected[len("sha256="):]:
+            raise OSError(f"sha256 mismatch for {dest.name}")
+        os.replace(partial, dest)
+        return True
+    finally:
+        if partial.exists():
+            partial.unlink()
+
+
+def choose_file(pkg_name: str, version_spec: str, links: List[Tuple[str, str]]) -> Optional[Tuple[str, str]]:
+    """
+    The (filename, url) pip would download: the newest version satisfying
+    version_spec with a file for this interpreter, its wheel if it has one.
+    """
+    from packaging.requirements import Requirement
+    from packaging.tags import sys_tags
+    from packaging.utils import (
+        canonicalize_name, parse_wheel_filename, parse_sdist_filename,
+        InvalidWheelFilename, InvalidSdistFilename
+    )
+
+    name = canonicalize_name(pkg_name)
+    specifier = Requirement(version_spec).specifier
+    supported = set(sys_tags())
+    candidates = []
+    for filename, url in links:
+        try:
+            if filename.endswith(".whl"):
+                file_name, version, _, tags = parse_wheel_filename(filename)
+                if supported.isdisjoint(tags):
+                    continue
+                is_wheel = True
+            else:
+                file_name, version = parse_sdist_filename(filename)
+                is_wheel = False
+        except (InvalidWheelFilename, InvalidSdistFilename):
+            continue
+        if file_name == name and specifier.contains(version):
+            candidates.append((version, is_wheel, filename, url))
+    if not candidates:
+        return None
+    best = max(candidates, key=lambda c: (c[0], c[1]))
+    return best[2], best[3]
+
+
+def prefetched_sdist(pkg_name: str, version_spec: str) -> Optional[Path]:
+    """The newest prefetched sdist of pkg_name satisfying version_spec."""
+    from packaging.requirements import Requirement
+    from packaging.utils import canonicalize_name, parse_sdist_filename, InvalidSdistFilename
+
+    if not PREFETCH_DIR.is_dir():
+        return None
+    name = canonicalize_name(pkg_name)
+    specifier = Requirement(version_spec).specifier
+    best = None
+    for path in PREFETCH_DIR.iterdir():
+        if not path.name.endswith((".tar.gz", ".zip")):
+            continue
+        try:
+            file_name, version = parse_sdist_filename(path.name)
+        except InvalidSdistFilename:
+            continue
+        if file_name == name and specifier.contains(version) and (best is None or version > best[0]):
+            best = (version, path)
+    return best[1] if best else None
+
+
+def use_prefetched() -> None:
+    """
+    Let pip fall back to prefetched files, appending PREFETCH_DIR to PIP_FIND_LINKS.
+
+    When the index lists the same file pip takes the index's copy, so online
+    installs use prefetched files through source_selector instead.
+    """
+    if not PREFETCH_DIR.is_dir():
+        return
+    links = os.environ.get("PIP_FIND_LINKS", "").split()
+    if str(PREFETCH_DIR) not in links:
+        os.environ["PIP_FIND_LINKS"] = " ".join(links + [str(PREFETCH_DIR)])
+
+
+def locked_crates(lock_file: Path) -> List[Tuple[str, str, str]]:
+    """(name, version, sha256) of every crates.io package a Cargo.lock pins."""
+    crates = []
+    package: Dict[str, str] = {}
+    # The sentinel header ends the last [[package]] table
+    for line in lock_file.read_text().splitlines() + ["[[package]]"]:
+        line = line.strip()
+        if line.startswith("["):
+            if package.get("source") == CRATES_IO_SOURCE and package.get("checksum"):
+                crates.append((package["name"], package["version"], package["checksum"]))
+            package = {}
+            continue
+        match = _LOCK_FIELD.match(line)
+        if match:
+            package[match.group(1)] = match.group(2)
+    return crates
+
+
+def _crate_cache_dirs(cargo_home: Optional[Path] = None) -> List[Path]:
+    """Cargo's download caches for crates.io (one per hashing scheme Cargo versions have used)."""
+    try:
+        from .cargo_cache import CARGO_HOME
+    except ImportError:
+        from cargo_cache import CARGO_HOME
+    return sorted(((cargo_home or CARGO_HOME) / "registry" / "cache").glob("index.crates.io-*"))
+
+
+def merge_crates(cargo_home: Optional[Path] = None) -> int:
+    """
+    Move staged crates into Cargo's crates.io download cache, returning how many were added.
+
+    Cargo skips the download of a crate whose file is already in the cache
+    and checks it against Cargo.lock when it unpacks it. Each file is copied
+    under a temporary name and renamed into place, so a build running at the
+    same time sees it whole or not at all and never waits on Cargo's lock.
+    Crates stay staged until a build has created the cache directory, whose
+    name depends on the Cargo version.
+    """
+    cache_dirs = _crate_cache_dirs(cargo_home)
+    staged = sorted(CRATE_STAGING_DIR.glob("*.crate")) if CRATE_STAGING_DIR.is_dir() else []
+    if not cache_dirs or not staged:
+        return 0
+    added = 0
+    for crate in staged:
+        for cache_dir in cache_dirs:
+            dest = cache_dir / crate.name
+            if dest.exists():
+                continue
+            partial = cache_dir / f".{crate.name}.part"
+            shutil.copyfile(crate, partial)
+            os.replace(partial, dest)
+            added += 1
+        crate.unlink()
+    return added
+
+
+def installed_debs() -> Optional[set]:
+    """Names of the installed debs from one dpkg-query call, or None if it cannot be run."""
+    try:
+        result = subprocess.run(["dpkg-query", "-W", "-f", "${db:Status-Abbrev} ${Package}\\n"],
+                                capture_output=True, text=True, check=False)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    # "ii " is installed; removed packages that left config files behind are "rc "
+    return {line.split()[-1] for line in result.stdout.splitlines() if line.startswith("ii")}
+
+
+def prefetch_plan(phases: Iterable[int]) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    (python requirements, Termux packages) the given phases install, in phase
+    order, leaving out what is installed or in the wheelhouse already.
+    """
+    try:
+        from .check_dependencies import PACKAGES_BY_PHASE, installed_snapshot, evaluate
+    except ImportError:
+        from check_dependencies import PACKAGES_BY_PHASE, installed_snapshot, evaluate
+
+    try:
+        from .source_selector import find_local_wheel
+    except ImportError:
+        from source_selector import find_local_wheel
+
+    phases = list(phases)
+    snapshot = installed_snapshot()
+    requirements = []
+    for group, packages in PACKAGES_BY_PHASE.items():
+        # "Phase 3 - Scientific Stack"
+        if int(group.split()[1]) not in phases:
+            continue
+        for pkg_name, spec in packages:
+            if evaluate(pkg_name, spec, snapshot)["status"] == "ok" or (pkg_name, spec) in requirements:
+                continue
+            # A wheel in the wheelhouse, or prefetched earlier, is installed as is
+            if find_local_wheel(pkg_name, spec) is None:
+                requirements.append((pkg_name, spec))
+
+    system_packages = []
+    if IS_TERMUX and command_exists("apt-get"):
+        installed = installed_debs()
+        for phase in phases:
+            for pkg_name in SYSTEM_PACKAGES_BY_PHASE.get(phase, []):
+                if pkg_name in system_packages:
+                    continue
+                if not (pkg_name in installed if installed is not None else pkg_installed(pkg_name)):
+                    system_packages.append(pkg_name)
+    return requirements, system_packages
+
+
+class Prefetcher(threading.Thread):
+    """Daemon thread that downloads a plan with bounded concurrency and bandwidth."""
+
+    def __init__(self, requirements: List[Tuple[str, str]], system_packages: List[str],
+                 jobs: int = PREFETCH_JOBS, rate_kb: float = PREFETCH_RATE_KB):
+        super().__init__(name="droidrun-prefetch", daemon=True)
+        self.requirements = requirements
+        self.system_packages = system_packages
+        self.jobs = jobs
+        self.rate_kb = rate_kb
+        self.limiter = RateLimiter(rate_kb)
+        self.fetched: Dict[str, int] = {}
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        started = time.monotonic()
+        PREFETCH_DIR.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="droidrun-prefetch") as pool:
+            if self.system_packages:
+                pool.submit(self._guard, "debs", self.fetch_debs)
+            for pkg_name, spec in self.requirements:
+                pool.submit(self._guard, pkg_name, self.fetch_python, pkg_name, spec)
+        # Crates staged before any Rust build had created Cargo's cache
+        self._guard("crates", merge_crates)
+        if self.fetched and not self._stop_event.is_set():
+            total = sum(self.fetched.values())
+            log_info(f"Prefetched {len(self.fetched)} artifacts ({total / 1048576:.1f} MB) "
+                     f"in {time.monotonic() - started:.0f}s")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def _guard(self, what: str, fetch, *args) -> None:
+        if self._stop_event.is_set():
+            return
+        try:
+            fetch(*args)
+        except Exception as e:
+            # A failed prefetch only means the step downloads the file itself
+            log_warning(f"Prefetch of {what} failed: {e}")
+
+    def _record(self, kind: str, name: str, path: Path, started: float) -> None:
+        size = path.stat().st_size if path.is_file() else 0
+        with self._lock:
+            self.fetched[f"{kind}:{name}"] = size
+        record_report("prefetch", {
+            "kind": kind,
+            "name": name,
+            "file": path.name,
+            "mb": round(size / 1048576, 2),
+            "seconds": round(time.monotonic() - started, 1),
+        })
+
+    def _run(self, cmd: List[str], env: Optional[Dict[str, str]] = None) -> int:
+        """Run a helper at low priority, killing it if the prefetcher is stopped."""
+        # nice(1) rather than preexec_fn, which can deadlock the child while other threads run
+        if shutil.which("nice"):
+            cmd = ["nice", "-n", "10"] + cmd
+        process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        while process.poll() is None:
+            if self._stop_event.wait(0.5):
+                process.terminate()
+                process.wait()
+        return process.returncode
+
+    def fetch_python(self, pkg_name: str, spec: str) -> None:
+        started = time.monotonic()
+        chosen = choose_file(pkg_name, spec, index_links(pkg_name))
+        if chosen is None:
+            return
+        filename, url = chosen
+        dest = PREFETCH_DIR / filename
+        if not dest.exists():
+            if not download_file(url, dest, self.limiter, self._stop_event):
+                return
+            self._record("wheel" if filename.endswith(".whl") else "sdist", pkg_name, dest, started)
+        if not filename.endswith(".whl"):
+            self.fetch_crates(pkg_name, dest)
+
+    def fetch_crates(self, pkg_name: str, sdist: Path) -> None:
+        """
+        Download the crates.io crates a Rust sdist locks, under the shared rate limit.
+
+        cargo fetch would ignore the rate limit and hold the package cache
+        lock of the shared CARGO_HOME, stalling the Rust build in the
+        foreground, so the crates are downloaded here into a staging
+        directory and then merged into Cargo's cache. Online builds do not use
+        the crate mirror, and git dependencies are left to cargo.
+        """
+        try:
+            from .crate_mirror import cargo_manifests, _extract
+        except ImportError:
+            from crate_mirror import cargo_manifests, _extract
+
+        started = time.monotonic()
+        with build_workspace(f"{pkg_name}-prefetch") as work_dir:
+            _extract(sdist, work_dir)
+            crates = sorted({crate for manifest in cargo_manifests(work_dir)
+                             for crate in locked_crates(manifest.parent / "Cargo.lock")})
+        if not crates:
+            return
+        CRATE_STAGING_DIR.mkdir(parents=True, exist_ok=True)
+        cache_dirs = _crate_cache_dirs()
+        size = 0
+        for name, version, checksum in crates:
+            dest = CRATE_STAGING_DIR / f"{name}-{version}.crate"
+            if any((cache_dir / dest.name).exists() for cache_dir in cache_dirs):
+                continue
+            if not dest.exists():
+                url = f"{CRATES_DOWNLOAD_URL}/{name}/{name}-{version}.crate#sha256={checksum}"
+                if not download_file(url, dest, self.limiter, self._stop_event):
+                    return
+            size += dest.stat().st_size
+        merged = merge_crates()
+        with self._lock:
+            self.fetched[f"crates:{pkg_name}"] = size
+        record_report("prefetch", {"kind": "crates", "name": pkg_name, "crates": len(crates), "merged": merged,
+                                   "mb": round(size / 1048576, 2),
+                                   "seconds": round(time.monotonic() - started, 1)})
+
+    def fetch_debs(self) -> None:
+        """
+        Download the debs with apt-get --download-only, then move them into apt's archive cache.
+
+        A separate archive directory means no apt lock is shared with the
+        pkg installs running in the foreground; pkg then finds the complete
+        files in its cache and skips the download.
+        """
+        archives = Path(f"{PREFIX}/var/cache/apt/archives")
+        staging = PREFETCH_DIR / "debs"
+        (staging / "partial").mkdir(parents=True, exist_ok=True)
+        limit = [] if self.rate_kb <= 0 else [
+            "-o", f"Acquire::http::Dl-Limit={max(1, int(self.rate_kb / self.jobs))}",
+            "-o", f"Acquire::https::Dl-Limit={max(1, int(self.rate_kb / self.jobs))}",
+        ]
+        # The last packages a phase installs are the furthest from being downloaded in the foreground
+        for pkg_name in reversed(self.system_packages):
+            if self._stop_event.is_set():
+                return
+            started = time.monotonic()
+            before = set(staging.glob("*.deb"))
+            self._run(["apt-get", "install", "--download-only", "-y", "-q",
+                       "-o", f"Dir::Cache::Archives={staging}",
+                       "-o", "Dir::Cache::pkgcache=", "-o", "Dir::Cache::srcpkgcache="] + limit + [pkg_name])
+            for deb in sorted(set(staging.glob("*.deb")) - before):
+                self._record("deb", pkg_name, deb, started)
+                if archives.is_dir():
+                    shutil.move(str(deb), str(archives / deb.name))
+
+
+def start_prefetch(phases: Iterable[int]) -> Optional[Prefetcher]:
+    """Start prefetching for the given phases, if enabled and online."""
+    if not PREFETCH or not network_available():
+        return None
+    try:
+        requirements, system_packages = prefetch_plan(phases)
+    except ImportError:
+        # packaging is only guaranteed once phase 1 has run
+        return None
+    use_prefetched()
+    if not requirements and not system_packages:
+        return None
+    prefetcher = Prefetcher(requirements, system_packages)
+    prefetcher.start()
+    rate = f"{PREFETCH_RATE_KB:g} KB/s" if PREFETCH_RATE_KB > 0 else "no rate limit"
+    log_info(f"Prefetching {len(requirements)} Python packages and {len(system_packages)} "
+             f"Termux packages in the background ({PREFETCH_JOBS} jobs, {rate})")
+    return prefetcher
+
+
+def main() -> int:
+    """Prefetch for a range of phases in the foreground, or clear the prefetch directory."""
+    import argparse
+
+    try:
+        from .cargo_cache import configure_cargo_env
+    except ImportError:
+        from cargo_cache import configure_cargo_env
+
+    parser = argparse.ArgumentParser(description="Download what later phases need ahead of time")
+    subparsers = parser.add_subparsers(dest="command")
+    run_parser = subparsers.add_parser("run", help="prefetch for phases (run it next to a phase script)")
+    run_parser.add_argument("--from-phase", type=int, default=1, help="first phase (default: %(default)s)")
+    run_parser.add_argument("--to-phase", type=int, default=7, help="last phase (default: %(default)s)")
+    run_parser.add_argument("--jobs", type=int, default=PREFETCH_JOBS)
+    run_parser.add_argument("--rate-kb", type=float, default=PREFETCH_RATE_KB, help="KB/s, 0 for no limit")
+    subparsers.add_parser("plan", help="show what would be prefetched")
+    subparsers.add_parser("clear", help="remove prefetched files")
+    args = parser.parse_args()
+
+    if args.command == "clear":
+        shutil.rmtree(PREFETCH_DIR, ignore_errors=True)
+        log_success(f"Removed {PREFETCH_DIR}")
+        return 0
+
+    phases = range(args.from_phase, args.to_phase + 1) if args.command == "run" else range(1, 8)
+    requirements, system_packages = prefetch_plan(phases)
+    if args.command != "run":
+        for pkg_name, spec in requirements:
+            print(f"python  {spec}")
+        for pkg_name in system_packages:
+            print(f"deb     {pkg_name}")
+        return 0
+
+    configure_cargo_env()
+    prefetcher = Prefetcher(requirements, system_packages, max(1, args.jobs), args.rate_kb)
+    prefetcher.start()
+    try:
+        prefetcher.join()
+    except KeyboardInterrupt:
+        prefetcher.stop()
+        prefetcher.join()
+        return 130
+    log_success(f"Prefetched {len(prefetcher.fetched)} artifacts into {PREFETCH_DIR}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
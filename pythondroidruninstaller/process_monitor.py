@@ -0,0 +1,480 @@
+"""Monitored subprocess execution with an inactivity watchdog and resource accounting."""
+
+import os
+import re
+import sys
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+try:
+    from .common import record_report, load_report, read_meminfo, log_info, log_warning
+except ImportError:
+    from common import record_report, load_report, read_meminfo, log_info, log_warning
+
+
+# Seconds a command may go without output, CPU or I/O progress before it is killed (0 disables)
+STALL_TIMEOUT = int(os.environ.get("DROIDRUN_STALL_TIMEOUT", "900"))
+
+# How many times a stalled command is restarted before giving up
+STALL_RETRIES = int(os.environ.get("DROIDRUN_STALL_RETRIES", "1"))
+
+# Seconds between process tree activity samples
+POLL_INTERVAL = float(os.environ.get("DROIDRUN_WATCHDOG_INTERVAL", "5"))
+
+# Seconds between SIGTERM and SIGKILL when killing a stalled command
+KILL_GRACE = 10
+
+# Stalls seen during this run (also written to the run report)
+STALLS: List[dict] = []
+
+# Resource usage of every command run so far (also written to the run report)
+USAGE: List[dict] = []
+
+# Command currently running under the watchdog (read by the resource sampler)
+CURRENT_COMMAND: Dict[str, str] = {}
+
+# Column the usage table is sorted by: wall, cpu, rss or io
+USAGE_SORT = os.environ.get("DROIDRUN_USAGE_SORT", "wall")
+
+USAGE_SORT_KEYS = {
+    "wall": lambda entry: entry.get("wall_seconds", 0),
+    "cpu": lambda entry: entry.get("user_seconds", 0) + entry.get("sys_seconds", 0),
+    "rss": lambda entry: entry.get("max_rss_kb", 0),
+    "io": lambda entry: entry.get("block_in", 0) + entry.get("block_out", 0),
+}
+
+
+class MonitoredProcess(subprocess.CompletedProcess):
+    """CompletedProcess that also records whether the watchdog killed the command."""
+
+    def __init__(self, args, returncode, stdout=None, stderr=None, stalled: bool = False):
+        super().__init__(args, returncode, stdout, stderr)
+        self.stalled = stalled
+
+
+# pip/pkg options whose value is a separate argument
+_OPTIONS_WITH_VALUE = {
+    "--find-links", "-f", "--wheel-dir", "-w", "--dest", "-d", "--upgrade-strategy",
+    "--index-url", "-i", "--extra-index-url", "-c", "--constraint", "-r", "--requirement",
+    "--config-settings", "-C", "--only-binary", "--no-binary", "--target", "-t",
+    "--prefix", "--root", "--platform", "--python-version",
+}
+
+
+def infer_package(cmd: List[str]) -> Optional[str]:
+    """Guess which package a pip or pkg command is working on."""
+    args = [str(arg) for arg in cmd]
+    for verb in ("install", "wheel", "download", "show", "upgrade"):
+        if verb not in args:
+            continue
+        skip_next = False
+        for arg in args[args.index(verb) + 1:]:
+            if skip_next:
+                skip_next = False
+                continue
+            if arg.startswith("-"):
+                skip_next = arg in _OPTIONS_WITH_VALUE
+                continue
+            name = Path(arg).name
+            if name.endswith((".whl", ".tar.gz", ".zip")):
+                match = re.match(r"(.+?)-\d", name)
+                return match.group(1) if match else name
+            return re.split(r"[\[<>=!~;\s]", name)[0] or None
+    return None
+
+
+def _processes() -> Dict[int, Tuple[int, int, int]]:
+    """Map every pid in /proc to (parent pid, session id, CPU ticks of it and its reaped children)."""
+    processes = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return processes
+
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                data = f.read()
+            # Fields after the command name: state ppid pgrp session ... utime stime cutime cstime
+            fields = data[data.rindex(")") + 2:].split()
+            processes[int(entry)] = (int(fields[1]), int(fields[3]), sum(int(value) for value in fields[11:15]))
+        except (OSError, ValueError, IndexError):
+            continue
+    return processes
+
+
+def _tree_activity(root: int) -> Tuple[List[int], int]:
+    """
+    Return the pids in a command's process tree and a counter that grows while it makes progress.
+
+    The tree is the command's session plus everything descended from it, so
+    the children of nested run_monitored scripts, which start sessions of
+    their own, are part of it. A process with such a session-leading child is
+    a nested watchdog: it only polls /proc while it waits, so its own CPU and
+    I/O are left out and the progress of its command counts instead.
+    """
+    processes = _processes()
+    if not processes:
+        return [root], 0
+
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in processes.items():
+        children.setdefault(ppid, []).append(pid)
+    # Session members that lost their parent were reparented away from the tree
+    pending = [root] + [pid for pid, (_, sid, _) in processes.items() if sid == root and pid != root]
+    tree = set()
+    while pending:
+        pid = pending.pop()
+        if pid in tree:
+            continue
+        tree.add(pid)
+        pending.extend(children.get(pid, []))
+
+    activity = 0
+    for pid in tree:
+        if pid not in processes:
+            continue
+        if any(processes[child][1] == child for child in children.get(pid, [])):
+            continue
+        activity += processes[pid][2]
+        # Downloads show up as socket reads rather than CPU time
+        try:
+            with open(f"/proc/{pid}/io", 'r') as f:
+                for line in f:
+                    if line.startswith(("rchar:", "wchar:")):
+                        activity += int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+
+    return sorted(tree), activity
+
+
+def _exit_code(status: int) -> int:
+    """Convert a wait status into a subprocess-style return code."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _reap(proc: subprocess.Popen, timeout: float):
+    """Wait up to timeout seconds for the child and return its rusage (None if still running)."""
+    if not hasattr(os, "wait4"):
+        try:
+            proc.wait(timeout=timeout)
+            return ()
+        except subprocess.TimeoutExpired:
+            return None
+
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            # Already reaped elsewhere; no accounting, and an unknown status counts as a failure
+            proc.returncode = proc.returncode if proc.returncode is not None else -1
+            return ()
+        if pid == proc.pid:
+            proc.returncode = _exit_code(status)
+            return usage
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+
+
+def _kill_tree(proc: subprocess.Popen):
+    """Terminate a command and every process it spawned, returning its rusage."""
+    usage = None
+    # Remembered across signals: descendants of a process killed by SIGTERM are reparented out of the tree
+    pids = {proc.pid}
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        tree, _ = _tree_activity(proc.pid)
+        pids.update(tree)
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        usage = _reap(proc, KILL_GRACE)
+        if usage is not None:
+            break
+    return usage
+
+
+def _pump(stream, sink, chunks: Optional[List[bytes]], last_output: List[float]) -> None:
+    """Copy a child pipe to its destination, noting when output arrives."""
+    fd = stream.fileno()
+    while True:
+        try:
+            data = os.read(fd, 65536)
+        except OSError:
+            break
+        if not data:
+            break
+        last_output[0] = time.monotonic()
+        if chunks is not None:
+            chunks.append(data)
+        if sink is not None:
+            buffer = getattr(sink, "buffer", None)
+            if buffer is not None:
+                buffer.write(data)
+            else:
+                sink.write(data.decode("utf-8", errors="replace"))
+            sink.flush()
+    stream.close()
+
+
+def _run_once(cmd: List[str], env: Optional[Dict[str, str]], cwd, capture_output: bool,
+              stall_timeout: int) -> Tuple[int, bytes, bytes, bool, float, dict]:
+    """Run a command once under the watchdog and account for its resource usage."""
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        cmd,
+        env=env,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+    last_output = [time.monotonic()]
+    out_chunks: Optional[List[bytes]] = [] if capture_output else None
+    err_chunks: Optional[List[bytes]] = [] if capture_output else None
+    pumps = [
+        threading.Thread(target=_pump, args=(proc.stdout, None if capture_output else sys.stdout, out_chunks, last_output), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, None if capture_output else sys.stderr, err_chunks, last_output), daemon=True),
+    ]
+    for pump in pumps:
+        pump.start()
+
+    stalled = False
+    last_progress = time.monotonic()
+    last_activity = None
+    try:
+        while True:
+            usage = _reap(proc, POLL_INTERVAL)
+            if usage is not None:
+                break
+
+            now = time.monotonic()
+            _, activity = _tree_activity(proc.pid)
+            if activity != last_activity:
+                last_activity = activity
+                last_progress = now
+            last_progress = max(last_progress, last_output[0])
+
+            if stall_timeout and now - last_progress > stall_timeout:
+                stalled = True
+                usage = _kill_tree(proc)
+                break
+    except BaseException:
+        # Children live in their own session, so Ctrl-C does not reach them
+        _kill_tree(proc)
+        raise
+    wall = time.monotonic() - started
+
+    for pump in pumps:
+        pump.join(timeout=KILL_GRACE)
+
+    stdout = b"".join(out_chunks) if out_chunks is not None else None
+    stderr = b"".join(err_chunks) if err_chunks is not None else None
+
+    accounting = {"wall_seconds": round(wall, 3)}
+    if usage:
+        accounting.update({
+            "user_seconds": round(usage.ru_utime, 3),
+            "sys_seconds": round(usage.ru_stime, 3),
+            "max_rss_kb": usage.ru_maxrss,
+            "block_in": usage.ru_inblock,
+            "block_out": usage.ru_oublock,
+        })
+    return proc.returncode, stdout, stderr, stalled, time.monotonic() - last_progress, accounting
+
+
+def record_usage(cmd: List[str], package: Optional[str], returncode: int, stalled: bool,
+                 accounting: dict) -> None:
+    """Record the resource usage of one finished command."""
+    entry = {
+        "package": package,
+        "command": " ".join(cmd),
+        "phase": os.environ.get("DROIDRUN_PHASE"),
+        "returncode": returncode,
+        "stalled": stalled,
+        "timestamp": int(time.time()),
+    }
+    entry.update(accounting)
+    USAGE.append(entry)
+    record_report("commands", entry)
+
+
+def classify_usage(entry: dict, mem_total_kb: int = 0) -> str:
+    """Describe what limited a command: cpu, memory, io or waiting (network, locks)."""
+    wall = entry.get("wall_seconds", 0)
+    if "user_seconds" not in entry or wall < 1:
+        return "-"
+    if mem_total_kb and entry["max_rss_kb"] > mem_total_kb // 2:
+        return "memory"
+    if (entry["user_seconds"] + entry["sys_seconds"]) / wall >= 0.7:
+        return "cpu"
+    # Blocks are 512 bytes; more than 1 MB/s of block I/O counts as I/O-bound
+    if (entry["block_in"] + entry["block_out"]) * 512 / wall > 1024 * 1024:
+        return "io"
+    return "waiting"
+
+
+def format_usage_table(entries: List[dict], sort_key: str = USAGE_SORT, limit: int = 20) -> List[str]:
+    """Format command resource usage as table lines, most expensive first."""
+    key = USAGE_SORT_KEYS.get(sort_key, USAGE_SORT_KEYS["wall"])
+    mem_total_kb = read_meminfo().get("MemTotal", 0)
+    rows = sorted(entries, key=key, reverse=True)[:limit] if limit else sorted(entries, key=key, reverse=True)
+
+    lines = [
+        f"{'Package':<22} {'Wall s':>8} {'User s':>8} {'Sys s':>7} {'RSS MB':>7} "
+        f"{'Blk in':>8} {'Blk out':>8} {'Bound':<8} Command"
+    ]
+    for entry in rows:
+        command = entry.get("command", "")
+        lines.append(
+            f"{(entry.get('package') or '-')[:22]:<22} "
+            f"{entry.get('wall_seconds', 0):>8.1f} "
+            f"{entry.get('user_seconds', 0):>8.1f} "
+            f"{entry.get('sys_seconds', 0):>7.1f} "
+            f"{entry.get('max_rss_kb', 0) / 1024:>7.0f} "
+            f"{entry.get('block_in', 0):>8} "
+            f"{entry.get('block_out', 0):>8} "
+            f"{classify_usage(entry, mem_total_kb):<8} "
+            f"{command if len(command) <= 60 else command[:57] + '...'}"
+        )
+    return lines
+
+
+def _postprocess_wheels(cmd: List[str], cwd, started: float) -> None:
+    """Apply wheel rules and check new wheels after `pip wheel` (imported lazily to avoid a cycle)."""
+    try:
+        from .wheel_rules import postprocess_after_pip_wheel
+    except ImportError:
+        from wheel_rules import postprocess_after_pip_wheel
+    postprocess_after_pip_wheel(cmd, str(cwd) if cwd else None, started)
+
+
+def run_monitored(
+    cmd: List[str],
+    package: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    cwd=None,
+    capture_output: bool = False,
+    text: bool = False,
+    check: bool = False,
+    stall_timeout: Optional[int] = None,
+    retries: Optional[int] = None
+) -> MonitoredProcess:
+    """
+    Run a command like subprocess.run, killing it if it stops making progress.
+
+    Progress is any output on stdout/stderr, or any CPU time or I/O done by
+    the command or one of its descendants. A command that makes no progress
+    for stall_timeout seconds is killed, recorded in the run report and
+    restarted up to `retries` times. Every attempt is reaped with os.wait4 and
+    its CPU time, peak RSS, block I/O and wall time are recorded. Wheels from
+    a successful `pip wheel` get their wheel rules applied and are checked for
+    missing libraries before returning.
+
+    Args:
+        cmd: Command to run
+        package: Package the command works on (inferred from pip/pkg commands if None)
+        env: Environment for the command (defaults to the current environment)
+        cwd: Working directory for the command
+        capture_output: Capture stdout/stderr instead of passing them through
+        text: Decode captured output as text
+        check: Raise CalledProcessError on a non-zero exit code
+        stall_timeout: Inactivity window in seconds (defaults to DROIDRUN_STALL_TIMEOUT)
+        retries: Restarts after a stall (defaults to DROIDRUN_STALL_RETRIES)
+
+    Returns:
+        MonitoredProcess with the exit code, captured output and stall flag
+    """
+    cmd = [str(arg) for arg in cmd]
+    package = package or infer_package(cmd)
+    stall_timeout = STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    retries = STALL_RETRIES if retries is None else retries
+    # Wall clock, to compare with the mtimes of files the command writes
+    started = time.time()
+
+    attempt = 0
+    while True:
+        CURRENT_COMMAND.update(package=package or "", command=" ".join(cmd))
+        try:
+            returncode, stdout, stderr, stalled, idle, accounting = _run_once(
+                cmd, env, cwd, capture_output, stall_timeout
+            )
+        finally:
+            CURRENT_COMMAND.clear()
+        record_usage(cmd, package, returncode, stalled, accounting)
+        if not stalled:
+            break
+
+        entry = {
+            "package": package,
+            "command": " ".join(cmd),
+            "idle_seconds": int(idle),
+            "attempt": attempt + 1,
+            "timestamp": int(time.time()),
+        }
+        STALLS.append(entry)
+        record_report("stalls", entry)
+        log_warning(f"No progress from '{' '.join(cmd[:6])}' for {int(idle)}s - killed")
+
+        if attempt >= retries:
+            log_warning(f"Giving up on {package or cmd[0]} after {attempt + 1} stalled attempt(s)")
+            break
+        attempt += 1
+        log_info(f"Retrying {package or cmd[0]} (attempt {attempt + 1} of {retries + 1})...")
+
+    if returncode == 0:
+        _postprocess_wheels(cmd, cwd, started)
+
+    if text:
+        stdout = stdout.decode("utf-8", errors="replace") if stdout is not None else None
+        stderr = stderr.decode("utf-8", errors="replace") if stderr is not None else None
+
+    result = MonitoredProcess(cmd, returncode, stdout, stderr, stalled=stalled)
+    if check and returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return result
+
+
+def main() -> int:
+    """Print the resource usage table of the last run from the run report."""
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Show per-command resource usage of the last install run")
+    parser.add_argument("--sort", choices=sorted(USAGE_SORT_KEYS), default=USAGE_SORT, help="column to sort by")
+    parser.add_argument("--limit", type=int, default=20, help="number of rows to show (0 for all)")
+    parser.add_argument("--json", action="store_true", help="print the raw records as JSON")
+    args = parser.parse_args()
+
+    entries = load_report().get("commands", [])
+    if args.json:
+        key = USAGE_SORT_KEYS[args.sort]
+        print(json.dumps(sorted(entries, key=key, reverse=True), indent=2))
+        return 0
+
+    if not entries:
+        log_warning("No command usage recorded yet")
+        return 1
+    for line in format_usage_table(entries, args.sort, args.limit):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Background sampler that records a system resource timeline during installation."""
+
+import os
+import csv
+import json
+import glob
+import threading
+import time
+from pathlib import Path
+from typing import Optional, List, Dict
+
+try:
+    from .common import read_meminfo, load_report, HOME, log_info, log_warning
+    from . import process_monitor
+except ImportError:
+    from common import read_meminfo, load_report, HOME, log_info, log_warning
+    import process_monitor
+
+
+# Seconds between samples (0 disables the sampler)
+SAMPLE_INTERVAL = float(os.environ.get("DROIDRUN_SAMPLE_INTERVAL", "0"))
+
+TIMELINE_CSV = HOME / ".droidrun_install_timeline.csv"
+TIMELINE_JSON = HOME / ".droidrun_install_timeline.json"
+
+FIELDS = [
+    "timestamp", "elapsed", "phase", "package",
+    "cpu_percent", "iowait_percent", "mem_available_mb", "swap_in_pages", "swap_out_pages",
+    "psi_cpu_some", "psi_memory_some", "psi_memory_full", "psi_io_some",
+    "disk_read_mb_s", "disk_write_mb_s", "cpu_freq_avg_mhz", "cpu_freq_max_mhz", "temp_max_c",
+]
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path, 'r') as f:
+            return f.readline()
+    except OSError:
+        return None
+
+
+def _read_cpu_times() -> Optional[List[int]]:
+    """Aggregate CPU jiffies from /proc/stat (often unreadable for apps on Android 8+)."""
+    line = _read_first_line("/proc/stat")
+    if not line or not line.startswith("cpu "):
+        return None
+    return [int(value) for value in line.split()[1:]]
+
+
+def _read_psi(resource: str) -> Dict[str, float]:
+    """Read avg10 pressure values from /proc/pressure/<resource>."""
+    values = {}
+    try:
+        with open(f"/proc/pressure/{resource}", 'r') as f:
+            for line in f:
+                parts = line.split()
+                for part in parts[1:]:
+                    if part.startswith("avg10="):
+                        values[parts[0]] = float(part[6:])
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def _read_vmstat() -> Dict[str, int]:
+    counters = {}
+    try:
+        with open("/proc/vmstat", 'r') as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if key in ("pswpin", "pswpout"):
+                    counters[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def _read_disk_sectors() -> Optional[List[int]]:
+    """Total sectors read and written by whole disks (partitions excluded)."""
+    disks = set(os.listdir("/sys/block")) if os.path.isdir("/sys/block") else set()
+    read = written = 0
+    try:
+        with open("/proc/diskstats", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 10 or parts[2] not in disks or parts[2].startswith(("loop", "ram", "zram")):
+                    continue
+                read += int(parts[5])
+                written += int(parts[9])
+    except (OSError, ValueError):
+        return None
+    return [read, written]
+
+
+def _read_cpu_freqs() -> List[int]:
+    freqs = []
+    for path in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/cpufreq/scaling_cur_freq"):
+        line = _read_first_line(path)
+        if line and line.strip().isdigit():
+            freqs.append(int(line) // 1000)
+    return freqs
+
+
+def _read_max_temp() -> Optional[float]:
+    temps = []
+    for path in glob.glob("/sys/class/thermal/thermal_zone*/temp"):
+        line = _read_first_line(path)
+        try:
+            value = int(line)
+        except (TypeError, ValueError):
+            continue
+        # Most zones report millidegrees; a few report degrees
+        temps.append(value / 1000 if value > 1000 else float(value))
+    return max(temps) if temps else None
+
+
+class ResourceSampler(threading.Thread):
+    """Daemon thread that samples CPU, memory, pressure, disk and frequency at a fixed interval."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="droidrun-resource-sampler", daemon=True)
+        self.interval = interval
+        self.samples: List[dict] = []
+        self._stop_event = threading.Event()
+        self._started_at = time.time()
+        self._prev_cpu = _read_cpu_times()
+        self._prev_disk = _read_disk_sectors()
+        self._prev_vmstat = _read_vmstat()
+        self._prev_time = time.monotonic()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.samples.append(self.sample())
+            except Exception as e:
+                log_warning(f"Resource sampler stopped: {e}")
+                return
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the thread to finish."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout=self.interval + 1)
+
+    def sample(self) -> dict:
+        """Take one sample, computing rates against the previous one."""
+        now = time.monotonic()
+        elapsed = max(now - self._prev_time, 1e-6)
+        current = process_monitor.CURRENT_COMMAND
+        row = {
+            "timestamp": round(time.time(), 1),
+            "elapsed": round(time.time() - self._started_at, 1),
+            "phase": os.environ.get("DROIDRUN_PHASE", ""),
+            "package": (current.get("package") or current.get("command", "")[:40]) if current else "",
+        }
+
+        cpu = _read_cpu_times()
+        if cpu and self._prev_cpu:
+            deltas = [a - b for a, b in zip(cpu, self._prev_cpu)]
+            total = sum(deltas) or 1
+            # Fields: user nice system idle iowait irq softirq steal ...
+            idle = deltas[3] + (deltas[4] if len(deltas) > 4 else 0)
+            row["cpu_percent"] = round(100.0 * (total - idle) / total, 1)
+            row["iowait_percent"] = round(100.0 * (deltas[4] if len(deltas) > 4 else 0) / total, 1)
+        self._prev_cpu = cpu
+
+        meminfo = read_meminfo()
+        if "MemAvailable" in meminfo:
+            row["mem_available_mb"] = meminfo["MemAvailable"] // 1024
+
+        vmstat = _read_vmstat()
+        if vmstat and self._prev_vmstat:
+            row["swap_in_pages"] = vmstat.get("pswpin", 0) - self._prev_vmstat.get("pswpin", 0)
+            row["swap_out_pages"] = vmstat.get("pswpout", 0) - self._prev_vmstat.get("pswpout", 0)
+        self._prev_vmstat = vmstat
+
+        for resource in ("cpu", "memory", "io"):
+            psi = _read_psi(resource)
+            if "some" in psi:
+                row[f"psi_{resource}_some"] = psi["some"]
+            if resource == "memory" and "full" in psi:
+                row["psi_memory_full"] = psi["full"]
+
+        disk = _read_disk_sectors()
+        if disk and self._prev_disk:
+            # diskstats sectors are always 512 bytes
+            row["disk_read_mb_s"] = round((disk[0] - self._prev_disk[0]) * 512 / elapsed / 1048576, 2)
+            row["disk_write_mb_s"] = round((disk[1] - self._prev_disk[1]) * 512 / elapsed / 1048576, 2)
+        self._prev_disk = disk
+
+        freqs = _read_cpu_freqs()
+        if freqs:
+            row["cpu_freq_avg_mhz"] = sum(freqs) // len(freqs)
+            row["cpu_freq_max_mhz"] = max(freqs)
+
+        temp = _read_max_temp()
+        if temp is not None:
+            row["temp_max_c"] = round(temp, 1)
+
+        self._prev_time = now
+        return row
+
+    def export(self, csv_path: Path = TIMELINE_CSV, json_path: Path = TIMELINE_JSON) -> None:
+        """Write the timeline as CSV, and as JSON together with the phase and command timeline."""
+        try:
+            with open(csv_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                for row in self.samples:
+                    writer.writerow(row)
+            with open(json_path, 'w') as f:
+                report = load_report()
+                json.dump({
+                    "interval": self.interval,
+                    "phases": report.get("phases", []),
+                    "commands": report.get("commands", []),
+                    "samples": self.samples,
+                }, f, indent=2)
+            log_info(f"Resource timeline ({len(self.samples)} samples) written to {csv_path} and {json_path}")
+        except Exception as e:
+            log_warning(f"Failed to write resource timeline: {e}")
+
+
+def start_sampler(interval: float = SAMPLE_INTERVAL) -> Optional[ResourceSampler]:
+    """Start the sampler if an interval is configured."""
+    if interval <= 0:
+        return None
+    sampler = ResourceSampler(interval)
+    sampler.start()
+    log_info(f"Sampling system resources every {interval:g}s")
+    return sampler
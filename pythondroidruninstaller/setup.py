@@ -22,6 +22,22 @@ setup(
     entry_points={
         "console_scripts": [
             "droidrun-phase1=pythondroidruninstaller.phase1_build_tools:main",
+            "droidrun-doctor=pythondroidruninstaller.check_dependencies:main",
+            "droidrun-snapshot=pythondroidruninstaller.snapshots:main",
+            "droidrun-fast-install=pythondroidruninstaller.fast_install:main",
+            "droidrun-wheelhouse=pythondroidruninstaller.wheelhouse:main",
+            "droidrun-workspace=pythondroidruninstaller.workspace:main",
+            "droidrun-precompile=pythondroidruninstaller.precompile:main",
+            "droidrun-zipbundle=pythondroidruninstaller.zipbundle:main",
+            "droidrun-startup-profile=pythondroidruninstaller.startup_profile:main",
+            "droidrun-wheel-rules=pythondroidruninstaller.wheel_rules:main",
+            "droidrun-elfcheck=pythondroidruninstaller.elf_check:main",
+            "droidrun-cargo-cache=pythondroidruninstaller.cargo_cache:main",
+            "droidrun-crate-mirror=pythondroidruninstaller.crate_mirror:main",
+            "droidrun-meson-builds=pythondroidruninstaller.meson_builds:main",
+            "droidrun-prefetch=pythondroidruninstaller.prefetch:main",
+            "droidrun-deb=pythondroidruninstaller.deb_export:main",
+            "droidrun-env-pack=pythondroidruninstaller.env_pack:main",
         ],
     },
 )
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Hardlink snapshots of site-packages, taken before each phase, for fast rollback."""
+
+import os
+import sys
+import json
+import shutil
+import sysconfig
+import time
+from pathlib import Path
+from typing import Optional, List
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import HOME, PROGRESS_FILE, log_info, log_success, log_warning, log_error
+except ImportError:
+    from common import HOME, PROGRESS_FILE, log_info, log_success, log_warning, log_error
+
+
+SNAPSHOT_DIR = HOME / ".droidrun_snapshots"
+
+# Snapshots kept (oldest are pruned); 0 disables snapshots
+SNAPSHOT_KEEP = int(os.environ.get("DROIDRUN_SNAPSHOT_KEEP", "8"))
+
+MANIFEST = "manifest.json"
+
+
+def site_dirs() -> List[Path]:
+    """The site-packages directories pip installs into."""
+    dirs = []
+    paths = sysconfig.get_paths()
+    for key in ("purelib", "platlib"):
+        path = Path(paths[key])
+        if path.is_dir() and path not in dirs:
+            dirs.append(path)
+    return dirs
+
+
+def _link_or_copy(src: str, dest: str) -> bool:
+    """Hardlink src to dest, copying if linking is impossible (e.g. another filesystem)."""
+    try:
+        os.link(src, dest)
+        return True
+    except OSError:
+        shutil.copy2(src, dest)
+        return False
+
+
+def list_snapshots() -> List[dict]:
+    """Manifests of all snapshots, oldest first."""
+    manifests = []
+    if not SNAPSHOT_DIR.is_dir():
+        return manifests
+    for manifest_file in SNAPSHOT_DIR.glob(f"*/{MANIFEST}"):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifests.append(json.load(f))
+        except Exception:
+            continue
+    return sorted(manifests, key=lambda m: m["created"])
+
+
+def delete_snapshot(name: str) -> None:
+    shutil.rmtree(SNAPSHOT_DIR / name, ignore_errors=True)
+
+
+def take_snapshot(name: str, phase: Optional[int] = None) -> Optional[dict]:
+    """
+    Snapshot site-packages by hardlinking every file, so nothing is copied.
+
+    This is safe because pip (and the import system writing .pyc files) never
+    writes into an existing file: it unlinks or atomically replaces it, so the
+    linked copy keeps the old contents.
+
+    Returns:
+        The snapshot manifest, or None if the snapshot failed
+    """
+    started = time.monotonic()
+    snapshot_dir = SNAPSHOT_DIR / name
+    delete_snapshot(name)
+    files, links, dirs = [], [], []
+    copied = 0
+    sites = site_dirs()
+
+    try:
+        for index, site in enumerate(sites):
+            tree = snapshot_dir / "files" / str(index)
+            for root, subdirs, filenames in os.walk(site):
+                rel_root = os.path.relpath(root, site)
+                for entry in list(subdirs):
+                    path = os.path.join(root, entry)
+                    if os.path.islink(path):
+                        links.append([index, os.path.normpath(os.path.join(rel_root, entry)), os.readlink(path)])
+                        subdirs.remove(entry)
+                    else:
+                        dirs.append([index, os.path.normpath(os.path.join(rel_root, entry))])
+                os.makedirs(tree / rel_root, exist_ok=True)
+                for filename in filenames:
+                    path = os.path.join(root, filename)
+                    rel = os.path.normpath(os.path.join(rel_root, filename))
+                    if os.path.islink(path):
+                        links.append([index, rel, os.readlink(path)])
+                        continue
+                    st = os.stat(path)
+                    if not _link_or_copy(path, str(tree / rel)):
+                        copied += 1
+                    files.append([index, rel, st.st_ino, st.st_size, st.st_mtime_ns])
+
+        manifest = {
+            "name": name,
+            "phase": phase,
+            "created": time.time(),
+            "sites": [str(site) for site in sites],
+            "files": files,
+            "links": links,
+            "dirs": dirs,
+        }
+        with open(snapshot_dir / MANIFEST, 'w') as f:
+            json.dump(manifest, f)
+    except Exception as e:
+        log_warning(f"Failed to snapshot site-packages: {e}")
+        delete_snapshot(name)
+        return None
+
+    elapsed = time.monotonic() - started
+    note = f", {copied} copied" if copied else ""
+    log_info(f"Snapshot '{name}': {len(files)} files linked{note} in {elapsed:.1f}s")
+
+    # Keep only the newest snapshots
+    for old in list_snapshots()[:-SNAPSHOT_KEEP]:
+        delete_snapshot(old["name"])
+    return manifest
+
+
+def snapshot_before_phase(phase: int) -> None:
+    """Snapshot site-packages before a phase runs (unless disabled)."""
+    if SNAPSHOT_KEEP > 0:
+        take_snapshot(f"before-phase-{phase}", phase)
+
+
+def _clear_progress_from(phase: int) -> None:
+    """Forget completion of `phase` and later phases, since rollback undid them."""
+    if not PROGRESS_FILE.exists():
+        return
+    kept = []
+    for line in PROGRESS_FILE.read_text().splitlines(keepends=True):
+        marker = line.split("=", 1)[0]
+        if marker.startswith("PHASE_") and marker.endswith("_COMPLETE"):
+            number = marker[len("PHASE_"):-len("_COMPLETE")]
+            if number.isdigit() and int(number) >= phase:
+                continue
+        kept.append(line)
+    PROGRESS_FILE.write_text("".join(kept))
+
+
+def rollback(name: Optional[str] = None) -> bool:
+    """
+    Restore site-packages to a snapshot (the newest one by default).
+
+    Files added since the snapshot are removed, changed or deleted files are
+    relinked from the snapshot, and unchanged files are left alone.
+    """
+    snapshots = list_snapshots()
+    if name:
+        snapshots = [m for m in snapshots if m["name"] == name]
+    if not snapshots:
+        log_error(f"Snapshot not found: {name}" if name else "No snapshots to roll back to")
+        return False
+    manifest = snapshots[-1]
+
+    started = time.monotonic()
+    snapshot_dir = SNAPSHOT_DIR / manifest["name"]
+    sites = [Path(site) for site in manifest["sites"]]
+    expected_files = {(index, rel): meta for index, rel, *meta in manifest["files"]}
+    expected_links = {(index, rel): target for index, rel, target in manifest["links"]}
+    expected_dirs = {(index, rel) for index, rel in manifest["dirs"]}
+    removed = restored = 0
+
+    # Remove everything that appeared after the snapshot
+    for index, site in enumerate(sites):
+        for root, subdirs, filenames in os.walk(site, topdown=False):
+            rel_root = os.path.relpath(root, site)
+            for entry in subdirs + filenames:
+                path = os.path.join(root, entry)
+                key = (index, os.path.normpath(os.path.join(rel_root, entry)))
+                if os.path.islink(path):
+                    if expected_links.get(key) != os.readlink(path):
+                        os.unlink(path)
+                        removed += 1
+                elif os.path.isdir(path):
+                    if key not in expected_dirs:
+                        shutil.rmtree(path, ignore_errors=True)
+                elif key not in expected_files:
+                    os.unlink(path)
+                    removed += 1
+
+    # Relink files that changed or disappeared
+    for (index, rel), (ino, size, mtime_ns) in expected_files.items():
+        live = sites[index] / rel
+        try:
+            st = os.lstat(live)
+            if (st.st_ino, st.st_size, st.st_mtime_ns) == (ino, size, mtime_ns):
+                continue
+        except FileNotFoundError:
+            pass
+        live.parent.mkdir(parents=True, exist_ok=True)
+        temp = live.with_name(f".{live.name}.droidrun-restore")
+        if temp.exists():
+            temp.unlink()
+        _link_or_copy(str(snapshot_dir / "files" / str(index) / rel), str(temp))
+        os.replace(temp, live)
+        restored += 1
+
+    for (index, rel), target in expected_links.items():
+        live = sites[index] / rel
+        if not os.path.islink(live):
+            live.parent.mkdir(parents=True, exist_ok=True)
+            os.symlink(target, live)
+            restored += 1
+
+    if manifest.get("phase") is not None:
+        _clear_progress_from(manifest["phase"])
+
+    log_success(f"Rolled back to '{manifest['name']}': {restored} files restored, "
+                f"{removed} removed in {time.monotonic() - started:.1f}s")
+    return True
+
+
+def main() -> int:
+    """List, take, roll back to or delete site-packages snapshots."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage site-packages snapshots taken before each phase")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("list", help="list snapshots")
+    take_parser = subparsers.add_parser("take", help="take a snapshot now")
+    take_parser.add_argument("name")
+    rollback_parser = subparsers.add_parser("rollback", help="restore a snapshot (default: newest)")
+    rollback_parser.add_argument("name", nargs="?")
+    delete_parser = subparsers.add_parser("delete", help="delete a snapshot")
+    delete_parser.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "take":
+        return 0 if take_snapshot(args.name) else 1
+    if args.command == "rollback":
+        return 0 if rollback(args.name) else 1
+    if args.command == "delete":
+        delete_snapshot(args.name)
+        return 0
+
+    snapshots = list_snapshots()
+    if not snapshots:
+        log_warning("No snapshots taken yet")
+        return 0
+    for manifest in snapshots:
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(manifest["created"]))
+        print(f"{manifest['name']:<24} {created}  {len(manifest['files'])} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""Pick the cheapest compatible source for each package: Termux deb, local wheel, remote wheel or source build."""
+
+import os
+import sys
+import time
+import importlib
+from pathlib import Path
+from typing import Optional, List, Callable, Iterable
+
+from packaging.requirements import Requirement, InvalidRequirement
+from packaging.tags import sys_tags
+from packaging.utils import canonicalize_name, parse_wheel_filename, InvalidWheelFilename
+from packaging.version import Version, InvalidVersion
+
+try:
+    from .common import (
+        python_pkg_installed, pkg_installed, command_exists, record_report, get_clean_env,
+        network_available, BUNDLED_WHEEL_DIRS, LOCAL_INDEX_URL, IS_TERMUX, HOME, log_info, log_success, log_warning
+    )
+    from .process_monitor import run_monitored
+    from .build_history import estimate, format_duration
+    from .wheelhouse import place_wheel
+    from .prefetch import prefetched_sdist, PREFETCH_DIR
+except ImportError:
+    from common import (
+        python_pkg_installed, pkg_installed, command_exists, record_report, get_clean_env,
+        network_available, BUNDLED_WHEEL_DIRS, LOCAL_INDEX_URL, IS_TERMUX, HOME, log_info, log_success, log_warning
+    )
+    from process_monitor import run_monitored
+    from build_history import estimate, format_duration
+    from wheelhouse import place_wheel
+    from prefetch import prefetched_sdist, PREFETCH_DIR
+
+
+# Install sources, and rough costs in seconds for the ones that do not compile
+PKG = "pkg"
+WHEELHOUSE = "wheelhouse"
+REMOTE_WHEEL = "remote-wheel"
+SOURCE = "source"
+SOURCE_COSTS = {
+    WHEELHOUSE: 5,
+    PKG: 45,
+    # Includes resolving against the index, which is wasted when no binary wheel exists
+    REMOTE_WHEEL: 60,
+}
+PREBUILT_SOURCES = (WHEELHOUSE, PKG, REMOTE_WHEEL)
+ALREADY_INSTALLED = "installed"
+
+# Comma-separated sources to never use, e.g. "remote-wheel,pkg"
+DISABLED_SOURCES = {s.strip() for s in os.environ.get("DROIDRUN_DISABLE_SOURCES", "").split(",") if s.strip()}
+
+# Termux packages whose name is not python-<package>
+TERMUX_PKG_NAMES = {
+    "scikit-learn": "python-scikit-learn",
+    "pydantic-core": "python-pydantic-core",
+}
+
+
+class InstallOption:
+    """One way of getting a package installed, with its estimated cost."""
+
+    def __init__(self, source: str, cost: float, available: bool, reason: str,
+                 install: Optional[Callable[[], bool]] = None):
+        self.source = source
+        self.cost = cost
+        self.available = available
+        self.reason = reason
+        self.install = install
+
+
+def get_wheels_dir() -> Path:
+    return Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))
+
+
+def _requirement(package: str, spec: Optional[str]) -> Optional[Requirement]:
+    try:
+        return Requirement(spec or package)
+    except InvalidRequirement:
+        return None
+
+
+def _version_ok(version: str, requirement: Optional[Requirement]) -> bool:
+    if requirement is None or not requirement.specifier:
+        return True
+    try:
+        return requirement.specifier.contains(Version(version), prereleases=True)
+    except InvalidVersion:
+        return False
+
+
+def find_local_wheel(package: str, spec: Optional[str] = None,
+                     dirs: Optional[Iterable[Path]] = None) -> Optional[Path]:
+    """
+    Find the newest wheel for a package that this interpreter can install.
+
+    Searches WHEELS_DIR, the bundled wheel directories and the prefetched
+    downloads, skipping wheels whose tags do not match this platform or whose
+    version does not satisfy `spec`.
+    """
+    name = canonicalize_name(package)
+    requirement = _requirement(package, spec)
+    supported = set(sys_tags())
+    best = None
+    for wheel_dir in dirs if dirs is not None else [get_wheels_dir()] + BUNDLED_WHEEL_DIRS + [PREFETCH_DIR]:
+        if not wheel_dir.is_dir():
+            continue
+        for wheel in wheel_dir.glob("*.whl"):
+            try:
+                wheel_name, version, _, tags = parse_wheel_filename(wheel.name)
+            except InvalidWheelFilename:
+                continue
+            if wheel_name != name or supported.isdisjoint(tags):
+                continue
+            if not _version_ok(str(version), requirement):
+                continue
+            if best is None or version > best[0]:
+                best = (version, wheel)
+    return best[1] if best else None
+
+
+def install_wheel(wheel: Path) -> bool:
+    """Install a wheel, keeping it in WHEELS_DIR (linked, not copied) so later runs find it."""
+    wheels_dir = get_wheels_dir()
+    wheel = place_wheel(wheel, wheels_dir)[0]
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--find-links", str(wheels_dir), str(wheel)],
+        check=False
+    )
+    return result.returncode == 0
+
+
+def termux_pkg_name(package: str) -> str:
+    return TERMUX_PKG_NAMES.get(package, f"python-{canonicalize_name(package)}")
+
+
+def termux_pkg_version(pkg_name: str) -> Optional[str]:
+    """Upstream version of a package in the Termux repositories, or None if it does not exist."""
+    result = run_monitored(["pkg", "show", pkg_name], capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        return None
+    for line in result.stdout.splitlines():
+        if line.startswith("Version:"):
+            version = line.split(":", 1)[1].strip()
+            # Drop the Debian epoch and revision (e.g. 1:1.14.1-2)
+            version = version.split(":", 1)[-1].rsplit("-", 1)[0]
+            return version
+    return None
+
+
+def install_via_pkg(pkg_name: str) -> bool:
+    log_info(f"Installing {pkg_name} via pkg...")
+    result = run_monitored(["pkg", "install", "-y", pkg_name], check=False)
+    return result.returncode == 0
+
+
+def install_remote_wheel(package: str, spec: Optional[str]) -> bool:
+    """Download a binary wheel (never an sdist) from the configured indexes and install it."""
+    wheels_dir = get_wheels_dir()
+    wheels_dir.mkdir(parents=True, exist_ok=True)
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "download", "--only-binary", ":all:", "--no-deps",
+         "--dest", str(wheels_dir), spec or package],
+        capture_output=True,
+        check=False
+    )
+    if result.returncode != 0:
+        return False
+    wheel = find_local_wheel(package, spec, dirs=[wheels_dir])
+    return wheel is not None and install_wheel(wheel)
+
+
+def pip_source_build(package: str, spec: Optional[str]) -> bool:
+    """Default source build: let pip build the sdist in a clean environment."""
+    sdist = prefetched_sdist(package, spec or package)
+    result = run_monitored(
+        [sys.executable, "-m", "pip", "install", "--no-cache-dir", str(sdist) if sdist else spec or package],
+        env=get_clean_env(),
+        check=False
+    )
+    return result.returncode == 0
+
+
+def plan_install(package: str, spec: Optional[str] = None,
+                 build: Optional[Callable[[], bool]] = None,
+                 sources: Iterable[str] = (WHEELHOUSE, PKG, REMOTE_WHEEL, SOURCE)) -> List[InstallOption]:
+    """
+    Work out every way of installing a package, cheapest available first.
+
+    Args:
+        package: Distribution name
+        spec: Requirement the result must satisfy (defaults to any version)
+        build: Package-specific source build; defaults to `pip install <spec>`
+        sources: Sources to consider
+
+    Returns:
+        Options sorted by availability, then estimated cost
+    """
+    options = []
+    requirement = _requirement(package, spec)
+    sources = [s for s in sources if s not in DISABLED_SOURCES]
+
+    if WHEELHOUSE in sources:
+        wheel = find_local_wheel(package, spec)
+        if wheel:
+            options.append(InstallOption(WHEELHOUSE, SOURCE_COSTS[WHEELHOUSE], True, wheel.name,
+                                         lambda: install_wheel(wheel)))
+        else:
+            options.append(InstallOption(WHEELHOUSE, SOURCE_COSTS[WHEELHOUSE], False,
+                                         "no compatible wheel cached"))
+
+    if PKG in sources:
+        pkg_name = termux_pkg_name(package)
+        if not IS_TERMUX or not command_exists("pkg"):
+            options.append(InstallOption(PKG, SOURCE_COSTS[PKG], False, "not running in Termux"))
+        elif not network_available():
+            options.append(InstallOption(PKG, SOURCE_COSTS[PKG], False, "offline"))
+        elif pkg_installed(pkg_name):
+            options.append(InstallOption(PKG, SOURCE_COSTS[PKG], False,
+                                         f"{pkg_name} already installed but does not provide {spec or package}"))
+        else:
+            version = termux_pkg_version(pkg_name)
+            if version is None:
+                options.append(InstallOption(PKG, SOURCE_COSTS[PKG], False, f"no {pkg_name} package"))
+            elif not _version_ok(version, requirement):
+                options.append(InstallOption(PKG, SOURCE_COSTS[PKG], False,
+                                             f"{pkg_name} {version} does not satisfy {spec}"))
+            else:
+                options.append(InstallOption(PKG, SOURCE_COSTS[PKG], True, f"{pkg_name} {version}",
+                                             lambda: install_via_pkg(pkg_name)))
+
+    if REMOTE_WHEEL in sources and not network_available() and not LOCAL_INDEX_URL:
+        options.append(InstallOption(REMOTE_WHEEL, SOURCE_COSTS[REMOTE_WHEEL], False, "offline"))
+    elif REMOTE_WHEEL in sources:
+        # Availability is only known by asking the index, so this is tried rather than probed
+        options.append(InstallOption(REMOTE_WHEEL, SOURCE_COSTS[REMOTE_WHEEL], True,
+                                     "binary wheel from the package index, if one matches",
+                                     lambda: install_remote_wheel(package, spec)))
+
+    if SOURCE in sources:
+        cost = estimate(package)[0]
+        options.append(InstallOption(SOURCE, cost, True, "build from source",
+                                     build or (lambda: pip_source_build(package, spec))))
+
+    options.sort(key=lambda option: (not option.available, option.cost))
+    return options
+
+
+def log_plan(package: str, options: List[InstallOption]) -> None:
+    log_info(f"Install plan for {package}:")
+    rank = 0
+    for option in options:
+        if option.available:
+            rank += 1
+            marker = f"{rank}."
+        else:
+            marker = "-"
+        log_info(f"  {marker:<3} {option.source:<13} ~{format_duration(option.cost):<7} {option.reason}")
+
+
+def _works(package: str, verify: Optional[Callable[[], object]]) -> bool:
+    """Run verify (e.g. an import) against what was just installed; an exception or False means broken."""
+    if verify is None:
+        return True
+    importlib.invalidate_caches()
+    try:
+        return verify() is not False
+    except Exception as e:
+        log_warning(f"{package} is installed but does not work: {e}")
+        return False
+
+
+def _from_deb(package: str) -> bool:
+    """Whether the installed package came from a Termux deb, whose files pip must not remove."""
+    return IS_TERMUX and command_exists("pkg") and pkg_installed(termux_pkg_name(package))
+
+
+def _uninstall(package: str, source: Optional[str] = None) -> None:
+    """Remove a broken install, so the next source's pip does not find the requirement already satisfied."""
+    if source == PKG:
+        # Just installed by pkg, so no other deb depends on it yet; dpkg removes its own files
+        run_monitored(["pkg", "uninstall", "-y", termux_pkg_name(package)], capture_output=True, check=False)
+    else:
+        run_monitored([sys.executable, "-m", "pip", "uninstall", "-y", package], capture_output=True, check=False)
+
+
+def install_from_best_source(package: str, spec: Optional[str] = None,
+                             build: Optional[Callable[[], bool]] = None,
+                             sources: Iterable[str] = (WHEELHOUSE, PKG, REMOTE_WHEEL, SOURCE),
+                             verify: Optional[Callable[[], object]] = None) -> Optional[str]:
+    """
+    Install a package from the cheapest available source, falling back in cost order.
+
+    A source only counts if the installed metadata satisfies spec and, when
+    given, verify (typically importing the package) does not raise or return
+    False. A cached wheel that installs but cannot load its libraries is
+    then uninstalled (with pkg if it came from a deb) and the next source is
+    tried. A broken install that an earlier deb put there is left to pkg.
+
+    Returns:
+        The source that installed it, ALREADY_INSTALLED, or None if every source failed
+    """
+    check_spec = spec or package
+    if python_pkg_installed(package, check_spec):
+        if _works(package, verify):
+            return ALREADY_INSTALLED
+        if _from_deb(package):
+            # pip would delete files dpkg owns, and removing the deb could take its dependents along
+            log_warning(f"{package} comes from {termux_pkg_name(package)}; "
+                        f"repair it with: pkg reinstall {termux_pkg_name(package)}")
+            return None
+        _uninstall(package)
+
+    options = plan_install(package, spec, build, sources)
+    log_plan(package, options)
+    for option in options:
+        if not option.available:
+            continue
+        log_info(f"Installing {package} from {option.source} ({option.reason})...")
+        started = time.monotonic()
+        if option.install() and python_pkg_installed(package, check_spec):
+            if not _works(package, verify):
+                _uninstall(package, option.source)
+                log_warning(f"{package} from {option.source} does not work, trying the next source...")
+                continue
+            record_report("sources", {
+                "package": package,
+                "source": option.source,
+                "estimated_seconds": round(option.cost),
+                "seconds": round(time.monotonic() - started, 1),
+            })
+            log_success(f"{package} installed from {option.source}")
+            return option.source
+        log_warning(f"Installing {package} from {option.source} failed, trying the next source...")
+    return None
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""Profile import time and memory of droidrun and its provider integrations, and compare profiles."""
+
+import os
+import sys
+import json
+import time
+from pathlib import Path
+from typing import Optional, List, Dict
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, HOME, log_info, log_success, log_warning, log_error
+    from .process_monitor import run_monitored
+except ImportError:
+    from common import record_report, HOME, log_info, log_success, log_warning, log_error
+    from process_monitor import run_monitored
+
+
+PROFILE_FILE = HOME / ".droidrun_startup_profile.json"
+
+# Set to 1 to profile startup at the end of a successful install
+STARTUP_PROFILE = os.environ.get("DROIDRUN_STARTUP_PROFILE", "0") == "1"
+
+# Module imported for each target; providers are the phase 7 extras
+TARGETS = {
+    "droidrun": "droidrun",
+    "google": "llama_index.llms.google_genai",
+    "anthropic": "llama_index.llms.anthropic",
+    "openai": "llama_index.llms.openai",
+    "ollama": "llama_index.llms.ollama",
+    "openrouter": "llama_index.llms.openrouter",
+    "deepseek": "llama_index.llms.deepseek",
+}
+
+# A target or module only counts as regressed past both thresholds
+REGRESSION_PCT = float(os.environ.get("DROIDRUN_STARTUP_REGRESSION_PCT", "10"))
+REGRESSION_MS = float(os.environ.get("DROIDRUN_STARTUP_REGRESSION_MS", "20"))
+
+# Runs in the fresh interpreter; prints one JSON line with its measurements
+PROBE = """
+import json, sys, time
+trace = sys.argv[2] == "1"
+if trace:
+    import tracemalloc
+    tracemalloc.start()
+started = time.perf_counter()
+if sys.argv[1]:
+    __import__(sys.argv[1])
+result = {"seconds": time.perf_counter() - started}
+if trace:
+    result["tracemalloc_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("VmHWM:", "VmRSS:")):
+                result[line.split(":")[0].lower() + "_kb"] = int(line.split()[1])
+except OSError:
+    import resource
+    result["vmhwm_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps(result))
+"""
+
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, float]]:
+    """Self and cumulative ms per module from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = {
+            "self_ms": int(fields[0]) / 1000,
+            "cumulative_ms": int(fields[1]) / 1000,
+        }
+    return modules
+
+
+def _probe(module: str, importtime: bool, trace: bool) -> Optional[dict]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", PROBE, module, "1" if trace else "0"]
+    result = run_monitored(cmd, capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        return None
+    try:
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return None
+    if importtime:
+        measured["modules"] = parse_importtime(result.stderr or "")
+    return measured
+
+
+def profile_target(module: str, tracemalloc: bool = True) -> Optional[dict]:
+    """
+    Import a module in fresh interpreters: once under -X importtime for timings
+    and RSS, and once under tracemalloc (which slows imports down) for the
+    Python allocation peak.
+    """
+    timed = _probe(module, importtime=True, trace=False)
+    if timed is None:
+        return None
+    modules = timed.pop("modules")
+    by_package: Dict[str, float] = {}
+    for name, times in modules.items():
+        top = name.split(".")[0]
+        by_package[top] = by_package.get(top, 0) + times["self_ms"]
+    profile = {
+        "module": module,
+        "import_ms": round(timed["seconds"] * 1000, 1),
+        "peak_rss_kb": timed.get("vmhwm_kb", 0),
+        "modules_imported": len(modules),
+        "modules": modules,
+        "packages": {top: round(ms, 1) for top, ms in by_package.items()},
+    }
+    if tracemalloc:
+        traced = _probe(module, importtime=False, trace=True)
+        if traced:
+            profile["tracemalloc_peak_kb"] = traced.get("tracemalloc_peak_kb", 0)
+    return profile
+
+
+def _installed_versions() -> Dict[str, str]:
+    from importlib import metadata
+    versions = {}
+    for dist in metadata.distributions():
+        name = dist.metadata["Name"]
+        if name:
+            versions[name.lower().replace("_", "-")] = dist.version
+    return versions
+
+
+def run_profile(targets: Optional[List[str]] = None, tracemalloc: bool = True) -> dict:
+    """Profile the bare interpreter and each target that is installed."""
+    import importlib.util
+
+    report = {
+        "created": time.time(),
+        "python": sys.version.split()[0],
+        "versions": _installed_versions(),
+        "interpreter": profile_target("", tracemalloc=False),
+        "targets": {},
+    }
+    for target in targets or list(TARGETS):
+        module = TARGETS.get(target, target)
+        try:
+            installed = importlib.util.find_spec(module) is not None
+        except (ImportError, ValueError):
+            installed = False
+        if not installed:
+            log_info(f"Skipping {target}: {module} is not installed")
+            continue
+        log_info(f"Profiling import of {module}...")
+        profile = profile_target(module, tracemalloc)
+        if profile is None:
+            log_warning(f"Importing {module} failed")
+            report["targets"][target] = {"module": module, "failed": True}
+            continue
+        report["targets"][target] = profile
+    return report
+
+
+def print_report(report: dict, top: int = 15) -> None:
+    """Targets with their cost over the bare interpreter, then the most expensive modules and packages."""
+    base = report.get("interpreter") or {}
+    base_rss = base.get("peak_rss_kb", 0)
+    print(f"{'target':<12} {'import':>9} {'modules':>8} {'peak RSS':>10} {'+RSS':>9} {'tracemalloc':>12}")
+    modules: Dict[str, float] = {}
+    packages: Dict[str, float] = {}
+    for target, profile in report["targets"].items():
+        if profile.get("failed"):
+            print(f"{target:<12} {'failed':>9}")
+            continue
+        rss = profile["peak_rss_kb"]
+        traced = profile.get("tracemalloc_peak_kb")
+        print(f"{target:<12} {profile['import_ms']:>7.0f}ms {profile['modules_imported']:>8} "
+              f"{rss / 1024:>8.1f}MB {(rss - base_rss) / 1024:>7.1f}MB "
+              f"{(f'{traced / 1024:.1f}MB' if traced is not None else '-'):>12}")
+        for name, times in profile["modules"].items():
+            modules[name] = max(modules.get(name, 0), times["self_ms"])
+        for name, ms in profile["packages"].items():
+            packages[name] = max(packages.get(name, 0), ms)
+
+    print("\nMost expensive packages (self time, worst target):")
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:>8.1f}ms  {name}")
+    print("\nMost expensive modules (self time, worst target):")
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:>8.1f}ms  {name}")
+
+
+def _regressed(old: float, new: float, threshold_ms: float = REGRESSION_MS) -> bool:
+    return new - old > threshold_ms and new > old * (1 + REGRESSION_PCT / 100)
+
+
+def compare(baseline: dict, current: dict, top: int = 15) -> bool:
+    """
+    Print what changed between two profiles.
+
+    Returns:
+        True if any target or module got slower past both regression thresholds
+    """
+    regressed = False
+    old_versions, new_versions = baseline.get("versions", {}), current.get("versions", {})
+    changed = sorted(name for name in set(old_versions) | set(new_versions)
+                     if old_versions.get(name) != new_versions.get(name))
+    if changed:
+        print("Changed distributions:")
+        for name in changed:
+            print(f"  {name:<36} {old_versions.get(name, '-'):>12} -> {new_versions.get(name, '-')}")
+        print()
+
+    print(f"{'target':<12} {'import ms':>17} {'peak RSS MB':>20}")
+    for target, new in current["targets"].items():
+        old = baseline.get("targets", {}).get(target)
+        if not old or old.get("failed") or new.get("failed"):
+            state = "failed" if new.get("failed") else "new"
+            print(f"{target:<12} {state:>17}")
+            regressed = regressed or bool(new.get("failed"))
+            continue
+        flag = ""
+        if _regressed(old["import_ms"], new["import_ms"]):
+            regressed = True
+            flag = "  REGRESSED"
+        print(f"{target:<12} {old['import_ms']:>7.0f} -> {new['import_ms']:>6.0f} "
+              f"{old['peak_rss_kb'] / 1024:>10.1f} -> {new['peak_rss_kb'] / 1024:>6.1f}{flag}")
+
+    slower = []
+    for target, new in current["targets"].items():
+        old_modules = baseline.get("targets", {}).get(target, {}).get("modules", {})
+        for name, times in new.get("modules", {}).items():
+            old_ms = old_modules.get(name, {}).get("self_ms", 0)
+            if _regressed(old_ms, times["self_ms"], REGRESSION_MS / 4):
+                slower.append((times["self_ms"] - old_ms, name, old_ms, times["self_ms"]))
+    if slower:
+        print("\nModules that got slower (self time):")
+        seen = set()
+        for delta, name, old_ms, new_ms in sorted(slower, reverse=True):
+            if name in seen:
+                continue
+            seen.add(name)
+            print(f"  +{delta:>7.1f}ms  {name} ({old_ms:.1f} -> {new_ms:.1f}ms)")
+            if len(seen) >= top:
+                break
+    return regressed
+
+
+def profile_after_install() -> None:
+    """Post-install startup profile (only when DROIDRUN_STARTUP_PROFILE=1), compared with the previous one."""
+    if not STARTUP_PROFILE:
+        return
+    try:
+        baseline = json.loads(PROFILE_FILE.read_text()) if PROFILE_FILE.exists() else None
+        report = run_profile()
+        PROFILE_FILE.write_text(json.dumps(report, indent=2))
+        print_report(report, top=5)
+        if baseline and compare(baseline, report, top=5):
+            log_warning("Startup got slower than the previous profile")
+        droidrun = report["targets"].get("droidrun", {})
+        record_report("startup_profile", {
+            target: {"import_ms": p.get("import_ms"), "peak_rss_kb": p.get("peak_rss_kb")}
+            for target, p in report["targets"].items()
+        })
+        if droidrun.get("import_ms"):
+            log_info(f"'import droidrun': {droidrun['import_ms']:.0f}ms, "
+                     f"peak RSS {droidrun['peak_rss_kb'] / 1024:.1f}MB (profile: {PROFILE_FILE})")
+    except Exception as e:
+        log_warning(f"Startup profiling failed: {e}")
+
+
+def main() -> int:
+    """Profile startup, optionally comparing against a saved profile."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile import time and memory of droidrun and its providers")
+    parser.add_argument("--target", action="append",
+                        help=f"target to profile (repeatable; default: {', '.join(TARGETS)}; any module name works)")
+    parser.add_argument("--output", type=Path, default=PROFILE_FILE, help="where to save the profile")
+    parser.add_argument("--compare", type=Path, metavar="BASELINE",
+                        help="compare with a saved profile; exits 1 on a regression")
+    parser.add_argument("--against", type=Path, metavar="PROFILE",
+                        help="with --compare, compare two saved profiles instead of profiling now")
+    parser.add_argument("--top", type=int, default=15, help="modules and packages to list")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip the tracemalloc run")
+    args = parser.parse_args()
+
+    if args.against and not args.compare:
+        parser.error("--against needs --compare")
+
+    baseline = None
+    if args.compare:
+        try:
+            baseline = json.loads(args.compare.read_text())
+        except (OSError, ValueError) as e:
+            log_error(f"Cannot read {args.compare}: {e}")
+            return 2
+
+    if args.against:
+        try:
+            report = json.loads(args.against.read_text())
+        except (OSError, ValueError) as e:
+            log_error(f"Cannot read {args.against}: {e}")
+            return 2
+    else:
+        report = run_profile(args.target, tracemalloc=not args.no_tracemalloc)
+        if not report["targets"]:
+            log_error("None of the targets is installed")
+            return 1
+        args.output.write_text(json.dumps(report, indent=2))
+        print_report(report, args.top)
+        log_success(f"Profile saved to {args.output}")
+
+    if baseline is not None:
+        print()
+        if compare(baseline, report, args.top):
+            log_warning("Startup regressed against the baseline")
+            return 1
+        log_success("No startup regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
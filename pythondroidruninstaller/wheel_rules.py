@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""Declarative per-package fixes applied to wheels right after `pip wheel` produces them."""
+
+import os
+import re
+import io
+import sys
+import csv
+import json
+import time
+import base64
+import shutil
+import fnmatch
+import hashlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, List, Dict, Iterable
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, HOME, PREFIX, log_info, log_success, log_warning
+    from .process_monitor import run_monitored
+    from .workspace import build_workspace
+    from .elf_check import check_wheels, ELF_CHECK
+except ImportError:
+    from common import record_report, HOME, PREFIX, log_info, log_success, log_warning
+    from process_monitor import run_monitored
+    from workspace import build_workspace
+    from elf_check import check_wheels, ELF_CHECK
+
+
+# Set to 0 to leave wheels exactly as pip built them
+WHEEL_RULES = os.environ.get("DROIDRUN_WHEEL_RULES", "1") != "0"
+
+# Extra rules (JSON list of rule objects); a rule with a built-in rule's name replaces it
+RULES_FILE = Path(os.environ.get("DROIDRUN_WHEEL_RULES_FILE", str(HOME / ".droidrun_wheel_rules.json")))
+
+# Wheels processed at once (0 means one per CPU)
+WHEEL_RULES_JOBS = int(os.environ.get("DROIDRUN_WHEEL_RULES_JOBS", "0"))
+
+# Set to 1 to also slim the wheels of SLIM_PROJECTS (strip debug info, drop test suites)
+WHEEL_SLIM = os.environ.get("DROIDRUN_WHEEL_SLIM", "0") == "1"
+
+# Projects built on device whose wheels carry unstripped objects and their tests
+SLIM_PROJECTS = ["numpy", "scipy", "pandas", "scikit-learn", "grpcio", "pyarrow"]
+
+# Written into the .dist-info of a processed wheel: rule name -> rule digest
+MARKER_NAME = "DROIDRUN_RULES.json"
+
+
+def canonical_name(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class WheelRule:
+    """
+    Changes to make to every wheel of one project.
+
+    Args:
+        name: Rule name, recorded in the wheels it touched
+        project: Project the rule applies to
+        files: Glob (archive paths) selecting the ELF files to patch
+        add_needed: Libraries to add as DT_NEEDED entries
+        set_rpath: RPATH to set
+        strip: Strip debug info from the matching ELF files
+        drop: Globs (archive paths) of files to remove from the wheel
+    """
+
+    def __init__(self, name: str, project: str, files: str = "*.so", add_needed: Iterable[str] = (),
+                 set_rpath: Optional[str] = None, strip: bool = False, drop: Iterable[str] = ()):
+        self.name = name
+        self.project = canonical_name(project)
+        self.files = files
+        self.add_needed = list(add_needed)
+        self.set_rpath = set_rpath
+        self.strip = strip
+        self.drop = list(drop)
+
+    @property
+    def patches_elf(self) -> bool:
+        return bool(self.add_needed or self.set_rpath or self.strip)
+
+    @property
+    def digest(self) -> str:
+        """Changes when the rule's settings change, so edited rules are applied again."""
+        settings = {"files": self.files, "add_needed": self.add_needed, "set_rpath": self.set_rpath,
+                    "strip": self.strip, "drop": self.drop}
+        # Unset settings are left out, so adding a setting does not change existing digests
+        data = json.dumps({key: value for key, value in settings.items() if value}, sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()[:12]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WheelRule":
+        return cls(data["name"], data["project"], data.get("files", "*.so"), data.get("add_needed", ()),
+                   data.get("set_rpath"), data.get("strip", False), data.get("drop", ()))
+
+
+BUILTIN_RULES = [
+    # Built against the system abseil, cygrpc misses the flags libraries in
+    # DT_NEEDED and cannot find them without an RPATH
+    WheelRule(
+        "grpcio-abseil", "grpcio",
+        files="grpc/_cython/cygrpc*.so",
+        add_needed=["libabsl_flags_internal.so", "libabsl_flags.so",
+                    "libabsl_flags_commandlineflag.so", "libabsl_flags_reflection.so"],
+        set_rpath=f"{PREFIX}/lib",
+    ),
+]
+
+# Opt-in: run after the fixes above, so stripping sees the patched objects
+SLIM_RULES = [
+    WheelRule(f"{project}-slim", project, files="*.so*", strip=True, drop=["*/tests/*"])
+    for project in SLIM_PROJECTS
+]
+
+
+def load_rules(slim: bool = WHEEL_SLIM) -> Dict[str, List[WheelRule]]:
+    """Built-in rules (and slimming rules if slim) plus those in RULES_FILE, by project."""
+    rules = {rule.name: rule for rule in BUILTIN_RULES + (SLIM_RULES if slim else [])}
+    if RULES_FILE.exists():
+        try:
+            with open(RULES_FILE, 'r') as f:
+                for data in json.load(f):
+                    rule = WheelRule.from_dict(data)
+                    rules[rule.name] = rule
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log_warning(f"Ignoring {RULES_FILE}: {e}")
+    by_project: Dict[str, List[WheelRule]] = {}
+    for rule in rules.values():
+        by_project.setdefault(rule.project, []).append(rule)
+    return by_project
+
+
+def _wheel_project(wheel: Path) -> str:
+    return canonical_name(wheel.name.split("-")[0])
+
+
+def _record_hash(data: bytes) -> str:
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b"=")
+    return f"sha256={digest.decode('ascii')}"
+
+
+def _info_dir(names: List[str]) -> Optional[str]:
+    for name in names:
+        parts = name.split("/")
+        if len(parts) == 2 and parts[0].endswith(".dist-info") and parts[1] == "WHEEL":
+            return parts[0]
+    return None
+
+
+def _strip_tool() -> Optional[str]:
+    return os.environ.get("STRIP") or shutil.which("strip") or shutil.which("llvm-strip")
+
+
+def _elf_commands(rule: WheelRule) -> List[List[str]]:
+    """Commands (without the file argument) that apply a rule's ELF changes."""
+    commands = []
+    if rule.add_needed or rule.set_rpath:
+        cmd = ["patchelf"]
+        for lib in rule.add_needed:
+            cmd += ["--add-needed", lib]
+        if rule.set_rpath:
+            cmd += ["--set-rpath", rule.set_rpath]
+        commands.append(cmd)
+    if rule.strip:
+        commands.append([_strip_tool() or "strip", "--strip-debug"])
+    return commands
+
+
+def _missing_tool(rule: WheelRule) -> Optional[str]:
+    if (rule.add_needed or rule.set_rpath) and not shutil.which("patchelf"):
+        return "patchelf"
+    if rule.strip and not _strip_tool():
+        return "strip"
+    return None
+
+
+def _patch_elf(rule: WheelRule, path: Path) -> bool:
+    for cmd in _elf_commands(rule):
+        result = run_monitored(cmd + [str(path)], capture_output=True, text=True, check=False)
+        if result.returncode != 0:
+            log_warning(f"{Path(cmd[0]).name} failed on {path.name}: {(result.stderr or '').strip()}")
+            return False
+    return True
+
+
+def process_wheel(wheel: Path, rules: List[WheelRule]) -> Optional[dict]:
+    """
+    Apply the rules this wheel has not had yet, rewriting it in place.
+
+    The wheel is read once: files to patch are extracted to a workspace,
+    everything else is copied straight into the new archive, and RECORD is
+    rewritten to match. Returns what changed, or None if nothing did.
+    """
+    started = time.monotonic()
+    with zipfile.ZipFile(wheel) as zin:
+        infos = zin.infolist()
+        names = [info.filename for info in infos]
+        info_dir = _info_dir(names)
+        if info_dir is None:
+            log_warning(f"{wheel.name} has no .dist-info/WHEEL, leaving it alone")
+            return None
+        marker = f"{info_dir}/{MARKER_NAME}"
+        applied = json.loads(zin.read(marker)) if marker in names else {}
+
+        pending = [rule for rule in rules if applied.get(rule.name) != rule.digest]
+        if not pending:
+            return None
+
+        touched: Dict[str, List[str]] = {}
+        dropped = set()
+        patch = {}
+        for rule in pending:
+            drop = [n for n in names if any(fnmatch.fnmatch(n, pattern) for pattern in rule.drop)]
+            targets = [n for n in names if fnmatch.fnmatch(n, rule.files)] if rule.patches_elf else []
+            # Slimming a pure-Python wheel only drops files; a fix with nothing to fix is a mistake
+            if rule.patches_elf and not targets and not rule.strip:
+                log_warning(f"Rule {rule.name}: no file in {wheel.name} matches {rule.files}")
+                continue
+            tool = _missing_tool(rule) if targets else None
+            if tool:
+                log_warning(f"Rule {rule.name} needs {tool}, which is not installed")
+                continue
+            dropped.update(drop)
+            for name in targets:
+                patch.setdefault(name, []).append(rule)
+            touched[rule.name] = sorted(set(drop) | set(targets))
+        if not touched:
+            return None
+
+        tmp = wheel.with_name(f".{wheel.name}.droidrun-rules")
+        size_hint_mb = sum(zin.getinfo(n).file_size for n in patch) / 1048576
+        with build_workspace(f"wheel-rules-{_wheel_project(wheel)}", size_hint_mb) as work_dir:
+            patched: Dict[str, bytes] = {}
+            for name, name_rules in patch.items():
+                path = Path(zin.extract(name, work_dir))
+                # A failed patch leaves the wheel as pip built it
+                if not all(_patch_elf(rule, path) for rule in name_rules):
+                    return None
+                patched[name] = path.read_bytes()
+
+            record = f"{info_dir}/RECORD"
+            rows = list(csv.reader(io.StringIO(zin.read(record).decode("utf-8")))) if record in names else []
+            with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as zout:
+                for info in infos:
+                    if info.filename in (record, marker) or info.filename in dropped:
+                        continue
+                    data = patched[info.filename] if info.filename in patched else zin.read(info)
+                    zout.writestr(info, data)
+
+                applied.update((rule.name, rule.digest) for rule in pending if rule.name in touched)
+                marker_data = json.dumps(applied, indent=2, sort_keys=True).encode()
+                zout.writestr(marker, marker_data)
+
+                out = io.StringIO()
+                writer = csv.writer(out)
+                for row in rows:
+                    if not row or row[0] in (record, marker) or row[0] in dropped:
+                        continue
+                    if row[0] in patched:
+                        row = [row[0], _record_hash(patched[row[0]]), str(len(patched[row[0]]))]
+                    writer.writerow(row)
+                writer.writerow([marker, _record_hash(marker_data), str(len(marker_data))])
+                writer.writerow([record, "", ""])
+                zout.writestr(record, out.getvalue())
+    saved = wheel.stat().st_size - tmp.stat().st_size
+    # A new inode: hardlinked copies of the original wheel elsewhere are unaffected
+    os.replace(tmp, wheel)
+
+    entry = {
+        "wheel": wheel.name,
+        "rules": sorted(touched),
+        "patched": sorted(patched),
+        "dropped": len(dropped),
+        "saved_bytes": saved,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+    record_report("wheel_rules", entry)
+    return entry
+
+
+def postprocess_wheels(wheels: Iterable[Path], jobs: int = WHEEL_RULES_JOBS,
+                       slim: bool = WHEEL_SLIM) -> List[dict]:
+    """Apply the matching rules to each wheel, several wheels at a time."""
+    rules = load_rules(slim)
+    work = [(wheel, rules[_wheel_project(wheel)]) for wheel in wheels
+            if wheel.name.endswith(".whl") and _wheel_project(wheel) in rules]
+    if not work:
+        return []
+
+    def run(item) -> Optional[dict]:
+        wheel, wheel_rules = item
+        try:
+            return process_wheel(wheel, wheel_rules)
+        except (OSError, zipfile.BadZipFile, ValueError, KeyError) as e:
+            log_warning(f"Could not post-process {wheel.name}: {e}")
+            return None
+
+    # patchelf and zlib do their work outside the GIL
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        results = [entry for entry in pool.map(run, work) if entry]
+    for entry in results:
+        saved = f" ({entry['saved_bytes'] / 1048576:.1f} MB smaller)" if entry["saved_bytes"] > 0 else ""
+        log_success(f"Applied {', '.join(entry['rules'])} to {entry['wheel']}{saved}")
+    return results
+
+
+def _pip_wheel_dir(cmd: List[str], cwd: Optional[str]) -> Optional[Path]:
+    """The directory a `pip wheel` command writes to, or None for any other command."""
+    args = [str(arg) for arg in cmd]
+    for i, arg in enumerate(args[:-1]):
+        if Path(arg).name in ("pip", "pip3") and args[i + 1] == "wheel":
+            break
+    else:
+        return None
+    wheel_args = args[i + 2:]
+    for j, arg in enumerate(wheel_args):
+        if arg in ("-w", "--wheel-dir") and j + 1 < len(wheel_args):
+            wheel_dir = wheel_args[j + 1]
+            break
+        if arg.startswith("--wheel-dir="):
+            wheel_dir = arg.split("=", 1)[1]
+            break
+    else:
+        wheel_dir = "."
+    return Path(cwd or os.getcwd()) / wheel_dir
+
+
+def postprocess_after_pip_wheel(cmd: List[str], cwd: Optional[str] = None, since: float = 0) -> None:
+    """
+    Called by run_monitored after every successful command; only acts on `pip wheel`.
+
+    Pending rules are applied to every wheel in the wheel directory, then the
+    wheels written since `since` are checked for libraries that cannot be found.
+    """
+    wheel_dir = _pip_wheel_dir(cmd, cwd)
+    if wheel_dir is None or not wheel_dir.is_dir():
+        return
+    wheels = sorted(wheel_dir.glob("*.whl"))
+    if WHEEL_RULES:
+        postprocess_wheels(wheels)
+    if ELF_CHECK:
+        check_wheels([wheel for wheel in wheels if wheel.stat().st_mtime >= since])
+
+
+def main() -> int:
+    """Apply or list wheel post-processing rules."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Apply per-package fixes to built wheels")
+    subparsers = parser.add_subparsers(dest="command")
+    apply_parser = subparsers.add_parser("apply", help="apply pending rules to wheels")
+    apply_parser.add_argument("paths", nargs="*", type=Path,
+                              help="wheels or wheel directories (default: WHEELS_DIR)")
+    apply_parser.add_argument("--jobs", type=int, default=WHEEL_RULES_JOBS,
+                              help="wheels processed at once (default: one per CPU)")
+    apply_parser.add_argument("--slim", action="store_true", default=WHEEL_SLIM,
+                              help="also strip debug info and drop test suites")
+    rules_parser = subparsers.add_parser("rules", help="show the rules in effect")
+    rules_parser.add_argument("--slim", action="store_true", default=WHEEL_SLIM,
+                              help="include the slimming rules")
+    args = parser.parse_args()
+
+    if args.command == "apply":
+        paths = args.paths or [Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels")))]
+        wheels = []
+        for path in paths:
+            wheels.extend(sorted(path.glob("*.whl")) if path.is_dir() else [path])
+        results = postprocess_wheels(wheels, args.jobs, args.slim)
+        if not results:
+            log_info("No wheel needed changes")
+        else:
+            saved = sum(entry["saved_bytes"] for entry in results)
+            log_info(f"{len(results)} wheels changed, {saved / 1048576:.1f} MB saved")
+        return 0
+
+    for project, rules in sorted(load_rules(getattr(args, "slim", WHEEL_SLIM)).items()):
+        for rule in rules:
+            changes = []
+            if rule.add_needed:
+                changes.append(f"add NEEDED {', '.join(rule.add_needed)}")
+            if rule.set_rpath:
+                changes.append(f"set RPATH {rule.set_rpath}")
+            if rule.strip:
+                changes.append("strip debug info")
+            if rule.drop:
+                changes.append(f"drop {', '.join(rule.drop)}")
+            target = f" on {rule.files}" if rule.patches_elf else ""
+            print(f"{rule.name} ({project}){target}: {'; '.join(changes)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""Wheel directory maintenance: placement by hardlink or reflink, deduplication and garbage collection."""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Iterable
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import BUNDLED_WHEEL_DIRS, HOME, log_info, log_success, log_warning
+except ImportError:
+    from common import BUNDLED_WHEEL_DIRS, HOME, log_info, log_success, log_warning
+
+
+# Placement methods, cheapest first
+EXISTING = "existing"
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+COPY = "copy"
+
+# ioctl request for FICLONE (_IOW(0x94, 9, int)); btrfs, xfs, bcachefs and f2fs support it
+FICLONE = 0x40049409
+
+USAGE_FILE = HOME / ".droidrun_wheelhouse_usage.json"
+
+# Size limit for WHEELS_DIR in MB after garbage collection (0 means no limit)
+WHEELHOUSE_BUDGET_MB = float(os.environ.get("DROIDRUN_WHEELHOUSE_BUDGET_MB", "0"))
+
+# Set to 0 to skip the garbage collection run after a successful install
+WHEELHOUSE_GC = os.environ.get("DROIDRUN_WHEELHOUSE_GC", "1") != "0"
+
+SDIST_SUFFIXES = (".tar.gz", ".zip")
+
+# sha256 of files already hashed, keyed by (device, inode, size, mtime_ns)
+_hash_cache: Dict[Tuple[int, int, int, int], str] = {}
+
+
+def file_hash(path: Path) -> str:
+    """sha256 of a file, cached for as long as the file is unchanged."""
+    st = os.stat(path)
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    if key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+
+def same_content(a: Path, b: Path) -> bool:
+    try:
+        if os.path.samefile(a, b):
+            return True
+        return os.path.getsize(a) == os.path.getsize(b) and file_hash(a) == file_hash(b)
+    except OSError:
+        return False
+
+
+def _reflink(src: Path, dest: Path) -> bool:
+    """Clone src into dest sharing its extents, if the filesystem supports it."""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, 'rb') as source, open(dest, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        if dest.exists():
+            dest.unlink()
+        return False
+    shutil.copystat(src, dest)
+    return True
+
+
+def _link_clone_or_copy(src: Path, dest: Path) -> str:
+    """Create dest from src by the cheapest method available; dest must not exist."""
+    try:
+        os.link(src, dest)
+        return HARDLINK
+    except OSError:
+        pass
+    if _reflink(src, dest):
+        return REFLINK
+    shutil.copy2(src, dest)
+    return COPY
+
+
+def load_usage() -> Dict[str, float]:
+    """Last time each wheel (by absolute path) was placed or installed."""
+    if not USAGE_FILE.exists():
+        return {}
+    try:
+        with open(USAGE_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_usage(usage: Dict[str, float]) -> None:
+    try:
+        with open(USAGE_FILE, 'w') as f:
+            json.dump(usage, f, indent=2, sort_keys=True)
+    except Exception as e:
+        log_warning(f"Failed to update wheel usage: {e}")
+
+
+def mark_used(wheels: Iterable[Path]) -> None:
+    """Record that wheels were just used, for least-recently-used eviction."""
+    usage = load_usage()
+    now = time.time()
+    for wheel in wheels:
+        usage[str(Path(wheel).absolute())] = now
+    _save_usage(usage)
+
+
+def place_wheel(wheel: Path, dest_dir: Path, name: Optional[str] = None) -> Tuple[Path, str]:
+    """
+    Put a wheel into dest_dir without copying it when possible.
+
+    Hardlinks on the same filesystem, reflinks where the filesystem supports it,
+    and copies only otherwise. If dest_dir already holds an identical wheel it
+    is kept, relinked to share storage with `wheel` when it is a separate copy.
+
+    Returns:
+        (path of the wheel in dest_dir, placement method)
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / (name or wheel.name)
+    if dest.exists():
+        if os.path.samefile(wheel, dest):
+            return dest, EXISTING
+        if not same_content(wheel, dest):
+            log_info(f"Replacing {dest.name} in {dest_dir} with a different build")
+        elif os.stat(wheel).st_dev != os.stat(dest).st_dev:
+            return dest, EXISTING
+
+    # Build under a temporary name and swap it in, so readers never see a partial wheel
+    temp = dest.with_name(f".{dest.name}.droidrun-place")
+    if temp.exists():
+        temp.unlink()
+    method = _link_clone_or_copy(wheel, temp)
+    os.replace(temp, dest)
+    mark_used([dest])
+    return dest, method
+
+
+def place_wheels(wheels: Iterable[Path], dest_dir: Path) -> Dict[str, int]:
+    """Place several wheels into dest_dir, logging how each was placed."""
+    counts: Dict[str, int] = {}
+    for wheel in wheels:
+        try:
+            _, method = place_wheel(wheel, dest_dir)
+        except OSError as e:
+            log_warning(f"Failed to place wheel {wheel.name}: {e}")
+            continue
+        counts[method] = counts.get(method, 0) + 1
+    if counts:
+        summary = ", ".join(f"{count} {method}" for method, count in sorted(counts.items()))
+        log_info(f"Placed wheels in {dest_dir}: {summary}")
+    return counts
+
+
+def default_wheel_dirs() -> List[Path]:
+    """WHEELS_DIR, ~/wheels and the bundled wheel directories that exist."""
+    dirs = []
+    for wheel_dir in [Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels"))), HOME / "wheels"] + BUNDLED_WHEEL_DIRS:
+        if wheel_dir.is_dir() and wheel_dir not in dirs:
+            dirs.append(wheel_dir)
+    return dirs
+
+
+def dedupe(dirs: Optional[List[Path]] = None) -> Tuple[int, int]:
+    """
+    Hardlink identical wheels across wheel directories so each is stored once.
+
+    Only duplicates on the same filesystem can share storage; others are left alone.
+
+    Returns:
+        (files relinked, bytes freed)
+    """
+    groups: Dict[Tuple[int, int], List[Path]] = {}
+    for wheel_dir in dirs if dirs is not None else default_wheel_dirs():
+        for wheel in wheel_dir.glob("*.whl"):
+            if wheel.is_symlink() or not wheel.is_file():
+                continue
+            st = wheel.stat()
+            groups.setdefault((st.st_dev, st.st_size), []).append(wheel)
+
+    relinked = freed = 0
+    for (_, size), wheels in groups.items():
+        if len(wheels) < 2:
+            continue
+        by_hash: Dict[str, List[Path]] = {}
+        for wheel in wheels:
+            by_hash.setdefault(file_hash(wheel), []).append(wheel)
+        for same in by_hash.values():
+            keep = same[0]
+            for duplicate in same[1:]:
+                if os.path.samefile(keep, duplicate):
+                    continue
+                try:
+                    temp = duplicate.with_name(f".{duplicate.name}.droidrun-place")
+                    if temp.exists():
+                        temp.unlink()
+                    os.link(keep, temp)
+                    os.replace(temp, duplicate)
+                except OSError as e:
+                    log_warning(f"Failed to relink {duplicate}: {e}")
+                    continue
+                # Space is only freed once no other link (e.g. a snapshot) holds the old copy
+                relinked += 1
+                freed += size
+    return relinked, freed
+
+
+def _last_used(path: Path, usage: Dict[str, float]) -> float:
+    """Recorded use, else access or modification time (atime is often frozen by noatime)."""
+    st = path.stat()
+    return max(usage.get(str(path.absolute()), 0), st.st_atime, st.st_mtime)
+
+
+def _sdist_name_version(filename: str) -> Optional[Tuple[str, str, bool]]:
+    """(name, version, is a locally repackaged "-fixed" sdist) from an sdist filename."""
+    for suffix in SDIST_SUFFIXES:
+        if filename.endswith(suffix):
+            stem = filename[:-len(suffix)]
+            fixed = stem.endswith("-fixed")
+            if fixed:
+                stem = stem[:-len("-fixed")]
+            name, _, version = stem.rpartition("-")
+            if name and version:
+                return name, version, fixed
+    return None
+
+
+def _installed_versions() -> set:
+    """(canonical name, Version) of every installed distribution."""
+    from importlib import metadata
+    from packaging.utils import canonicalize_name
+    from packaging.version import Version, InvalidVersion
+
+    installed = set()
+    for dist in metadata.distributions():
+        try:
+            installed.add((canonicalize_name(dist.metadata["Name"]), Version(dist.version)))
+        except (InvalidVersion, TypeError):
+            continue
+    return installed
+
+
+def find_garbage(wheels_dir: Path) -> List[Tuple[Path, str]]:
+    """
+    Find artifacts in a wheel directory that are no longer needed.
+
+    These are leftovers of interrupted placement or repair (temporary files,
+    "grpcio-fixed.whl"), wheels that are not valid zip archives (failed partial
+    builds), wheels superseded by a newer compatible version of the same project,
+    and sdists or repackaged "-fixed" sdists that a wheel of the same or a newer
+    version has replaced. Wheels matching an installed distribution are never
+    considered superseded.
+
+    Returns:
+        (path, reason) for each removable file
+    """
+    from packaging.tags import sys_tags
+    from packaging.utils import canonicalize_name, parse_wheel_filename, InvalidWheelFilename
+    from packaging.version import Version, InvalidVersion
+
+    installed = _installed_versions()
+    supported = set(sys_tags())
+    garbage = []
+    wheels = []
+    sdists = []
+    for path in sorted(wheels_dir.iterdir()):
+        if not path.is_file() or path.is_symlink():
+            continue
+        if path.name.endswith(".droidrun-place"):
+            garbage.append((path, "interrupted placement"))
+        elif path.name.endswith(".droidrun-rules"):
+            garbage.append((path, "interrupted wheel post-processing"))
+        elif path.name.endswith(".whl"):
+            try:
+                name, version, _, tags = parse_wheel_filename(path.name)
+            except InvalidWheelFilename:
+                garbage.append((path, "not a valid wheel name (leftover from a wheel repair)"))
+                continue
+            if not zipfile.is_zipfile(path):
+                garbage.append((path, "truncated or corrupt wheel"))
+                continue
+            wheels.append((path, name, version, not supported.isdisjoint(tags)))
+        else:
+            parsed = _sdist_name_version(path.name)
+            if parsed:
+                sdists.append((path, *parsed))
+
+    newest: Dict[str, Version] = {}
+    for _, name, version, compatible in wheels:
+        if compatible and (name not in newest or version > newest[name]):
+            newest[name] = version
+
+    for path, name, version, _ in wheels:
+        if name in newest and version < newest[name] and (name, version) not in installed:
+            garbage.append((path, f"superseded by {name} {newest[name]}"))
+
+    for path, name, version, fixed in sdists:
+        name = canonicalize_name(name)
+        try:
+            replaced = name in newest and newest[name] >= Version(version)
+        except InvalidVersion:
+            replaced = False
+        if replaced:
+            garbage.append((path, f"sdist already built into a {name} {newest[name]} wheel"))
+        elif fixed:
+            garbage.append((path, "intermediate repackaged sdist"))
+    return garbage
+
+
+def collect_garbage(wheels_dir: Path, budget_mb: float = WHEELHOUSE_BUDGET_MB,
+                    dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Remove unneeded artifacts from a wheel directory, then evict least recently
+    used files until it fits within `budget_mb` (0 means no limit).
+
+    Wheels of installed distributions are evicted only after everything else.
+
+    Returns:
+        (files removed, bytes removed)
+    """
+    if not wheels_dir.is_dir():
+        return 0, 0
+    removable = find_garbage(wheels_dir)
+
+    if budget_mb > 0:
+        from packaging.utils import parse_wheel_filename, InvalidWheelFilename
+
+        installed = _installed_versions()
+        usage = load_usage()
+        doomed = {path for path, _ in removable}
+        remaining = [p for p in wheels_dir.iterdir() if p.is_file() and not p.is_symlink() and p not in doomed]
+        total = sum(p.stat().st_size for p in remaining)
+
+        def in_use(path: Path) -> bool:
+            try:
+                name, version, _, _ = parse_wheel_filename(path.name)
+            except InvalidWheelFilename:
+                return False
+            return (name, version) in installed
+
+        for path in sorted(remaining, key=lambda p: (in_use(p), _last_used(p, usage))):
+            if total <= budget_mb * 1048576:
+                break
+            total -= path.stat().st_size
+            removable.append((path, f"least recently used (budget {budget_mb:g} MB)"))
+
+    removed = freed = 0
+    for path, reason in removable:
+        size = path.stat().st_size
+        if dry_run:
+            log_info(f"Would remove {path.name} ({size / 1048576:.1f} MB): {reason}")
+        else:
+            try:
+                path.unlink()
+            except OSError as e:
+                log_warning(f"Failed to remove {path.name}: {e}")
+                continue
+            log_info(f"Removed {path.name} ({size / 1048576:.1f} MB): {reason}")
+        removed += 1
+        freed += size
+
+    if not dry_run and removed:
+        usage = load_usage()
+        _save_usage({path: used for path, used in usage.items() if os.path.exists(path)})
+    return removed, freed
+
+
+def gc_after_install(wheels_dir: Path) -> None:
+    """Post-run garbage collection of WHEELS_DIR (skipped when DROIDRUN_WHEELHOUSE_GC=0)."""
+    if not WHEELHOUSE_GC:
+        return
+    try:
+        removed, freed = collect_garbage(wheels_dir)
+    except Exception as e:
+        log_warning(f"Wheelhouse garbage collection failed: {e}")
+        return
+    if removed:
+        log_success(f"Wheelhouse cleanup removed {removed} files ({freed / 1048576:.1f} MB)")
+
+
+def main() -> int:
+    """Maintain the wheel directories."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain the wheel directories")
+    subparsers = parser.add_subparsers(dest="command")
+    dedupe_parser = subparsers.add_parser("dedupe", help="hardlink identical wheels so each is stored once")
+    dedupe_parser.add_argument("dirs", nargs="*", type=Path,
+                               help="wheel directories (default: WHEELS_DIR, ~/wheels and bundled wheels)")
+    gc_parser = subparsers.add_parser("gc", help="remove stale artifacts and enforce the size budget")
+    gc_parser.add_argument("wheels_dir", nargs="?", type=Path,
+                           default=Path(os.environ.get("WHEELS_DIR", str(HOME / "wheels"))),
+                           help="wheel directory (default: WHEELS_DIR)")
+    gc_parser.add_argument("--budget-mb", type=float, default=WHEELHOUSE_BUDGET_MB,
+                           help="size limit in MB (default: DROIDRUN_WHEELHOUSE_BUDGET_MB, 0 for none)")
+    gc_parser.add_argument("--dry-run", action="store_true", help="only list what would be removed")
+    args = parser.parse_args()
+
+    if args.command == "gc":
+        removed, freed = collect_garbage(args.wheels_dir, args.budget_mb, args.dry_run)
+        verb = "Would remove" if args.dry_run else "Removed"
+        log_success(f"{verb} {removed} files ({freed / 1048576:.1f} MB) from {args.wheels_dir}")
+        return 0
+
+    if args.command == "dedupe":
+        relinked, freed = dedupe(args.dirs or None)
+        if relinked:
+            log_success(f"Relinked {relinked} duplicate wheels, freeing up to {freed / 1048576:.1f} MB")
+        else:
+            log_info("No duplicate wheels to relink")
+        return 0
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
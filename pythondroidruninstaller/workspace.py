@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Scoped build workspaces: RAM-backed when small enough, always removed, reclaimed after crashes."""
+
+import os
+import sys
+import time
+import atexit
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Iterator, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import read_meminfo, record_report, HOME, log_info, log_success
+except ImportError:
+    from common import read_meminfo, record_report, HOME, log_info, log_success
+
+
+# Disk-backed workspaces, and TMPDIR for everything the installer runs
+WORKSPACE_ROOT = HOME / "tmp"
+
+# RAM-backed root for small workspaces; defaults to /dev/shm when it is a writable tmpfs
+RAM_WORKSPACE_ROOT = os.environ.get("DROIDRUN_RAM_WORKSPACE", "")
+
+# MemAvailable (MB) that must remain after a RAM workspace is filled
+RAM_RESERVE_MB = int(os.environ.get("DROIDRUN_RAM_WORKSPACE_RESERVE_MB", "1024"))
+
+# Seconds between workspace size samples for the peak usage figure (0 disables)
+WORKSPACE_SAMPLE_INTERVAL = float(os.environ.get("DROIDRUN_WORKSPACE_SAMPLE_INTERVAL", "15"))
+
+# Leftovers of pip builds from runs before workspaces were managed are removed after this many seconds
+STALE_PIP_DIR_AGE = 24 * 3600
+
+WORKSPACE_PREFIX = "droidrun-"
+
+# Workspaces in use by this process, with the largest size seen for each
+_active: Dict[Path, int] = {}
+_lock = threading.Lock()
+_peak_total = 0
+_run_workspace: Optional[Path] = None
+_sampler: Optional["_WorkspaceSampler"] = None
+
+
+def dir_size(path: Path) -> int:
+    """Bytes used by the files under path, ignoring files that vanish mid-walk."""
+    total = 0
+    for root, _, files in os.walk(path, onerror=lambda e: None):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+def _owner_pid(path: Path) -> Optional[int]:
+    """PID encoded in a workspace name (droidrun-<pid>-<name>-<random>)."""
+    parts = path.name[len(WORKSPACE_PREFIX):].split("-", 1)
+    return int(parts[0]) if parts[0].isdigit() else None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def ram_root() -> Optional[Path]:
+    """RAM-backed directory for small workspaces, or None if there is none."""
+    if RAM_WORKSPACE_ROOT:
+        root = Path(RAM_WORKSPACE_ROOT)
+        return root if root.is_dir() and os.access(root, os.W_OK) else None
+    try:
+        with open("/proc/mounts", 'r') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) > 2 and parts[1] == "/dev/shm" and parts[2] == "tmpfs":
+                    root = Path("/dev/shm")
+                    return root if os.access(root, os.W_OK) else None
+    except OSError:
+        pass
+    return None
+
+
+def _workspace_roots() -> list:
+    roots = [WORKSPACE_ROOT]
+    ram = ram_root()
+    if ram:
+        roots.append(ram)
+    return roots
+
+
+def _choose_root(size_hint_mb: Optional[float]) -> Path:
+    """RAM for workspaces expected to fit with memory to spare, disk otherwise."""
+    ram = ram_root()
+    if ram is None or not size_hint_mb:
+        return WORKSPACE_ROOT
+    available_mb = read_meminfo().get("MemAvailable", 0) / 1024
+    try:
+        st = os.statvfs(ram)
+        free_mb = st.f_bavail * st.f_frsize / 1048576
+    except OSError:
+        return WORKSPACE_ROOT
+    if available_mb - size_hint_mb >= RAM_RESERVE_MB and free_mb >= size_hint_mb:
+        return ram
+    return WORKSPACE_ROOT
+
+
+def reclaim_stale_workspaces() -> Tuple[int, int]:
+    """
+    Remove workspaces whose owning process is gone (e.g. killed mid-build),
+    and old pip build directories left in WORKSPACE_ROOT by earlier runs.
+
+    Returns:
+        (directories removed, bytes reclaimed)
+    """
+    removed = freed = 0
+    now = time.time()
+    for root in _workspace_roots():
+        if not root.is_dir():
+            continue
+        for path in root.iterdir():
+            if not path.is_dir() or path.is_symlink():
+                continue
+            if path.name.startswith(WORKSPACE_PREFIX):
+                pid = _owner_pid(path)
+                if pid is None or _pid_alive(pid):
+                    continue
+            elif not (root == WORKSPACE_ROOT and path.name.startswith("pip-")
+                      and now - path.stat().st_mtime > STALE_PIP_DIR_AGE):
+                continue
+            size = dir_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+            freed += size
+    if removed:
+        log_info(f"Reclaimed {removed} stale build workspaces ({freed / 1048576:.1f} MB)")
+    return removed, freed
+
+
+def _sample() -> int:
+    """Measure the active workspaces and update the peak; returns the current total."""
+    global _peak_total
+    with _lock:
+        paths = list(_active)
+    sizes = {path: dir_size(path) for path in paths}
+    total = sum(sizes.values())
+    with _lock:
+        for path, size in sizes.items():
+            if path in _active:
+                _active[path] = max(_active[path], size)
+        _peak_total = max(_peak_total, total)
+    return total
+
+
+class _WorkspaceSampler(threading.Thread):
+    """Daemon thread that samples workspace sizes, since build trees peak mid-build."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="droidrun-workspace-sampler", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            _sample()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def _register(path: Path) -> None:
+    with _lock:
+        _active[path] = 0
+
+
+def _release(path: Path) -> int:
+    """Measure a workspace one last time, remove it and return its peak size."""
+    _sample()
+    with _lock:
+        peak = _active.pop(path, 0)
+    shutil.rmtree(path, ignore_errors=True)
+    return peak
+
+
+@contextmanager
+def build_workspace(name: str, size_hint_mb: Optional[float] = None) -> Iterator[Path]:
+    """
+    Hand out a scratch directory that is removed when the block exits.
+
+    Args:
+        name: Short label used in the directory name
+        size_hint_mb: Expected peak size; small workspaces go on tmpfs when memory allows
+
+    Yields:
+        The workspace directory
+    """
+    root = _choose_root(size_hint_mb)
+    root.mkdir(parents=True, exist_ok=True)
+    path = Path(tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{os.getpid()}-{name}-", dir=root))
+    _register(path)
+    try:
+        yield path
+    finally:
+        peak = _release(path)
+        record_report("workspaces", {
+            "name": name,
+            "ram": root != WORKSPACE_ROOT,
+            "peak_mb": round(peak / 1048576, 1),
+        })
+
+
+def start_run_workspace() -> Path:
+    """
+    Point TMPDIR at a workspace owned by this process, removed at exit.
+
+    pip and the build backends put their build trees in TMPDIR, so this is where
+    most of the disk space goes. Stale workspaces from crashed runs are
+    reclaimed first.
+    """
+    global _run_workspace, _sampler
+    if _run_workspace is not None and _run_workspace.is_dir():
+        return _run_workspace
+
+    reclaim_stale_workspaces()
+    WORKSPACE_ROOT.mkdir(parents=True, exist_ok=True)
+    _run_workspace = Path(tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{os.getpid()}-run-", dir=WORKSPACE_ROOT))
+    _register(_run_workspace)
+    os.environ["TMPDIR"] = str(_run_workspace)
+    # tempfile caches the directory it picked on first use
+    tempfile.tempdir = None
+
+    if WORKSPACE_SAMPLE_INTERVAL > 0:
+        _sampler = _WorkspaceSampler(WORKSPACE_SAMPLE_INTERVAL)
+        _sampler.start()
+    atexit.register(_finish_run_workspace)
+    return _run_workspace
+
+
+def _finish_run_workspace() -> None:
+    global _run_workspace
+    if _sampler:
+        _sampler.stop()
+    if _run_workspace is None:
+        return
+    peak = _release(_run_workspace)
+    _run_workspace = None
+    record_report("workspaces", {
+        "name": "run",
+        "ram": False,
+        "peak_mb": round(peak / 1048576, 1),
+        "peak_total_mb": round(_peak_total / 1048576, 1),
+    })
+
+
+def peak_usage() -> int:
+    """Largest combined size of this process's workspaces seen so far, in bytes."""
+    _sample()
+    return _peak_total
+
+
+def log_workspace_usage() -> None:
+    log_info(f"Peak build workspace usage: {peak_usage() / 1048576:.1f} MB")
+
+
+def main() -> int:
+    """Reclaim build workspaces left behind by crashed runs."""
+    removed, freed = reclaim_stale_workspaces()
+    if not removed:
+        log_success("No stale build workspaces")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
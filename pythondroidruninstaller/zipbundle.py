@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Pack pure-Python distributions imported at startup into one zip on sys.path, to cut stat and open calls."""
+
+import os
+import sys
+import json
+import marshal
+import statistics
+import importlib.util
+import zipfile
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple
+
+current_dir = Path(__file__).parent.absolute()
+sys.path.insert(0, str(current_dir))
+
+try:
+    from .common import record_report, HOME, log_info, log_success, log_warning
+    from .process_monitor import run_monitored
+    from .precompile import measure_import, MEASURE_MODULE
+except ImportError:
+    from common import record_report, HOME, log_info, log_success, log_warning
+    from process_monitor import run_monitored
+    from precompile import measure_import, MEASURE_MODULE
+
+
+BUNDLE_NAME = "droidrun-bundle"
+MANIFEST_FILE = HOME / ".droidrun_zipbundle.json"
+
+# Set to 1 to bundle after a successful install (off by default)
+ZIPBUNDLE = os.environ.get("DROIDRUN_ZIPBUNDLE", "0") == "1"
+
+# Distributions whose modules take less than this (ms) to import are left on disk
+MIN_IMPORT_MS = float(os.environ.get("DROIDRUN_ZIPBUNDLE_MIN_MS", "5"))
+
+# Imports timed (median taken) before and after bundling
+MEASURE_RUNS = 3
+
+# Packaging tools must stay importable from real files
+EXCLUDE = {"pip", "setuptools", "wheel", "pythondroidruninstaller"}
+
+# Files a package may contain and still work from a zip
+ZIP_SAFE_SUFFIXES = (".py", ".pyi", ".pyc")
+ZIP_SAFE_NAMES = {"py.typed"}
+
+
+class Candidate:
+    """A distribution that could be bundled, with the site-packages files it owns."""
+
+    def __init__(self, name: str, version: str, tops: List[str], files: List[str]):
+        self.name = name
+        self.version = version
+        self.tops = tops
+        self.files = files
+
+
+def _purelib() -> Path:
+    import sysconfig
+    return Path(sysconfig.get_paths()["purelib"])
+
+
+def inspect_distributions(site: Path) -> Tuple[Dict[str, Candidate], Dict[str, str]]:
+    """
+    Sort the distributions in site into those that can work from a zip and
+    those that need real files, with the reason.
+
+    A distribution needs real files if it ships extension modules, data files
+    or .pth files, is an editable install, or shares a top-level name with
+    another distribution (namespace packages).
+    """
+    from importlib import metadata
+
+    candidates: Dict[str, Candidate] = {}
+    rejected: Dict[str, str] = {}
+    owners: Dict[str, List[str]] = {}
+
+    for dist in metadata.distributions(path=[str(site)]):
+        name = (dist.metadata["Name"] or "").lower().replace("_", "-")
+        if not name or name in candidates or name in rejected:
+            continue
+        if name in EXCLUDE:
+            rejected[name] = "packaging tool"
+            continue
+        direct_url = dist.read_text("direct_url.json") or "{}"
+        try:
+            editable = json.loads(direct_url).get("dir_info", {}).get("editable")
+        except ValueError:
+            editable = False
+        if editable:
+            rejected[name] = "editable install"
+            continue
+
+        tops, files, reason = [], [], None
+        for entry in dist.files or []:
+            parts = entry.parts
+            if not parts or parts[0] == ".." or parts[0].endswith((".dist-info", ".data")):
+                continue
+            rel = "/".join(parts)
+            if rel.endswith(".pth"):
+                reason = f"installs {rel}"
+                break
+            if not (rel.endswith(ZIP_SAFE_SUFFIXES) or parts[-1] in ZIP_SAFE_NAMES):
+                reason = f"needs real files ({rel})"
+                break
+            if rel.endswith(".pyc"):
+                continue
+            top = parts[0][:-3] if len(parts) == 1 and parts[0].endswith(".py") else parts[0]
+            if top not in tops:
+                tops.append(top)
+            files.append(rel)
+        if reason is None and not files:
+            reason = "no importable files"
+        if reason is None:
+            for top in tops:
+                if (site / top).is_dir() and not (site / top / "__init__.py").exists():
+                    reason = f"{top} is a namespace package"
+                    break
+        if reason:
+            rejected[name] = reason
+            continue
+        candidates[name] = Candidate(name, dist.version, tops, files)
+        for top in tops:
+            owners.setdefault(top, []).append(name)
+
+    for top, names in owners.items():
+        if len(names) > 1:
+            for name in names:
+                if name in candidates:
+                    del candidates[name]
+                    rejected[name] = f"shares {top} with {', '.join(n for n in names if n != name)}"
+    return candidates, rejected
+
+
+def import_profile(module: str) -> Dict[str, float]:
+    """Self import time in ms per top-level name, from `python -X importtime -c 'import module'`."""
+    result = run_monitored([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                           capture_output=True, text=True, check=False)
+    profile: Dict[str, float] = {}
+    for line in (result.stderr or "").splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        top = fields[2].strip().split(".")[0]
+        profile[top] = profile.get(top, 0) + int(fields[0]) / 1000
+    return profile
+
+
+def median_import(module: str, runs: int = MEASURE_RUNS) -> Optional[float]:
+    times = [measure_import(module) for _ in range(runs)]
+    if any(t is None for t in times):
+        return None
+    return statistics.median(times)
+
+
+def _pyc(source: bytes, filename: str) -> Optional[bytes]:
+    """Unchecked hash-based pyc for source; the zip is rebuilt whenever its sources change."""
+    try:
+        code = compile(source, filename, "exec", dont_inherit=True)
+    except (SyntaxError, ValueError):
+        return None
+    return (importlib.util.MAGIC_NUMBER + (0b01).to_bytes(4, "little")
+            + importlib.util.source_hash(source) + marshal.dumps(code))
+
+
+def build_bundle(site: Path, candidates: List[Candidate]) -> Path:
+    """Write the zip (sources plus pycs next to them, as zipimport expects) and its .pth file."""
+    zip_path = site / f"{BUNDLE_NAME}.zip"
+    temp = zip_path.with_name(f".{zip_path.name}.tmp")
+    # Stored, not deflated: startup pays for decompression on every launch
+    with zipfile.ZipFile(temp, 'w', zipfile.ZIP_STORED) as zf:
+        for candidate in candidates:
+            for rel in candidate.files:
+                source = (site / rel).read_bytes()
+                zf.writestr(rel, source)
+                if rel.endswith(".py"):
+                    pyc = _pyc(source, f"{zip_path}/{rel}")
+                    if pyc:
+                        zf.writestr(rel[:-3] + ".pyc", pyc)
+    os.replace(temp, zip_path)
+    # A plain path line appends the zip after site-packages
+    (site / f"{BUNDLE_NAME}.pth").write_text(f"{zip_path}\n")
+    return zip_path
+
+
+def _remove_files(site: Path, files: List[str]) -> None:
+    """Remove bundled files, their cached bytecode and the directories left empty."""
+    dirs = set()
+    for rel in files:
+        path = site / rel
+        if rel.endswith(".py"):
+            pycache = path.parent / "__pycache__"
+            for cached in pycache.glob(f"{path.stem}.*.pyc"):
+                cached.unlink()
+            dirs.add(pycache)
+        if path.exists():
+            path.unlink()
+        dirs.add(path.parent)
+    for directory in sorted(dirs, key=lambda d: len(d.parts), reverse=True):
+        while directory != site and directory.is_dir():
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+            directory = directory.parent
+
+
+def load_manifest() -> dict:
+    if not MANIFEST_FILE.exists():
+        return {}
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def unbundle() -> bool:
+    """
+    Put bundled files back on disk and remove the zip.
+
+    Distributions reinstalled since bundling (different version) keep their
+    new files; only unchanged ones are restored.
+    """
+    from importlib import metadata
+
+    manifest = load_manifest()
+    site = Path(manifest.get("site", _purelib()))
+    zip_path = site / f"{BUNDLE_NAME}.zip"
+    if zip_path.exists():
+        installed = {}
+        for dist in metadata.distributions(path=[str(site)]):
+            installed[(dist.metadata["Name"] or "").lower().replace("_", "-")] = dist.version
+        with zipfile.ZipFile(zip_path) as zf:
+            for entry in manifest.get("distributions", []):
+                if installed.get(entry["name"]) != entry["version"]:
+                    continue
+                for rel in entry["files"]:
+                    if not (site / rel).exists():
+                        zf.extract(rel, site)
+        zip_path.unlink()
+    pth = site / f"{BUNDLE_NAME}.pth"
+    if pth.exists():
+        pth.unlink()
+    if MANIFEST_FILE.exists():
+        MANIFEST_FILE.unlink()
+    return True
+
+
+def bundle(module: str = MEASURE_MODULE, min_ms: float = MIN_IMPORT_MS) -> bool:
+    """
+    Bundle the pure-Python distributions that `import module` spends at least
+    min_ms in, keeping the bundle only if the import gets faster.
+    """
+    if load_manifest():
+        unbundle()
+    if importlib.util.find_spec(module) is None:
+        log_warning(f"{module} is not importable, nothing to bundle")
+        return False
+
+    site = _purelib()
+    before = median_import(module)
+    if before is None:
+        log_warning(f"'import {module}' fails, not bundling")
+        return False
+    profile = import_profile(module)
+    candidates, rejected = inspect_distributions(site)
+
+    chosen = []
+    for candidate in candidates.values():
+        spent = sum(profile.get(top, 0) for top in candidate.tops)
+        if spent >= min_ms:
+            chosen.append(candidate)
+    if rejected:
+        log_info(f"{len(rejected)} distributions stay on disk (extension modules, data files, "
+                 f"namespace packages or editable installs)")
+    if not chosen:
+        log_info(f"No pure-Python distribution takes {min_ms:g}ms or more to import, nothing to bundle")
+        return False
+
+    zip_path = build_bundle(site, chosen)
+    with open(MANIFEST_FILE, 'w') as f:
+        json.dump({
+            "site": str(site),
+            "distributions": [{"name": c.name, "version": c.version, "files": c.files} for c in chosen],
+        }, f, indent=2)
+    for candidate in chosen:
+        _remove_files(site, candidate.files)
+
+    after = median_import(module)
+    if after is None or after >= before:
+        result = "fails" if after is None else f"takes {after:.2f}s (was {before:.2f}s)"
+        log_warning(f"'import {module}' {result} with the bundle, restoring files")
+        unbundle()
+        return False
+
+    files = sum(len(c.files) for c in chosen)
+    log_success(f"Bundled {len(chosen)} distributions ({files} files, "
+                f"{zip_path.stat().st_size / 1048576:.1f} MB) into {zip_path.name}: "
+                f"'import {module}' {before:.2f}s -> {after:.2f}s")
+    record_report("zipbundle", {
+        "module": module,
+        "distributions": sorted(c.name for c in chosen),
+        "files": files,
+        "import_before": round(before, 3),
+        "import_after": round(after, 3),
+    })
+    return True
+
+
+def bundle_after_install() -> None:
+    """Post-install bundling, only when DROIDRUN_ZIPBUNDLE=1."""
+    if not ZIPBUNDLE:
+        return
+    log_info("Bundling pure-Python dependencies into a zip...")
+    try:
+        bundle()
+    except Exception as e:
+        log_warning(f"Bundling failed, restoring files: {e}")
+        unbundle()
+
+
+def main() -> int:
+    """Create, inspect or remove the zip bundle."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bundle pure-Python distributions into a zip on sys.path")
+    subparsers = parser.add_subparsers(dest="command")
+    create_parser = subparsers.add_parser("create", help="bundle the distributions worth bundling")
+    create_parser.add_argument("--module", default=MEASURE_MODULE, help="module whose import is measured")
+    create_parser.add_argument("--min-ms", type=float, default=MIN_IMPORT_MS,
+                               help="minimum import time for a distribution to be bundled")
+    subparsers.add_parser("remove", help="restore bundled files and remove the zip")
+    subparsers.add_parser("list", help="show what is bundled")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        return 0 if bundle(args.module, args.min_ms) else 1
+    if args.command == "remove":
+        unbundle()
+        log_success("Bundle removed")
+        return 0
+
+    manifest = load_manifest()
+    if not manifest:
+        log_info("Nothing is bundled")
+        return 0
+    for entry in manifest["distributions"]:
+        print(f"{entry['name']:<32} {entry['version']:<12} {len(entry['files'])} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())